@@ -1,26 +1,51 @@
+import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from flask_marshmallow import Marshmallow
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
+from services.rate_limit import RateLimiter
+from services.replicas import RoutingSession, recent_writers
 
 # Initialize extensions
-db = SQLAlchemy()
-migrate = Migrate()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 jwt = JWTManager()
 ma = Marshmallow()
+limiter = RateLimiter()
 
 def create_app(config_class=Config):
+    from services.media import UploadRequest
+    from services.database import engine_options
+    from services.serialization import FastJSONProvider
+    from services.audit import audit_buffer
+    
     app = Flask(__name__)
     app.config.from_object(config_class)
+    if app.config['PROXY_FIX_HOPS']:
+        # Take the client address from the X-Forwarded-For entry our own proxies added
+        hops = app.config['PROXY_FIX_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+    app.json = FastJSONProvider(app)
+    app.request_class = UploadRequest  # Stream uploaded files to disk
+    
+    if 'SQLALCHEMY_ENGINE_OPTIONS' not in app.config:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+            app.config, cli=bool(os.environ.get('FLASK_RUN_FROM_CLI'))
+        )
     
     # Initialize extensions with app
     db.init_app(app)
-    migrate.init_app(app, db)
+    recent_writers.configure(app.config['REPLICA_STATE_URL'])
+    if os.environ.get('FLASK_RUN_FROM_CLI'):
+        # Alembic is only needed by `flask db ...`; web workers skip importing it
+        from flask_migrate import Migrate
+        Migrate(app, db)
     jwt.init_app(app)
     ma.init_app(app)
+    limiter.init_app(app)
+    audit_buffer.init_app(app)
     
     # Configure CORS
     CORS(app, origins=[app.config['FRONTEND_URL']])
@@ -30,11 +55,73 @@ def create_app(config_class=Config):
     from routes.clubs import clubs_bp
     from routes.events import events_bp
     from routes.admin import admin_bp
+    from routes.payments import payments_bp
+    from routes.subscriptions import subscriptions_bp
+    from routes.reports import reports_bp
+    from routes.tickets import tickets_bp
+    from routes.checkin import checkin_bp
+    from routes.media import media_bp
+    from routes.calendar import calendar_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(clubs_bp, url_prefix='/api/clubs')
     app.register_blueprint(events_bp, url_prefix='/api/events')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(payments_bp, url_prefix='/api/payments')
+    app.register_blueprint(subscriptions_bp, url_prefix='/api/subscriptions')
+    app.register_blueprint(reports_bp, url_prefix='/api/reports')
+    app.register_blueprint(tickets_bp, url_prefix='/api/tickets')
+    app.register_blueprint(checkin_bp, url_prefix='/api/checkin')
+    app.register_blueprint(media_bp, url_prefix='/api/media')
+    app.register_blueprint(calendar_bp, url_prefix='/api/calendar')
+    
+    # Rate limits from API_SPECIFICATION.md
+    # Only the views taking credentials get the strict per-address limit (add
+    # password reset here when it lands); /me and the rest are per user
+    limiter.limit(auth_bp, app.config['RATELIMIT_USER'], per='user')
+    limiter.limit(auth_bp, app.config['RATELIMIT_AUTH'], per='ip', endpoints=('login', 'register'))
+    for blueprint in (clubs_bp, events_bp):
+        limiter.limit(blueprint, app.config['RATELIMIT_PUBLIC'], per='ip')
+    for blueprint in (admin_bp, payments_bp, subscriptions_bp, reports_bp, tickets_bp, media_bp):
+        limiter.limit(blueprint, app.config['RATELIMIT_USER'], per='user')
+    limiter.limit(checkin_bp, app.config['RATELIMIT_CHECKIN'], per='user')
+    # calendar_bp is not limited: calendar servers poll from a few shared addresses,
+    # and an unchanged feed is a 304 from one aggregate query
+    
+    # CLI commands
+    from services.sweeper import expire_subscriptions_command
+    from services.idempotency import purge_idempotency_keys_command
+    from services.email import send_emails_command
+    from services.commissions import recompute_commissions_command, commission_report_command
+    from services.reconciliation import reconcile_ledger_command
+    from services.callbacks import process_callbacks_command
+    from services.stk_reconciler import reconcile_payments_command
+    from services.refunds import process_refunds_command
+    from services.archive import archive_purchases_command
+    from services.notifications import send_notifications_command
+    from services.trending import update_trending_command
+    from services.recommendations import build_recommendations_command
+    from services.venues import check_venues_command, VenueConflict, venue_conflict_response
+    from services.media import fail_stale_images_command
+    
+    app.cli.add_command(expire_subscriptions_command)
+    app.cli.add_command(purge_idempotency_keys_command)
+    app.cli.add_command(send_emails_command)
+    app.cli.add_command(recompute_commissions_command)
+    app.cli.add_command(commission_report_command)
+    app.cli.add_command(reconcile_ledger_command)
+    app.cli.add_command(process_callbacks_command)
+    app.cli.add_command(reconcile_payments_command)
+    app.cli.add_command(process_refunds_command)
+    app.cli.add_command(archive_purchases_command)
+    app.cli.add_command(send_notifications_command)
+    app.cli.add_command(update_trending_command)
+    app.cli.add_command(build_recommendations_command)
+    app.cli.add_command(check_venues_command)
+    app.cli.add_command(fail_stale_images_command)
+    
+    # Saving an event that double-books its venue, from any route
+    app.register_error_handler(VenueConflict, venue_conflict_response)
     
     # Health check endpoint
     @app.route('/api/health')
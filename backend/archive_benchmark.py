@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Benchmark: admin revenue queries before and after archiving past purchases.
+
+Usage:
+    python archive_benchmark.py [--purchases 50000000] [--months 24] [--repeat 5]
+
+Seeds a database (in-memory SQLite unless --database is given) with
+--purchases purchases spread evenly over the last --months months, one event
+per day, each purchase with a commission and an issued ticket. A few old
+commissions are left unsettled (pending, failed, clawback) and must stay live.
+Then times the queries the admin dashboard runs over recent data, archives
+everything for events older than ARCHIVE_AFTER_MONTHS with the
+archive-purchases job, and times the same queries again. On PostgreSQL the
+archive is partitioned by month, so the recent-data queries should only touch
+the live table and the newest partitions; all-time revenue must not change.
+"""
+
+import argparse
+import time
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from app import create_app, db
+from config import TestingConfig
+from models import User, Event, Ticket, Purchase, Commission, IssuedTicket
+from services.archive import with_archive, archive_past_purchases
+
+class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+UNSETTLED_EVERY = 10000  # One old commission in this many stays pending, failed or clawback
+
+def seed(purchases, months, chunk=100000):
+    """Purchases spread over the last `months` months; returns how many must stay live"""
+    leader = User(name='Bench Leader', email='bench@campus.edu', role='verified_leader', password_hash='-')
+    db.session.add(leader)
+    db.session.flush()
+
+    buyers = 1000
+    db.session.bulk_insert_mappings(User, [{
+        'id': leader.id + index + 1,
+        'name': f'Buyer {index}',
+        'email': f'buyer{index}@campus.edu',
+        'password_hash': '-',
+        'role': 'student'
+    } for index in range(buyers)])
+
+    today = date.today()
+    days = months * 30
+    first_day = today - timedelta(days=days)
+    start = datetime(2030, 1, 1, 18, 0)
+    db.session.bulk_insert_mappings(Event, [{
+        'id': index + 1,
+        'title': f'Event {index}',
+        'date': first_day + timedelta(days=index),
+        'start_time': start.time(),
+        'end_time': (start + timedelta(hours=2)).time(),
+        'location': f'Hall {index % 20}',
+        'created_by': leader.id,
+        'is_paid': True,
+        'created_at': start
+    } for index in range(days)])
+    db.session.bulk_insert_mappings(Ticket, [{
+        'id': index + 1,
+        'event_id': index + 1,
+        'name': 'General',
+        'price': Decimal('500.00'),
+        'quantity': purchases,
+        'sold_count': 0
+    } for index in range(days)])
+    db.session.commit()
+
+    unsettled = ('pending', 'failed', 'clawback')
+    stay_live = 0
+    for offset in range(0, purchases, chunk):
+        ids = range(offset + 1, min(purchases, offset + chunk) + 1)
+        purchase_rows = []
+        commission_rows = []
+        ticket_rows = []
+        for purchase_id in ids:
+            day = (purchase_id - 1) * days // purchases  # Sold on the day of its event
+            created_at = datetime.combine(first_day + timedelta(days=day), start.time())
+            payout_status = 'paid'
+            if purchase_id % UNSETTLED_EVERY == 0:
+                payout_status = unsettled[purchase_id // UNSETTLED_EVERY % len(unsettled)]
+                stay_live += 1
+            purchase_rows.append({
+                'id': purchase_id,
+                'user_id': leader.id + purchase_id % buyers + 1,
+                'ticket_id': day + 1,
+                'quantity': 1,
+                'unit_price': Decimal('500.00'),
+                'total_amount': Decimal('500.00'),
+                'mpesa_code': f'BENCH{purchase_id:09d}',
+                'payment_phone': '254700000000',
+                'status': 'completed',
+                'created_at': created_at
+            })
+            commission_rows.append({
+                'id': purchase_id,
+                'purchase_id': purchase_id,
+                'platform_fee_rate': Decimal('0.0500'),
+                'platform_fee_amount': Decimal('25.00'),
+                'organizer_amount': Decimal('475.00'),
+                'payout_status': payout_status,
+                # Some commissions land a month after their purchase (ledger repairs)
+                'created_at': created_at + timedelta(days=31 if purchase_id % 97 == 0 else 0)
+            })
+            ticket_rows.append({
+                'id': purchase_id,
+                'purchase_id': purchase_id,
+                'event_id': day + 1,
+                'code': f'BENCH-{purchase_id}',
+                'created_at': created_at
+            })
+        db.session.bulk_insert_mappings(Purchase, purchase_rows)
+        db.session.bulk_insert_mappings(Commission, commission_rows)
+        db.session.bulk_insert_mappings(IssuedTicket, ticket_rows)
+        db.session.commit()
+
+    return stay_live
+
+def monthly_revenue():
+    """The dashboard's last-30-days platform revenue"""
+    commissions = with_archive(Commission)
+    return db.session.query(db.func.sum(commissions.c.platform_fee_amount)).filter(
+        commissions.c.created_at >= datetime.now() - timedelta(days=30)
+    ).scalar()
+
+def recent_purchases():
+    """The dashboard's ten latest completed purchases"""
+    return Purchase.query.filter_by(status='completed').order_by(Purchase.created_at.desc()).limit(10).all()
+
+def daily_revenue():
+    """Revenue analytics' per-day revenue over the last 30 days"""
+    commissions = with_archive(Commission)
+    return db.session.query(
+        db.func.date(commissions.c.created_at), db.func.sum(commissions.c.platform_fee_amount)
+    ).filter(
+        commissions.c.created_at >= datetime.now() - timedelta(days=30)
+    ).group_by(db.func.date(commissions.c.created_at)).all()
+
+def total_revenue():
+    """All-time platform revenue, live and archived"""
+    commissions = with_archive(Commission)
+    return db.session.query(db.func.sum(commissions.c.platform_fee_amount)).scalar()
+
+QUERIES = (monthly_revenue, recent_purchases, daily_revenue)
+
+def time_queries(repeat):
+    """Best-of-repeat milliseconds per query"""
+    timings = {}
+    for query in QUERIES:
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            query()
+            duration = time.perf_counter() - started
+            best = duration if best is None else min(best, duration)
+            db.session.remove()
+        timings[query.__name__] = best * 1000
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark admin queries before and after archiving')
+    parser.add_argument('--purchases', type=int, default=50000000)
+    parser.add_argument('--months', type=int, default=24, help='History the purchases are spread over')
+    parser.add_argument('--archive-after', type=int, default=3, help='Archive events older than N months')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database', help='SQLAlchemy URL to use instead of in-memory SQLite')
+    args = parser.parse_args()
+
+    if args.database:
+        BenchmarkConfig.SQLALCHEMY_DATABASE_URI = args.database
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        stay_live = seed(args.purchases, args.months)
+        print(f'Seeded {args.purchases} purchases over {args.months} months '
+              f'in {time.perf_counter() - started:.1f}s ({db.engine.dialect.name})')
+
+        total_before = total_revenue()
+        before = time_queries(args.repeat)
+
+        result = archive_past_purchases(args.archive_after)
+        live = Purchase.query.count()
+        after = time_queries(args.repeat)
+        total_after = total_revenue()
+
+    print(f"Archived {result['archived']} purchases for events before {result['cutoff']} in "
+          f"{result['duration']:.1f}s ({result['archived'] / max(result['duration'], 1e-9):,.0f}/s), "
+          f'{live} left live')
+    print(f'Best of {args.repeat}:          before      after')
+    for name in before:
+        print(f'{name:>18}: {before[name]:8.2f}ms {after[name]:8.2f}ms')
+    print(f'All-time revenue unchanged: {total_before == total_after}')
+
+    # Unsettled commissions of archived-age events must not have moved
+    with app.app_context():
+        old_unsettled = Commission.query.filter(Commission.payout_status != 'paid').count()
+    print(f'Unsettled commissions kept live: {old_unsettled} of {stay_live}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Benchmark: M-Pesa callback ack latency and completion under a burst.
+
+Usage:
+    python callback_benchmark.py [--rate 1000] [--seconds 10] [--clients 4] [--tickets 5] [--duplicate-every 10]
+
+Seeds pending purchases for a few ticket tiers, then posts their STK callbacks
+to /api/payments/mpesa/callback at a fixed rate from --clients processes (like
+gunicorn workers) while a separate process runs the callback worker, as
+`flask process-callbacks` does. Ack latency is measured from each callback's
+scheduled send time, so senders that fall behind show up as latency rather
+than as a lower rate. Every Nth callback is sent twice, and the run checks each
+purchase was applied exactly once.
+
+The processes need a database they can share, so the default is a temporary
+SQLite file in WAL mode. SQLite still takes one writer at a time; pass
+--database to measure against PostgreSQL.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from sqlalchemy import text
+from app import create_app, db
+from config import TestingConfig
+from models import User, Event, Ticket, Purchase, Commission, MpesaCallback
+from services.callbacks import process_inbox
+
+class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+def benchmark_app(database):
+    BenchmarkConfig.SQLALCHEMY_DATABASE_URI = database
+    return create_app(BenchmarkConfig)
+
+def checkout_id(index):
+    return f'ws_CO_bench_{index}'
+
+def seed(purchases, tickets):
+    """Create purchases pending payment, spread over a few ticket tiers"""
+    leader = User(name='Bench Leader', email='bench@campus.edu', role='verified_leader')
+    leader.set_password('password123')
+    buyer = User(name='Bench Buyer', email='buyer@campus.edu')
+    buyer.set_password('password123')
+    db.session.add_all([leader, buyer])
+    db.session.flush()
+
+    event = Event(
+        title='Bench Concert', date=date.today() + timedelta(days=7), start_time=datetime(2030, 1, 1, 18).time(),
+        end_time=datetime(2030, 1, 1, 22).time(), location='Main Hall', created_by=leader.id, is_paid=True
+    )
+    db.session.add(event)
+    db.session.flush()
+
+    db.session.bulk_insert_mappings(Ticket, [{
+        'id': index + 1,
+        'event_id': event.id,
+        'name': f'Tier {index}',
+        'price': Decimal('500.00'),
+        'quantity': purchases,
+        'sold_count': 0
+    } for index in range(tickets)])
+    db.session.bulk_insert_mappings(Purchase, [{
+        'user_id': buyer.id,
+        'ticket_id': index % tickets + 1,
+        'quantity': 1,
+        'unit_price': Decimal('500.00'),
+        'total_amount': Decimal('500.00'),
+        'payment_phone': '254700000000',
+        'checkout_request_id': checkout_id(index),
+        'status': 'pending',
+        'created_at': datetime.utcnow()
+    } for index in range(purchases)])
+    db.session.commit()
+
+def callback_body(index):
+    return json.dumps({'Body': {'stkCallback': {
+        'MerchantRequestID': f'bench-{index}',
+        'CheckoutRequestID': checkout_id(index),
+        'ResultCode': 0,
+        'ResultDesc': 'The service request is processed successfully.',
+        'CallbackMetadata': {'Item': [
+            {'Name': 'Amount', 'Value': 500},
+            {'Name': 'MpesaReceiptNumber', 'Value': f'BENCH{index:08d}'},
+            {'Name': 'PhoneNumber', 'Value': 254700000000}
+        ]}
+    }}})
+
+def send_callbacks(database, offsets, interval, start, ready, results):
+    """Post callbacks at start + offset * interval; reports (ack latencies, non-200 statuses)"""
+    client = benchmark_app(database).test_client()
+    ready.wait()  # Every process has booted
+    ready.wait()  # start is set
+    acks = []
+    errors = []
+
+    for offset, index in offsets:
+        scheduled = start.value + offset * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        response = client.post('/api/payments/mpesa/callback', data=callback_body(index),
+                               content_type='application/json')
+        acks.append(time.perf_counter() - scheduled)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+    results.put(('sender', acks, errors))
+
+def drain_inbox(database, ready, sending, results):
+    """Apply callbacks as they arrive until the burst is over and the inbox is empty"""
+    app = benchmark_app(database)
+    counts = {'processed': 0, 'ignored': 0, 'invalid': 0}
+    ready.wait()
+    ready.wait()
+
+    with app.app_context():
+        while True:
+            processed, ignored, invalid = process_inbox()
+            counts['processed'] += processed
+            counts['ignored'] += ignored
+            counts['invalid'] += invalid
+            if not (processed or ignored or invalid):
+                if not sending.is_set():
+                    break
+                time.sleep(0.01)
+
+    results.put(('worker', counts, time.perf_counter()))
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the M-Pesa callback inbox under a burst')
+    parser.add_argument('--rate', type=int, default=1000, help='Callbacks sent per second')
+    parser.add_argument('--seconds', type=float, default=10, help='Length of the burst')
+    parser.add_argument('--clients', type=int, default=4, help='Processes sending callbacks')
+    parser.add_argument('--tickets', type=int, default=5, help='Ticket tiers the purchases share')
+    parser.add_argument('--duplicate-every', type=int, default=10, help='Send every Nth callback twice (0: never)')
+    parser.add_argument('--database', help='SQLAlchemy URL to use instead of a temporary SQLite file')
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    database = args.database or f"sqlite:///{os.path.join(workdir.name, 'bench.db')}"
+
+    # Purchase index per callback sent; duplicates count towards the rate
+    sends = []
+    purchases = 0
+    while len(sends) < args.rate * args.seconds:
+        sends.append(purchases)
+        if args.duplicate_every and purchases % args.duplicate_every == 0:
+            sends.append(purchases)
+        purchases += 1
+    interval = 1 / args.rate
+
+    app = benchmark_app(database)
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(text('PRAGMA journal_mode=WAL'))  # Kept by the database file
+        db.create_all()
+        seed(purchases, args.tickets)
+        db.session.remove()
+        db.engine.dispose()
+
+    ready = multiprocessing.Barrier(args.clients + 2)
+    start = multiprocessing.Value('d')
+    sending = multiprocessing.Event()
+    sending.set()
+    results = multiprocessing.Queue()
+    offsets = list(enumerate(sends))
+    processes = [multiprocessing.Process(target=drain_inbox, args=(database, ready, sending, results))]
+    processes.extend(multiprocessing.Process(target=send_callbacks, args=(
+        database, offsets[client::args.clients], interval, start, ready, results
+    )) for client in range(args.clients))
+
+    for process in processes:
+        process.start()
+    ready.wait()
+    started_at = datetime.utcnow()
+    start.value = started = time.perf_counter()
+    ready.wait()
+
+    acks = []
+    errors = []
+    for _ in range(args.clients):
+        _, sender_acks, sender_errors = results.get()
+        acks.extend(sender_acks)
+        errors.extend(sender_errors)
+    send_time = time.perf_counter() - started
+    sending.clear()
+    _, counts, drained = results.get()
+    total_time = drained - started
+    for process in processes:
+        process.join()
+
+    with app.app_context():
+        # When each purchase's callback was applied, relative to when it was first sent
+        first_sent = {}
+        for offset, index in offsets:
+            first_sent.setdefault(checkout_id(index), offset * interval)
+        applied = [
+            (processed_at - started_at).total_seconds() - first_sent[checkout_request_id]
+            for checkout_request_id, processed_at in db.session.query(
+                MpesaCallback.checkout_request_id, MpesaCallback.processed_at
+            ).filter(MpesaCallback.status == 'processed')
+        ]
+        completed = Purchase.query.filter_by(status='completed').count()
+        sold = db.session.query(db.func.sum(Ticket.sold_count)).scalar() or 0
+        commissions = Commission.query.count()
+
+    exactly_once = completed == sold == commissions == purchases and counts['ignored'] == len(sends) - purchases
+
+    print(f'{len(sends)} callbacks ({len(sends) - purchases} duplicates) for {purchases} purchases '
+          f'over {args.tickets} tickets, {args.clients} sending processes')
+    print(f'Sent in {send_time:.2f}s ({len(sends) / send_time:,.0f}/s, target {args.rate:,}/s), '
+          f'{len(errors)} non-200 acks')
+    print(f'Ack latency:     p50 {percentile(acks, 0.5) * 1000:8.2f}ms  p95 {percentile(acks, 0.95) * 1000:8.2f}ms  '
+          f'p99 {percentile(acks, 0.99) * 1000:8.2f}ms  max {max(acks) * 1000:8.2f}ms')
+    if applied:
+        print(f'Send to applied: p50 {percentile(applied, 0.5) * 1000:8.2f}ms  p95 {percentile(applied, 0.95) * 1000:8.2f}ms  '
+              f'p99 {percentile(applied, 0.99) * 1000:8.2f}ms  max {max(applied) * 1000:8.2f}ms')
+    print(f'Completed {completed} purchases in {total_time:.2f}s ({completed / total_time:,.0f}/s)')
+    print(f"Worker: {counts['processed']} processed, {counts['ignored']} ignored, {counts['invalid']} invalid")
+    print(f'Applied exactly once (sold_count {sold}, commissions {commissions}): {exactly_once}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Load test: concurrent door scans against the duplicate check-in guard.
+
+Usage:
+    python checkin_benchmark.py [--tickets 20000] [--scanners 32] [--duplicates 0.2] [--repeat 3]
+
+Issues --tickets signed codes for one event and serves the app on a local
+threaded server. --scanners concurrent doors then POST
+/api/checkin/events/<id>/scan for every code. A --duplicates share of codes is
+queued twice back to back, so two doors scan the same ticket at the same
+moment, which is the race the conditional UPDATE guards against. Each run
+checks that every ticket was admitted exactly once and every second scan got
+409. The best of --repeat runs is reported (check-ins are cleared between
+runs).
+
+The rate limiter is off (TestingConfig); in production RATELIMIT_CHECKIN caps
+each scanner account. The server and the seeding share the database, so the
+default is a temporary SQLite file in WAL mode; pass --database to use
+PostgreSQL.
+"""
+
+import argparse
+import logging
+import os
+import queue
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+import requests
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+from werkzeug.serving import make_server
+from app import create_app, db
+from config import TestingConfig
+from models import User, Event, Ticket, Purchase, IssuedTicket
+from services.ticket_codes import issue_tickets
+
+class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+def seed(tickets):
+    """One event with `tickets` issued codes; returns the event id, codes and the organizer's token"""
+    leader = User(name='Bench Leader', email='bench@campus.edu', role='verified_leader', password_hash='-')
+    buyer = User(name='Bench Buyer', email='buyer@campus.edu', password_hash='-')
+    db.session.add_all([leader, buyer])
+    db.session.flush()
+
+    event = Event(
+        title='Bench Concert', date=date.today() + timedelta(days=7), start_time=datetime(2030, 1, 1, 18).time(),
+        end_time=datetime(2030, 1, 1, 22).time(), location='Main Hall', created_by=leader.id, is_paid=True
+    )
+    db.session.add(event)
+    db.session.flush()
+
+    ticket = Ticket(event_id=event.id, name='General', price=Decimal('500.00'), quantity=tickets, sold_count=tickets)
+    db.session.add(ticket)
+    db.session.flush()
+
+    purchase = Purchase(
+        user_id=buyer.id, ticket_id=ticket.id, quantity=tickets, unit_price=Decimal('500.00'),
+        total_amount=Decimal('500.00') * tickets, payment_phone='254700000000', status='completed'
+    )
+    db.session.add(purchase)
+    db.session.flush()
+    issue_tickets([(purchase.id, event.id, tickets)])
+    db.session.commit()
+
+    codes = [row.code for row in db.session.query(IssuedTicket.code)]
+    return event.id, codes, create_access_token(identity=leader.id)
+
+def scan_order(codes, duplicates):
+    """Every code once, with a `duplicates` share queued twice in a row"""
+    codes = list(codes)
+    random.shuffle(codes)
+    twice = set(random.sample(range(len(codes)), int(len(codes) * duplicates)))
+
+    order = []
+    for index, code in enumerate(codes):
+        order.append(code)
+        if index in twice:
+            order.append(code)
+    return order
+
+def scanner(url, token, scans, results):
+    """Scan codes off the shared queue until it is empty"""
+    session = requests.Session()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    while True:
+        try:
+            code = scans.get_nowait()
+        except queue.Empty:
+            return
+        started = time.perf_counter()
+        try:
+            status = session.post(url, json={'code': code}, headers=headers, timeout=60).status_code
+        except requests.RequestException:
+            status = None
+        results.append((code, status, time.perf_counter() - started))
+
+def run(url, token, order, scanners):
+    scans = queue.Queue()
+    for code in order:
+        scans.put(code)
+
+    results = []
+    started = time.perf_counter()
+    doors = [threading.Thread(target=scanner, args=(url, token, scans, results)) for _ in range(scanners)]
+    for door in doors:
+        door.start()
+    for door in doors:
+        door.join()
+    return time.perf_counter() - started, results
+
+def check(results, expected_scans):
+    """Each code admitted once and only once; every other scan of it refused with 409"""
+    admitted = Counter(code for code, status, _ in results if status == 200)
+    statuses = Counter(status for _, status, _ in results)
+    return (
+        len(results) == expected_scans
+        and all(count == 1 for count in admitted.values())
+        and statuses[200] + statuses[409] == expected_scans
+    ), statuses
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test concurrent check-in scans')
+    parser.add_argument('--tickets', type=int, default=20000)
+    parser.add_argument('--scanners', type=int, default=32, help='Concurrent doors')
+    parser.add_argument('--duplicates', type=float, default=0.2,
+                        help='Share of tickets scanned at two doors at once')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--database', help='SQLAlchemy URL to use instead of a temporary SQLite file')
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    BenchmarkConfig.SQLALCHEMY_DATABASE_URI = (
+        args.database or f"sqlite:///{os.path.join(workdir.name, 'bench.db')}"
+    )
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(text('PRAGMA journal_mode=WAL'))  # Kept by the database file
+        db.create_all()
+        event_id, codes, token = seed(args.tickets)
+        db.session.remove()
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # No line per scan
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/api/checkin/events/{event_id}/scan'
+
+    best = None
+    correct = True
+    for _ in range(args.repeat):
+        with app.app_context():
+            db.session.execute(db.update(IssuedTicket).values(checked_in_at=None))
+            db.session.commit()
+
+        order = scan_order(codes, args.duplicates)
+        elapsed, results = run(url, token, order, args.scanners)
+        ok, statuses = check(results, len(order))
+
+        with app.app_context():
+            checked_in = IssuedTicket.query.filter(IssuedTicket.checked_in_at.isnot(None)).count()
+        correct = correct and ok and checked_in == len(codes)
+        if best is None or elapsed < best[0]:
+            best = (elapsed, results, statuses)
+
+    server.shutdown()
+
+    elapsed, results, statuses = best
+    latencies = [latency for _, _, latency in results]
+    print(f'{args.tickets} tickets, {len(results)} scans ({args.duplicates:.0%} scanned at two doors at once), '
+          f'{args.scanners} scanners')
+    print(f'Best of {args.repeat}: {len(results) / elapsed * 60:12,.0f} scans/minute, '
+          f'p50 {percentile(latencies, 0.5) * 1000:6.1f}ms  p99 {percentile(latencies, 0.99) * 1000:6.1f}ms')
+    print(f'Admitted {statuses[200]}, refused as already checked in {statuses[409]}, '
+          f'other {len(results) - statuses[200] - statuses[409]}')
+    print(f'Every ticket admitted exactly once: {correct}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Load test: concurrent checkouts per gunicorn worker against a slow payment stub.
+
+Usage:
+    python checkout_benchmark.py [--clients 100] [--seconds 10] [--latency-ms 500] [--worker-classes sync gthread gevent]
+
+Starts the Daraja stub with --latency-ms on every call, then for each worker
+class boots one gunicorn worker (gunicorn.conf.py, "app:create_app()") pointed
+at it and has --clients concurrent buyers call
+POST /api/payments/tickets/<id>/purchase in a loop for --seconds. Each
+checkout waits on an OAuth token (cached after the first) and an STK push, so
+a worker's capacity is how many of those waits it can overlap. The
+ceiling is --clients / latency checkouts per second.
+
+The workers and the seeding process share the database, so the default is a
+temporary SQLite file in WAL mode; pass --database to use PostgreSQL.
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from http.server import ThreadingHTTPServer
+import requests
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+from app import create_app, db
+from config import Config
+from models import User, Event, Ticket
+from daraja_stub import DarajaStub
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_stub(latency):
+    """Run the Daraja stub in a thread; every push is accepted after `latency` seconds"""
+    handler = type('BenchmarkDarajaStub', (DarajaStub,), {'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def seed(clients):
+    """One paid event with plenty of tickets, and a buyer (with a token) per client"""
+    leader = User(name='Bench Leader', email='bench@campus.edu', role='verified_leader', password_hash='-')
+    db.session.add(leader)
+    db.session.flush()
+
+    event = Event(
+        title='Bench Concert', date=date.today() + timedelta(days=7), start_time=datetime(2030, 1, 1, 18).time(),
+        end_time=datetime(2030, 1, 1, 22).time(), location='Main Hall', created_by=leader.id, is_paid=True
+    )
+    db.session.add(event)
+    db.session.flush()
+
+    ticket = Ticket(
+        event_id=event.id, name='General', price=Decimal('500.00'), quantity=10 ** 9, sold_count=0,
+        sale_start_date=datetime.utcnow() - timedelta(days=1)
+    )
+    buyers = [User(name=f'Buyer {index}', email=f'buyer{index}@campus.edu', password_hash='-')
+              for index in range(clients)]
+    db.session.add(ticket)
+    db.session.add_all(buyers)
+    db.session.commit()
+
+    # Separate buyers keep each one well under the payments rate limit
+    return ticket.id, [create_access_token(identity=buyer.id) for buyer in buyers]
+
+def boot_worker(worker_class, port, env, threads, clients):
+    """Start one gunicorn worker of the given class and wait until it answers"""
+    env = dict(
+        env,
+        GUNICORN_WORKER_CLASS=worker_class,
+        WEB_CONCURRENCY='1',
+        GUNICORN_THREADS=str(threads if worker_class == 'gthread' else 1),
+        GUNICORN_WORKER_CONNECTIONS=str(clients)
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{port}', 'app:create_app()'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f'gunicorn ({worker_class}) exited:\n{server.stderr.read()[-4000:]}')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/health', timeout=5)
+            return server
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.kill()
+    raise SystemExit(f'gunicorn ({worker_class}) did not start within 30s')
+
+def buy_tickets(url, token, deadline, latencies, errors):
+    """Check out one ticket after another until the deadline"""
+    session = requests.Session()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = session.post(url, json={'quantity': 1, 'phone_number': '254700000000'},
+                                    headers=headers, timeout=120)
+            ok = response.status_code == 200 and response.json().get('success')
+        except requests.RequestException:
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(1)
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test checkout capacity per gunicorn worker')
+    parser.add_argument('--clients', type=int, default=100, help='Concurrent buyers')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--latency-ms', type=int, default=500, help='Delay the stub adds to every M-Pesa call')
+    parser.add_argument('--worker-classes', nargs='+', choices=('sync', 'gthread', 'gevent'),
+                        default=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--threads', type=int, default=8, help='Threads for the gthread worker')
+    parser.add_argument('--database', help='SQLAlchemy URL to use instead of a temporary SQLite file')
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    database = args.database or f"sqlite:///{os.path.join(workdir.name, 'bench.db')}"
+    stub = start_stub(args.latency_ms / 1000)
+
+    BenchmarkConfig.SQLALCHEMY_DATABASE_URI = database
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(text('PRAGMA journal_mode=WAL'))  # Kept by the database file
+        db.create_all()
+        ticket_id, tokens = seed(args.clients)
+        db.session.remove()
+        db.engine.dispose()
+
+    env = dict(
+        os.environ,
+        DATABASE_URL=database,
+        MPESA_BASE_URL=f'http://127.0.0.1:{stub.server_address[1]}',
+        JWT_SECRET_KEY=app.config['JWT_SECRET_KEY']
+    )
+    ceiling = args.clients / (args.latency_ms / 1000)
+    print(f'{args.clients} concurrent buyers for {args.seconds:.0f}s, M-Pesa stub latency {args.latency_ms}ms '
+          f'(ceiling {ceiling:,.0f} checkouts/s)')
+
+    for worker_class in args.worker_classes:
+        port = free_port()
+        server = boot_worker(worker_class, port, env, args.threads, args.clients)
+        url = f'http://127.0.0.1:{port}/api/payments/tickets/{ticket_id}/purchase'
+
+        latencies = []
+        errors = []
+        started = time.perf_counter()
+        buyers = [threading.Thread(target=buy_tickets, args=(
+            url, token, started + args.seconds, latencies, errors
+        )) for token in tokens]
+        for buyer in buyers:
+            buyer.start()
+        for buyer in buyers:
+            buyer.join()
+        duration = time.perf_counter() - started
+
+        server.terminate()
+        server.wait()
+
+        label = f'{worker_class} ({args.threads} threads)' if worker_class == 'gthread' else worker_class
+        if latencies:
+            print(f'{label:>20}: {len(latencies) / duration:8.1f} checkouts/s, '
+                  f'p50 {percentile(latencies, 0.5) * 1000:8.0f}ms  p99 {percentile(latencies, 0.99) * 1000:8.0f}ms, '
+                  f'{len(errors)} failed')
+        else:
+            print(f'{label:>20}: no checkouts completed, {len(errors)} failed')
+
+    stub.shutdown()
+
+if __name__ == '__main__':
+    main()
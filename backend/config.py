@@ -1,3 +1,4 @@
+import hashlib
 import os
 from dotenv import load_dotenv
 
@@ -8,6 +9,30 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///cems.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # PostgreSQL connection pool, sized per gunicorn worker (see services/database.py)
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY') or 1)  # gunicorn workers
+    GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS') or 1)
+    GUNICORN_WORKER_CLASS = os.environ.get('GUNICORN_WORKER_CLASS') or 'sync'  # sync, gthread or gevent
+    GUNICORN_WORKER_CONNECTIONS = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS') or 100)
+    DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS') or 20)  # Budget shared by all workers
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 0)  # 0 = derive from threads
+    DB_MAX_OVERFLOW = int(os.environ['DB_MAX_OVERFLOW']) if os.environ.get('DB_MAX_OVERFLOW') else None
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 10)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)
+    DB_POOL_WAIT_WARN_MS = int(os.environ.get('DB_POOL_WAIT_WARN_MS') or 100)
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or 15000)
+    # `flask` commands (archiving, reconciliation, backfills) scan far more rows; 0 = no timeout
+    DB_CLI_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_CLI_STATEMENT_TIMEOUT_MS') or 0)
+    DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', '').lower() in ('1', 'true', 'yes')
+    
+    # Read replicas (comma separated URLs) for @read_replica views
+    DATABASE_REPLICA_URLS = [url for url in (os.environ.get('DATABASE_REPLICA_URLS') or '').split(',') if url]
+    SQLALCHEMY_BINDS = {f'replica_{index}': url for index, url in enumerate(DATABASE_REPLICA_URLS)}
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS') or 5)
+    REPLICA_LAG_CHECK_INTERVAL = 5
+    REPLICA_READ_YOUR_WRITES_SECONDS = int(os.environ.get('REPLICA_READ_YOUR_WRITES_SECONDS') or 30)
+    REPLICA_STATE_URL = os.environ.get('REPLICA_STATE_URL') or os.environ.get('RATELIMIT_STORAGE_URL') or 'memory://'
+    
     # JWT Configuration
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = False  # Tokens don't expire for demo purposes
@@ -15,14 +40,152 @@ class Config:
     # SendGrid Configuration
     SENDGRID_API_KEY = os.environ.get('SENDGRID_API_KEY')
     FROM_EMAIL = os.environ.get('FROM_EMAIL') or 'noreply@campus.edu'
+    SENDGRID_API_URL = os.environ.get('SENDGRID_API_URL') or 'https://api.sendgrid.com/v3/mail/send'
+    
+    # Email outbox worker (flask send-emails); backend is sendgrid, smtp or console
+    EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND') or ('sendgrid' if SENDGRID_API_KEY else 'console')
+    SMTP_HOST = os.environ.get('SMTP_HOST') or 'localhost'
+    SMTP_PORT = int(os.environ.get('SMTP_PORT') or 1025)
+    EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE') or 500)
+    EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS') or 5)
+    EMAIL_LEASE_SECONDS = 300
     
     # Cloudinary Configuration
     CLOUDINARY_CLOUD_NAME = os.environ.get('CLOUDINARY_CLOUD_NAME')
     CLOUDINARY_API_KEY = os.environ.get('CLOUDINARY_API_KEY')
     CLOUDINARY_API_SECRET = os.environ.get('CLOUDINARY_API_SECRET')
     
+    # Image uploads: files stream to UPLOAD_TMP_DIR, variants are stored in
+    # Cloudinary when configured, otherwise under UPLOAD_FOLDER
+    MEDIA_STORAGE = os.environ.get('MEDIA_STORAGE') or ('cloudinary' if CLOUDINARY_CLOUD_NAME else 'local')
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+    UPLOAD_TMP_DIR = os.environ.get('UPLOAD_TMP_DIR') or os.path.join(UPLOAD_FOLDER, 'tmp')
+    MEDIA_URL = os.environ.get('MEDIA_URL') or '/api/media/files'
+    MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10 MB per request
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS') or 2)
+    IMAGE_SIZES = {'thumb': 150, 'small': 480, 'medium': 960, 'large': 1600}
+    IMAGE_PROCESSING_TIMEOUT_SECONDS = int(os.environ.get('IMAGE_PROCESSING_TIMEOUT_SECONDS') or 600)
+    
     # CORS Configuration
     FRONTEND_URL = os.environ.get('FRONTEND_URL') or 'http://localhost:3000'
+    
+    # Report exports (rows fetched per server-side cursor batch)
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE') or 1000)
+    
+    # Bulk ticket operations (items accepted per request)
+    BULK_TICKET_MAX_ITEMS = int(os.environ.get('BULK_TICKET_MAX_ITEMS') or 10000)
+    
+    # Trial/subscription expiry sweeper (flask expire-subscriptions)
+    EXPIRY_SWEEP_BATCH_SIZE = int(os.environ.get('EXPIRY_SWEEP_BATCH_SIZE') or 1000)
+    
+    # Admin audit log: entries are buffered and written by a background thread every
+    # AUDIT_FLUSH_SECONDS, or once AUDIT_BUFFER_SIZE are waiting (financial ones are not buffered)
+    AUDIT_BUFFER_SIZE = int(os.environ.get('AUDIT_BUFFER_SIZE') or 100)
+    AUDIT_FLUSH_SECONDS = float(os.environ.get('AUDIT_FLUSH_SECONDS') or 1)
+    
+    # Idempotency-Key responses are replayed for this long
+    IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS') or 24)
+    # A key still 'processing' after this long belongs to a crashed request and a
+    # retry may take it over; keep it above the slowest request (two MPESA_TIMEOUTs)
+    IDEMPOTENCY_LOCK_TIMEOUT_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT_SECONDS') or 120)
+    
+    # M-Pesa (Daraja) configuration; MPESA_BASE_URL overrides the Safaricom host (e.g. a local stub)
+    MPESA_ENVIRONMENT = os.environ.get('MPESA_ENVIRONMENT') or 'sandbox'  # Change to 'production' for live
+    MPESA_CONSUMER_KEY = os.environ.get('MPESA_CONSUMER_KEY') or 'your_consumer_key'
+    MPESA_CONSUMER_SECRET = os.environ.get('MPESA_CONSUMER_SECRET') or 'your_consumer_secret'
+    MPESA_SHORTCODE = os.environ.get('MPESA_SHORTCODE') or '174379'  # Sandbox shortcode
+    MPESA_PASSKEY = os.environ.get('MPESA_PASSKEY') or 'your_passkey'
+    MPESA_CALLBACK_URL = os.environ.get('MPESA_CALLBACK_URL') or 'https://your-domain.com/api/payments/mpesa/callback'
+    MPESA_BASE_URL = os.environ.get('MPESA_BASE_URL')
+    MPESA_TIMEOUT = int(os.environ.get('MPESA_TIMEOUT') or 30)
+    MPESA_POOL_SIZE = int(os.environ.get('MPESA_POOL_SIZE') or 20)
+    
+    # M-Pesa B2C (refund payouts); results are posted to MPESA_B2C_RESULT_URL
+    MPESA_B2C_SHORTCODE = os.environ.get('MPESA_B2C_SHORTCODE') or MPESA_SHORTCODE
+    MPESA_B2C_INITIATOR = os.environ.get('MPESA_B2C_INITIATOR') or 'testapi'
+    MPESA_B2C_SECURITY_CREDENTIAL = os.environ.get('MPESA_B2C_SECURITY_CREDENTIAL') or 'your_security_credential'
+    MPESA_B2C_RESULT_URL = os.environ.get('MPESA_B2C_RESULT_URL') or 'https://your-domain.com/api/payments/mpesa/b2c/result'
+    MPESA_B2C_TIMEOUT_URL = os.environ.get('MPESA_B2C_TIMEOUT_URL') or 'https://your-domain.com/api/payments/mpesa/b2c/timeout'
+    # Appended to both B2C URLs; results posted without it are refused
+    MPESA_B2C_CALLBACK_TOKEN = (os.environ.get('MPESA_B2C_CALLBACK_TOKEN')
+                                or hashlib.sha256(f'b2c-callback:{SECRET_KEY}'.encode()).hexdigest()[:32])
+    
+    # Event refund jobs (flask process-refunds): purchases reversed per batch, and
+    # how many B2C refund calls run at once, at most REFUND_RATE per second
+    REFUND_BATCH_SIZE = int(os.environ.get('REFUND_BATCH_SIZE') or 500)
+    REFUND_CONCURRENCY = int(os.environ.get('REFUND_CONCURRENCY') or 4)
+    REFUND_RATE = float(os.environ.get('REFUND_RATE') or 5)
+    REFUND_MAX_ATTEMPTS = int(os.environ.get('REFUND_MAX_ATTEMPTS') or 3)
+    # Refunds still sending (no answer) or sent (no result) after this long need a
+    # person to check the M-Pesa statement and resolve them
+    REFUND_UNCONFIRMED_MINUTES = int(os.environ.get('REFUND_UNCONFIRMED_MINUTES') or 60)
+    
+    # New club events are announced to members by `flask send-notifications`, NOTIFY_BATCH_SIZE
+    # members per batch, over each member's preferred channel or NOTIFY_DEFAULT_CHANNEL
+    NOTIFY_BATCH_SIZE = int(os.environ.get('NOTIFY_BATCH_SIZE') or 500)
+    NOTIFY_DEFAULT_CHANNEL = os.environ.get('NOTIFY_DEFAULT_CHANNEL') or 'email'  # email or console
+    
+    # Trending events: RSVPs and ticket sales (TRENDING_PURCHASE_WEIGHT per ticket) lose half their
+    # weight every TRENDING_HALF_LIFE_HOURS; `flask update-trending` applies them in batches
+    TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS') or 24)
+    TRENDING_PURCHASE_WEIGHT = float(os.environ.get('TRENDING_PURCHASE_WEIGHT') or 3)
+    TRENDING_BATCH_SIZE = int(os.environ.get('TRENDING_BATCH_SIZE') or 2000)
+    
+    # Event recommendations (flask build-recommendations): events kept per student, and
+    # students rewritten per transaction
+    RECOMMEND_TOP_K = int(os.environ.get('RECOMMEND_TOP_K') or 20)
+    RECOMMEND_BATCH_SIZE = int(os.environ.get('RECOMMEND_BATCH_SIZE') or 500)
+    
+    # iCalendar feeds: events from CALENDAR_PAST_DAYS ago onwards, times converted from campus
+    # local time (UTC+CALENDAR_UTC_OFFSET_HOURS), clients told to re-poll after CALENDAR_MAX_AGE seconds
+    CALENDAR_PAST_DAYS = int(os.environ.get('CALENDAR_PAST_DAYS') or 30)
+    CALENDAR_UTC_OFFSET_HOURS = float(os.environ.get('CALENDAR_UTC_OFFSET_HOURS') or 3)  # East Africa Time
+    CALENDAR_MAX_AGE = int(os.environ.get('CALENDAR_MAX_AGE') or 300)
+    
+    # Callbacks stored in the inbox are applied by `flask process-callbacks` in batches
+    CALLBACK_BATCH_SIZE = int(os.environ.get('CALLBACK_BATCH_SIZE') or 200)
+    
+    # Pending purchases with no callback after STK_QUERY_AFTER_MINUTES are checked with the
+    # STK Push Query API (flask reconcile-payments); past STK_QUERY_MAX_AGE_HOURS they fail
+    STK_QUERY_AFTER_MINUTES = int(os.environ.get('STK_QUERY_AFTER_MINUTES') or 5)
+    STK_QUERY_MAX_AGE_HOURS = int(os.environ.get('STK_QUERY_MAX_AGE_HOURS') or 24)
+    STK_QUERY_BATCH_SIZE = int(os.environ.get('STK_QUERY_BATCH_SIZE') or 100)
+    STK_QUERY_CONCURRENCY = int(os.environ.get('STK_QUERY_CONCURRENCY') or 8)
+    STK_QUERY_RATE = float(os.environ.get('STK_QUERY_RATE') or 20)  # Queries per second
+    
+    # Platform commission on ticket sales; organizers on a plan pay that plan's rate when set,
+    # and a rate stored on the organizer (users.platform_fee_rate) overrides both
+    PLATFORM_FEE_RATE = os.environ.get('PLATFORM_FEE_RATE') or '0.05'
+    PLATFORM_FEE_RATES = {
+        'basic': os.environ.get('PLATFORM_FEE_RATE_BASIC'),
+        'premium': os.environ.get('PLATFORM_FEE_RATE_PREMIUM')
+    }
+    COMMISSION_BATCH_SIZE = int(os.environ.get('COMMISSION_BATCH_SIZE') or 1000)
+    
+    # Purchases of events older than ARCHIVE_AFTER_MONTHS move to the archive tables
+    # (flask archive-purchases), ARCHIVE_BATCH_SIZE purchases per transaction
+    ARCHIVE_AFTER_MONTHS = int(os.environ.get('ARCHIVE_AFTER_MONTHS') or 12)
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE') or 500)
+    
+    # Ledger reconciliation (flask reconcile-ledger): purchases per chunk, and how old a
+    # purchase must be before it is checked (its callback should have landed by then)
+    RECONCILE_CHUNK_SIZE = int(os.environ.get('RECONCILE_CHUNK_SIZE') or 5000)
+    RECONCILE_SETTLE_MINUTES = int(os.environ.get('RECONCILE_SETTLE_MINUTES') or 60)
+    
+    # Ticket codes are signed with this key (rotate to invalidate all codes)
+    TICKET_SIGNING_KEY = os.environ.get('TICKET_SIGNING_KEY') or SECRET_KEY
+    
+    # Proxies in front of gunicorn whose X-Forwarded-For entries are trusted
+    # (1 on Render); 0 uses the connecting address as the client's
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS') or 0)
+    
+    # Rate limiting (use a redis:// URL to share limits across gunicorn workers)
+    RATELIMIT_ENABLED = True
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL') or 'memory://'
+    RATELIMIT_AUTH = '5/minute'
+    RATELIMIT_USER = '100/minute'
+    RATELIMIT_PUBLIC = '50/minute'
+    RATELIMIT_CHECKIN = '3000/minute'  # Door scanners at large events
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -36,6 +199,7 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///cems_test.db'
     WTF_CSRF_ENABLED = False
+    RATELIMIT_ENABLED = False
 
 config = {
     'development': DevelopmentConfig,
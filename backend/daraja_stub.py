@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Daraja (M-Pesa) API, for development and load tests.
+
+Usage:
+    python daraja_stub.py [--port 8089] [--latency-ms 50] [--success-rate 0.8] [--pending-rate 0.1]
+    MPESA_BASE_URL=http://localhost:8089 flask reconcile-payments
+
+Serves the OAuth token, STK push and STK push query endpoints. The outcome of
+each checkout is derived from its id, so repeated queries agree.
+"""
+
+import argparse
+import hashlib
+import json
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class DarajaStub(BaseHTTPRequestHandler):
+    latency = 0.0
+    success_rate = 0.8
+    pending_rate = 0.1
+
+    def send_json(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def outcome(self, checkout_request_id):
+        """'pending', 'success' or 'cancelled', fixed per checkout id"""
+        roll = int(hashlib.sha256(checkout_request_id.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+        if roll < self.pending_rate:
+            return 'pending'
+        if roll < self.pending_rate + self.success_rate:
+            return 'success'
+        return 'cancelled'
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if self.path.startswith('/oauth/v1/generate'):
+            return self.send_json({'access_token': 'stub-token', 'expires_in': '3599'})
+        self.send_json({'errorMessage': 'Not found'}, 404)
+
+    def do_POST(self):
+        time.sleep(self.latency)
+        payload = self.read_json()
+
+        if self.path == '/mpesa/stkpush/v1/processrequest':
+            return self.send_json({
+                'MerchantRequestID': uuid.uuid4().hex,
+                'CheckoutRequestID': f'ws_CO_{uuid.uuid4().hex}',
+                'ResponseCode': '0',
+                'ResponseDescription': 'Success. Request accepted for processing',
+                'CustomerMessage': 'Success. Request accepted for processing'
+            })
+
+        if self.path == '/mpesa/stkpushquery/v1/query':
+            checkout_request_id = payload.get('CheckoutRequestID', '')
+            outcome = self.outcome(checkout_request_id)
+            if outcome == 'pending':
+                return self.send_json({
+                    'requestId': uuid.uuid4().hex,
+                    'errorCode': '500.001.1001',
+                    'errorMessage': 'The transaction is being processed'
+                }, 500)
+            return self.send_json({
+                'ResponseCode': '0',
+                'CheckoutRequestID': checkout_request_id,
+                'ResultCode': '0' if outcome == 'success' else '1032',
+                'ResultDesc': 'The service request is processed successfully.'
+                if outcome == 'success' else 'Request cancelled by user'
+            })
+
+        self.send_json({'errorMessage': 'Not found'}, 404)
+
+    def log_message(self, format, *args):
+        pass  # Keep load tests quiet
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local Daraja API stub')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=int, default=50, help='Delay added to every response')
+    parser.add_argument('--success-rate', type=float, default=0.8)
+    parser.add_argument('--pending-rate', type=float, default=0.1)
+    args = parser.parse_args()
+
+    DarajaStub.latency = args.latency_ms / 1000
+    DarajaStub.success_rate = args.success_rate
+    DarajaStub.pending_rate = args.pending_rate
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), DarajaStub)
+    print(f'Daraja stub listening on http://127.0.0.1:{args.port}')
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+from functools import wraps
+from datetime import datetime
+from flask import jsonify
+from flask_jwt_extended import get_jwt_identity
+from models import User, Subscription
+
+def admin_required(fn):
+    """Allow only admin users (use after @jwt_required)"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        user = User.query.get(get_jwt_identity())
+
+        if not user or user.role != 'admin':
+            return jsonify({
+                'success': False,
+                'message': 'Admin access required'
+            }), 403
+
+        return fn(*args, **kwargs)
+    return wrapper
+
+def premium_required(fn):
+    """Allow only verified leaders with an active premium subscription (use after @jwt_required)"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+
+        if not user or user.role != 'verified_leader':
+            return jsonify({
+                'success': False,
+                'message': 'Only verified leaders can access this feature'
+            }), 403
+
+        now = datetime.utcnow()
+        premium_subscription = Subscription.query.filter(
+            Subscription.user_id == current_user_id,
+            Subscription.plan_type == 'premium',
+            Subscription.status == 'active',
+            Subscription.start_date <= now,
+            Subscription.end_date >= now
+        ).first()
+
+        if not premium_subscription:
+            return jsonify({
+                'success': False,
+                'message': 'This feature requires an active Premium subscription'
+            }), 403
+
+        return fn(*args, **kwargs)
+    return wrapper
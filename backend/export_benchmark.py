@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Benchmark: streaming report exports, rows/sec and peak memory.
+
+Usage:
+    python export_benchmark.py [--rows 1000000] [--formats csv ndjson]
+
+Seeds a SQLite database (in memory unless --database is given) with one
+premium organizer's purchases, commissions and registrations, then downloads
+each export through /api/reports/export/... and reads the response chunk by
+chunk, as a client would. Each export is run twice: once timed, and once under
+tracemalloc to find the most Python memory held at any point while streaming.
+That peak should stay flat as --rows grows.
+"""
+
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from config import TestingConfig
+from models import User, Event, Ticket, Purchase, Commission, Registration, Subscription
+
+class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+EXPORTS = ('purchases', 'commissions', 'registrations')
+
+def seed(rows, chunk=100000):
+    """Create rows purchases (each with a commission) and rows registrations for one organizer"""
+    leader = User(name='Bench Leader', email='bench@campus.edu', role='verified_leader')
+    leader.set_password('password123')
+    db.session.add(leader)
+    db.session.flush()
+
+    now = datetime.utcnow()
+    db.session.add(Subscription(
+        user_id=leader.id, plan_type='premium', monthly_fee=Decimal('1000.00'),
+        start_date=now - timedelta(days=1), end_date=now + timedelta(days=30), status='active'
+    ))
+
+    # Registrations are unique per (student, event), so spread them over a grid
+    events = 1000
+    buyers = -(-rows // events)
+    db.session.bulk_insert_mappings(User, [{
+        'id': leader.id + index + 1,
+        'name': f'Buyer {index}',
+        'email': f'buyer{index}@campus.edu',
+        'password_hash': '-',
+        'role': 'student'
+    } for index in range(buyers)])
+
+    start = datetime(2030, 1, 1, 18, 0)
+    db.session.bulk_insert_mappings(Event, [{
+        'id': index + 1,
+        'title': f'Event {index}',
+        'date': date(2030, 1, 1) + timedelta(days=index % 365),
+        'start_time': start.time(),
+        'end_time': (start + timedelta(hours=2)).time(),
+        'location': f'Hall {index}',
+        'created_by': leader.id,
+        'is_paid': True,
+        'created_at': start
+    } for index in range(events)])
+    db.session.bulk_insert_mappings(Ticket, [{
+        'id': index + 1,
+        'event_id': index + 1,
+        'name': 'General',
+        'price': Decimal('500.00'),
+        'quantity': buyers,
+        'sold_count': buyers
+    } for index in range(events)])
+    db.session.commit()
+
+    for offset in range(0, rows, chunk):
+        ids = range(offset + 1, min(rows, offset + chunk) + 1)
+        db.session.bulk_insert_mappings(Purchase, [{
+            'id': purchase_id,
+            'user_id': leader.id + purchase_id % buyers + 1,
+            'ticket_id': purchase_id % events + 1,
+            'quantity': 1,
+            'unit_price': Decimal('500.00'),
+            'total_amount': Decimal('500.00'),
+            'mpesa_code': f'BENCH{purchase_id:08d}',
+            'payment_phone': '254700000000',
+            'status': 'completed',
+            'created_at': now
+        } for purchase_id in ids])
+        db.session.bulk_insert_mappings(Commission, [{
+            'id': purchase_id,
+            'purchase_id': purchase_id,
+            'platform_fee_rate': Decimal('0.0500'),
+            'platform_fee_amount': Decimal('25.00'),
+            'organizer_amount': Decimal('475.00'),
+            'payout_status': 'pending',
+            'created_at': now
+        } for purchase_id in ids])
+        db.session.bulk_insert_mappings(Registration, [{
+            'id': registration_id,
+            'student_id': leader.id + (registration_id - 1) // events + 1,
+            'event_id': (registration_id - 1) % events + 1,
+            'status': 'going',
+            'created_at': now
+        } for registration_id in ids])
+        db.session.commit()
+
+    return leader.id
+
+def download(client, token, name, export_format):
+    """Read an export chunk by chunk; returns (rows, bytes)"""
+    response = client.get(
+        f'/api/reports/export/{name}?format={export_format}',
+        headers={'Authorization': f'Bearer {token}'},
+        buffered=False
+    )
+    assert response.status_code == 200, response.status_code
+
+    size = 0
+    lines = 0
+    for chunk in response.response:
+        size += len(chunk)
+        lines += chunk.count('\n' if isinstance(chunk, str) else b'\n')
+    response.close()
+    return lines - (export_format == 'csv'), size  # The CSV header isn't a row
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark streaming CSV/NDJSON report exports')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--formats', nargs='+', choices=('csv', 'ndjson'), default=['csv', 'ndjson'])
+    parser.add_argument('--database', help='SQLAlchemy URL to use instead of in-memory SQLite')
+    args = parser.parse_args()
+
+    if args.database:
+        BenchmarkConfig.SQLALCHEMY_DATABASE_URI = args.database
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        leader_id = seed(args.rows)
+        print(f'Seeded {args.rows} rows per export in {time.perf_counter() - started:.1f}s')
+        token = create_access_token(identity=leader_id)
+        db.session.remove()
+
+    client = app.test_client()
+    for name in EXPORTS:
+        for export_format in args.formats:
+            started = time.perf_counter()
+            rows, size = download(client, token, name, export_format)
+            duration = time.perf_counter() - started
+
+            tracemalloc.start()
+            download(client, token, name, export_format)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(f'{name:>13} {export_format:>6}: {rows} rows, {size / 1e6:7.1f}MB in {duration:6.1f}s '
+                  f'({rows / duration:9,.0f} rows/s), peak {peak / 1e6:6.2f}MB')
+
+if __name__ == '__main__':
+    main()
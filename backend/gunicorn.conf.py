@@ -0,0 +1,16 @@
+import os
+
+# Mirrors the WEB_CONCURRENCY / GUNICORN_* settings that config.py uses to size
+# the database pool, so both always agree.
+workers = int(os.environ.get('WEB_CONCURRENCY') or 1)
+threads = int(os.environ.get('GUNICORN_THREADS') or 1)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or 'sync'  # sync, gthread or gevent
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS') or 100)
+timeout = 60
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        # gunicorn monkey-patches the stdlib for gevent workers, but psycopg2 is a
+        # C extension and needs its own wait callback to yield while waiting on Postgres
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
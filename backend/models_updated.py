@@ -1,7 +1,9 @@
+import json
 from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
+from money import to_cents, from_cents
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -15,6 +17,7 @@ class User(db.Model):
     subscription_status = db.Column(db.String(20), default='trial')  # trial, active, expired, cancelled
     trial_end_date = db.Column(db.DateTime)
     phone_number = db.Column(db.String(15))
+    platform_fee_rate = db.Column(db.Numeric(5, 4))  # Per-organizer commission override, e.g. 0.0300
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -23,6 +26,11 @@ class User(db.Model):
     purchases = db.relationship('Purchase', backref='user', lazy=True, cascade='all, delete-orphan')
     subscriptions = db.relationship('Subscription', backref='user', lazy=True, cascade='all, delete-orphan')
     
+    # Used by the expiry sweeper to find trials that have run out
+    __table_args__ = (
+        db.Index('ix_users_subscription_status_trial_end_date', 'subscription_status', 'trial_end_date'),
+    )
+    
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
     
@@ -63,6 +71,7 @@ class Club(db.Model):
     
     # Relationships
     events = db.relationship('Event', backref='club', lazy=True)
+    members = db.relationship('ClubMember', backref='club', lazy='dynamic', cascade='all, delete-orphan')
     
     def to_dict(self, include_events=False):
         result = {
@@ -96,11 +105,21 @@ class Event(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     is_paid = db.Column(db.Boolean, default=False)
     image_url = db.Column(db.String(255))
+    trending_score = db.Column(db.Float, default=0, server_default='0', nullable=False, index=True)  # See services/trending.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Calendar feed ETags
     
     # Relationships
     tickets = db.relationship('Ticket', backref='event', lazy=True, cascade='all, delete-orphan')
     
+    # Venue double-booking checks look up one room's events on one day (services/venues.py);
+    # club and campus calendar feeds read upcoming events by club and by date
+    __table_args__ = (
+        db.Index('ix_events_location_date_start_time', 'location', 'date', 'start_time'),
+        db.Index('ix_events_club_id_date', 'club_id', 'date'),
+        db.Index('ix_events_date', 'date'),
+    )
+    
     def total_revenue(self):
         """Calculate total revenue from all ticket sales"""
         return sum(ticket.total_revenue() for ticket in self.tickets)
@@ -124,7 +143,7 @@ class Event(db.Model):
             'creator_name': self.creator.name,
             'is_paid': self.is_paid,
             'image_url': self.image_url,
-            'total_revenue': self.total_revenue(),
+            'total_revenue': float(self.total_revenue()),
             'tickets_sold': self.total_tickets_sold(),
             'created_at': self.created_at.isoformat()
         }
@@ -141,7 +160,7 @@ class Ticket(db.Model):
     event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)  # e.g., "Early Bird", "VIP", "General"
     description = db.Column(db.Text)
-    price = db.Column(db.Decimal(10, 2), nullable=False)
+    price = db.Column(db.Numeric(10, 2), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     sold_count = db.Column(db.Integer, default=0)
     sale_start_date = db.Column(db.DateTime, default=datetime.utcnow)
@@ -164,7 +183,7 @@ class Ticket(db.Model):
     
     def total_revenue(self):
         """Calculate total revenue from this ticket type"""
-        return float(self.price) * self.sold_count
+        return from_cents(to_cents(self.price) * (self.sold_count or 0))
     
     def to_dict(self):
         return {
@@ -179,7 +198,7 @@ class Ticket(db.Model):
             'is_available': self.is_available(),
             'sale_start_date': self.sale_start_date.isoformat(),
             'sale_end_date': self.sale_end_date.isoformat() if self.sale_end_date else None,
-            'total_revenue': self.total_revenue(),
+            'total_revenue': float(self.total_revenue()),
             'created_at': self.created_at.isoformat()
         }
 
@@ -190,16 +209,24 @@ class Purchase(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
-    unit_price = db.Column(db.Decimal(10, 2), nullable=False)
-    total_amount = db.Column(db.Decimal(10, 2), nullable=False)
+    unit_price = db.Column(db.Numeric(10, 2), nullable=False)
+    total_amount = db.Column(db.Numeric(10, 2), nullable=False)
     mpesa_code = db.Column(db.String(50))
     payment_phone = db.Column(db.String(15))
+    checkout_request_id = db.Column(db.String(100), unique=True)  # From the STK push, matches the callback
     status = db.Column(db.String(20), default='pending')  # pending, completed, failed, refunded
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     commission = db.relationship('Commission', backref='purchase', uselist=False, cascade='all, delete-orphan')
     
+    # (ticket_id, status) sums completed purchases per ticket for sold_count reconciliation;
+    # (status, created_at) finds stale pending purchases for the STK status reconciler
+    __table_args__ = (
+        db.Index('ix_purchases_ticket_id_status', 'ticket_id', 'status'),
+        db.Index('ix_purchases_status_created_at', 'status', 'created_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -222,17 +249,21 @@ class Subscription(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     plan_type = db.Column(db.String(50), nullable=False)  # basic, premium
-    monthly_fee = db.Column(db.Decimal(10, 2), nullable=False)
+    monthly_fee = db.Column(db.Numeric(10, 2), nullable=False)
     start_date = db.Column(db.DateTime, nullable=False)
     end_date = db.Column(db.DateTime, nullable=False)
     status = db.Column(db.String(20), default='active')  # active, cancelled, expired
     stripe_subscription_id = db.Column(db.String(100))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Used by the expiry sweeper to find subscriptions past their end date
+    __table_args__ = (
+        db.Index('ix_subscriptions_status_end_date', 'status', 'end_date'),
+    )
+    
     def is_active(self):
-        """Check if subscription is currently active"""
-        now = datetime.utcnow()
-        return self.status == 'active' and self.start_date <= now <= self.end_date
+        """Check if subscription is currently active (status is kept current by the expiry sweeper)"""
+        return self.status == 'active'
     
     def to_dict(self):
         return {
@@ -251,13 +282,13 @@ class Commission(db.Model):
     __tablename__ = 'commissions'
     
     id = db.Column(db.Integer, primary_key=True)
-    purchase_id = db.Column(db.Integer, db.ForeignKey('purchases.id'), nullable=False)
-    platform_fee_rate = db.Column(db.Decimal(5, 4), nullable=False)  # e.g., 0.0500 for 5%
-    platform_fee_amount = db.Column(db.Decimal(10, 2), nullable=False)
-    organizer_amount = db.Column(db.Decimal(10, 2), nullable=False)
-    payout_status = db.Column(db.String(20), default='pending')  # pending, paid, failed
+    purchase_id = db.Column(db.Integer, db.ForeignKey('purchases.id'), nullable=False, index=True)
+    platform_fee_rate = db.Column(db.Numeric(5, 4), nullable=False)  # e.g., 0.0500 for 5%
+    platform_fee_amount = db.Column(db.Numeric(10, 2), nullable=False)
+    organizer_amount = db.Column(db.Numeric(10, 2), nullable=False)
+    payout_status = db.Column(db.String(20), default='pending')  # pending, paid, failed, reversed, clawback
     payout_date = db.Column(db.DateTime)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Recent-revenue queries
     
     def to_dict(self):
         return {
@@ -269,4 +300,410 @@ class Commission(db.Model):
             'payout_status': self.payout_status,
             'payout_date': self.payout_date.isoformat() if self.payout_date else None,
             'created_at': self.created_at.isoformat()
-        }
\ No newline at end of file
+        }
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(255), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), default='processing')  # processing, completed
+    response_code = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, default=datetime.utcnow)  # When the current 'processing' claim was taken
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    # The unique constraint is what makes concurrent duplicates safe
+    __table_args__ = (db.UniqueConstraint('user_id', 'endpoint', 'key'),)
+    
+    def is_expired(self):
+        """Check if the stored response is past its TTL"""
+        return datetime.utcnow() > self.expires_at
+
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(120), nullable=False)
+    to_name = db.Column(db.String(100))
+    template = db.Column(db.String(50), nullable=False)  # leader_approved, leader_rejected, ticket_confirmation, event_announcement
+    context = db.Column(db.Text, default='{}')  # JSON values for the template
+    dedupe_key = db.Column(db.String(150), unique=True, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    sent_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # The worker polls for due messages by (status, next_attempt_at)
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+class IssuedTicket(db.Model):
+    __tablename__ = 'issued_tickets'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    purchase_id = db.Column(db.Integer, db.ForeignKey('purchases.id'), nullable=False, index=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False, index=True)
+    code = db.Column(db.String(64), unique=True, nullable=False)  # Signed code shown as a QR
+    status = db.Column(db.String(20), default='valid')  # valid, revoked
+    checked_in_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'purchase_id': self.purchase_id,
+            'event_id': self.event_id,
+            'code': self.code,
+            'status': self.status,
+            'checked_in_at': self.checked_in_at.isoformat() if self.checked_in_at else None,
+            'created_at': self.created_at.isoformat()
+        }
+
+class ImageAsset(db.Model):
+    __tablename__ = 'image_assets'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), unique=True, nullable=False)  # SHA-256 of the upload
+    status = db.Column(db.String(20), default='processing')  # processing, ready, failed
+    variants = db.Column(db.Text, default='{}')  # JSON {variant name: url}
+    targets = db.Column(db.Text, default='[]')  # JSON [[kind, id], ...] waiting for the image
+    error = db.Column(db.Text)
+    processing_started_at = db.Column(db.DateTime)  # Stale after IMAGE_PROCESSING_TIMEOUT_SECONDS
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Finds assets whose processing never finished (pool worker or web process died)
+    __table_args__ = (
+        db.Index('ix_image_assets_status_processing_started_at', 'status', 'processing_started_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'content_hash': self.content_hash,
+            'status': self.status,
+            'variants': json.loads(self.variants or '{}'),
+            'error': self.error,
+            'created_at': self.created_at.isoformat()
+        }
+
+class LedgerCheckpoint(db.Model):
+    __tablename__ = 'ledger_checkpoints'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)  # e.g. purchases
+    last_id = db.Column(db.Integer, nullable=False, default=0)  # Everything up to this id has been checked
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class LedgerMismatch(db.Model):
+    __tablename__ = 'ledger_mismatches'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)  # commission_split, missing_commission, sold_count
+    object_id = db.Column(db.Integer, nullable=False)  # Purchase id, or ticket id for sold_count
+    expected = db.Column(db.String(50))
+    actual = db.Column(db.String(50))
+    status = db.Column(db.String(20), default='open')  # open, repaired
+    detected_at = db.Column(db.DateTime, default=datetime.utcnow)
+    resolved_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_ledger_mismatches_kind_object_id', 'kind', 'object_id'),
+        db.Index('ix_ledger_mismatches_status_detected_at', 'status', 'detected_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'object_id': self.object_id,
+            'expected': self.expected,
+            'actual': self.actual,
+            'status': self.status,
+            'detected_at': self.detected_at.isoformat(),
+            'resolved_at': self.resolved_at.isoformat() if self.resolved_at else None
+        }
+
+class MpesaCallback(db.Model):
+    __tablename__ = 'mpesa_callbacks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    checkout_request_id = db.Column(db.String(100), index=True)
+    payload = db.Column(db.Text, nullable=False)  # Raw callback body as received
+    status = db.Column(db.String(20), default='received')  # received, processed, ignored, invalid
+    purchase_id = db.Column(db.Integer, db.ForeignKey('purchases.id'))
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+    
+    # The callback worker drains received rows in id order
+    __table_args__ = (
+        db.Index('ix_mpesa_callbacks_status_id', 'status', 'id'),
+    )
+
+class RefundJob(db.Model):
+    __tablename__ = 'refund_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False, index=True)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    reason = db.Column(db.Text)
+    status = db.Column(db.String(20), default='reversing')  # reversing, paying, completed
+    total_purchases = db.Column(db.Integer, default=0)
+    reversed_count = db.Column(db.Integer, default=0)
+    last_purchase_id = db.Column(db.Integer, default=0)  # Reversal resumes after this purchase
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+    
+    def to_dict(self, refund_counts=None):
+        return {
+            'id': self.id,
+            'event_id': self.event_id,
+            'requested_by': self.requested_by,
+            'reason': self.reason,
+            'status': self.status,
+            'total_purchases': self.total_purchases,
+            'reversed_count': self.reversed_count,
+            'refunds': refund_counts or {},
+            'created_at': self.created_at.isoformat(),
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+class Refund(db.Model):
+    __tablename__ = 'refunds'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('refund_jobs.id'))
+    purchase_id = db.Column(db.Integer, db.ForeignKey('purchases.id'), unique=True, nullable=False)  # One refund per purchase
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    phone_number = db.Column(db.String(15))
+    status = db.Column(db.String(20), default='queued')  # queued, sending, sent, completed, failed
+    attempts = db.Column(db.Integer, default=0)
+    conversation_id = db.Column(db.String(100), unique=True)  # B2C ConversationID, matches the result callback
+    mpesa_code = db.Column(db.String(50))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    attempted_at = db.Column(db.DateTime)  # Last B2C call started; 'sending' this long ago is unconfirmed
+    sent_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    
+    # The refund worker claims queued refunds per job
+    __table_args__ = (
+        db.Index('ix_refunds_job_id_status', 'job_id', 'status'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_id': self.job_id,
+            'purchase_id': self.purchase_id,
+            'amount': float(self.amount),
+            'phone_number': self.phone_number,
+            'status': self.status,
+            'attempts': self.attempts,
+            'mpesa_code': self.mpesa_code,
+            'last_error': self.last_error,
+            'attempted_at': self.attempted_at.isoformat() if self.attempted_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+# Purchases of long-past events are moved here by `flask archive-purchases`. On
+# PostgreSQL the archive tables are range-partitioned by month of created_at
+# (partitions are created as rows arrive) so date-bounded queries prune to the
+# months they touch; other databases get plain tables with the same columns.
+class PurchaseArchive(db.Model):
+    __tablename__ = 'purchases_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    # Partition key must be in the primary key; the index serves date ranges without partitions (SQLite)
+    created_at = db.Column(db.DateTime, primary_key=True, index=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    ticket_id = db.Column(db.Integer, nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Numeric(10, 2), nullable=False)
+    total_amount = db.Column(db.Numeric(10, 2), nullable=False)
+    mpesa_code = db.Column(db.String(50))
+    payment_phone = db.Column(db.String(15))
+    checkout_request_id = db.Column(db.String(100))
+    status = db.Column(db.String(20))
+    archived_at = db.Column(db.DateTime, server_default=db.func.now())
+    
+    __table_args__ = {'postgresql_partition_by': 'RANGE (created_at)'}
+
+class CommissionArchive(db.Model):
+    __tablename__ = 'commissions_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    created_at = db.Column(db.DateTime, primary_key=True, index=True)
+    purchase_id = db.Column(db.Integer, nullable=False, index=True)
+    platform_fee_rate = db.Column(db.Numeric(5, 4), nullable=False)
+    platform_fee_amount = db.Column(db.Numeric(10, 2), nullable=False)
+    organizer_amount = db.Column(db.Numeric(10, 2), nullable=False)
+    payout_status = db.Column(db.String(20))
+    payout_date = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, server_default=db.func.now())
+    
+    __table_args__ = {'postgresql_partition_by': 'RANGE (created_at)'}
+
+class IssuedTicketArchive(db.Model):
+    __tablename__ = 'issued_tickets_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    created_at = db.Column(db.DateTime, primary_key=True)
+    purchase_id = db.Column(db.Integer, nullable=False, index=True)
+    event_id = db.Column(db.Integer, nullable=False, index=True)
+    code = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20))
+    checked_in_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, server_default=db.func.now())
+    
+    __table_args__ = {'postgresql_partition_by': 'RANGE (created_at)'}
+
+# Append-only record of admin and financial actions (see services/audit.py)
+class AuditLog(db.Model):
+    __tablename__ = 'audit_log'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    actor_id = db.Column(db.Integer, db.ForeignKey('users.id'))  # None for background jobs
+    action = db.Column(db.String(50), nullable=False)  # e.g. leader.approve, user.suspend, payout.process
+    target_type = db.Column(db.String(30), nullable=False)  # user, event, organizer
+    target_id = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.Text)
+    details = db.Column(db.Text)  # JSON
+    ip_address = db.Column(db.String(45))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        # History of one target, of one admin, and of everything by time
+        db.Index('ix_audit_log_target_created_at', 'target_type', 'target_id', 'created_at'),
+        db.Index('ix_audit_log_actor_id_created_at', 'actor_id', 'created_at'),
+        db.Index('ix_audit_log_created_at', 'created_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'actor_id': self.actor_id,
+            'action': self.action,
+            'target_type': self.target_type,
+            'target_id': self.target_id,
+            'reason': self.reason,
+            'details': json.loads(self.details) if self.details else None,
+            'ip_address': self.ip_address,
+            'created_at': self.created_at.isoformat()
+        }
+
+class ClubMember(db.Model):
+    __tablename__ = 'club_members'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    club_id = db.Column(db.Integer, db.ForeignKey('clubs.id'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    role = db.Column(db.String(20), default='member')  # leader, member
+    joined_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Its (club_id, student_id) index also serves the notification fan-out's member scan
+    __table_args__ = (db.UniqueConstraint('club_id', 'student_id', name='uq_club_members_club_id_student_id'),)
+    
+    student = db.relationship('User', backref=db.backref('club_memberships', lazy='dynamic'))
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'club_id': self.club_id,
+            'student_id': self.student_id,
+            'student_name': self.student.name,
+            'role': self.role,
+            'joined_at': self.joined_at.isoformat()
+        }
+
+class NotificationPreference(db.Model):
+    __tablename__ = 'notification_preferences'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    new_events = db.Column(db.Boolean, default=True, nullable=False)  # New events from the user's clubs
+    channel = db.Column(db.String(20))  # email, console; None uses NOTIFY_DEFAULT_CHANNEL
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'new_events': self.new_events,
+            'channel': self.channel
+        }
+
+class NotificationJob(db.Model):
+    __tablename__ = 'notification_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id', ondelete='CASCADE'), unique=True, nullable=False)
+    club_ids = db.Column(db.Text, nullable=False)  # JSON list of clubs whose members are notified
+    status = db.Column(db.String(20), default='queued')  # queued, running, completed
+    last_student_id = db.Column(db.Integer, default=0)  # Members up to here have been notified
+    sent_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+    
+    # The worker polls for unfinished jobs
+    __table_args__ = (
+        db.Index('ix_notification_jobs_status_id', 'status', 'id'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_id': self.event_id,
+            'club_ids': json.loads(self.club_ids),
+            'status': self.status,
+            'sent_count': self.sent_count,
+            'created_at': self.created_at.isoformat(),
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+class Registration(db.Model):
+    __tablename__ = 'registrations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), default='going')  # going, interested, declined
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('student_id', 'event_id', name='uq_registrations_student_id_event_id'),)
+    
+    student = db.relationship('User', backref=db.backref('registrations', lazy='dynamic'))
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'student_id': self.student_id,
+            'student_name': self.student.name,
+            'event_id': self.event_id,
+            'status': self.status,
+            'created_at': self.created_at.isoformat()
+        }
+
+# RSVPs and ticket sales waiting to be folded into events.trending_score by `flask update-trending`
+class EventInteraction(db.Model):
+    __tablename__ = 'event_interactions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, nullable=False)
+    weight = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+# Top-K events per student, rebuilt by `flask build-recommendations`
+class EventRecommendation(db.Model):
+    __tablename__ = 'event_recommendations'
+    
+    student_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # The primary key is the lookup index
+    rank = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    event_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
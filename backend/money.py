@@ -0,0 +1,40 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+# Money is handled as integer cents and stored as Decimal(10, 2); floats
+# never touch an amount, so splits and sums stay exact to the cent.
+CENT = Decimal('0.01')
+ONE = Decimal(1)
+
+def to_decimal(value):
+    """Decimal from a Decimal, int, str or float (floats via their shortest repr)"""
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return Decimal(value)
+
+def to_cents(amount):
+    """Integer cents for an amount, rounding half up"""
+    if amount is None:
+        return 0
+    return int((to_decimal(amount) * 100).quantize(ONE, rounding=ROUND_HALF_UP))
+
+def from_cents(cents):
+    """Decimal amount with two places for a number of cents"""
+    return (Decimal(int(cents)) / 100).quantize(CENT)
+
+def to_shillings(amount):
+    """Whole shillings to charge or pay out for an amount, rounding any cents up
+
+    M-Pesa only moves whole KES; truncating would undercharge by the cents.
+    """
+    return -(-to_cents(amount) // 100)
+
+def split_commission(total_cents, rate):
+    """Split a sale into (platform fee, organizer share) cents
+
+    The fee is rounded half up and the organizer gets the remainder, so the
+    two parts always add back up to the total.
+    """
+    fee = int((Decimal(total_cents) * to_decimal(rate)).quantize(ONE, rounding=ROUND_HALF_UP))
+    return fee, total_cents - fee
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Benchmark: fanning a new club event out to club members, in notifications/s.
+
+Usage:
+    python notification_benchmark.py [--members 100000] [--clubs 3] [--overlap 0.3] [--opt-out 0.1]
+
+Seeds a SQLite database (in memory unless --database is given) with --clubs
+clubs of --members members each, where an --overlap share of each club also
+belongs to the first club and an --opt-out share has turned new-event
+notifications off. One event is announced to all the clubs, and the job is
+drained through the email channel into the outbox. The best of --repeat runs
+is reported (the job and outbox are reset between runs), along with a check
+that every opted-in member got exactly one email.
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, date, timedelta
+from app import create_app, db
+from config import TestingConfig
+from models import User, Club, ClubMember, Event, EmailOutbox, NotificationPreference, NotificationJob
+from services.notifications import NOTIFICATION_CHANNELS, run_notification_job
+
+class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+def seed(members, clubs, overlap, opt_out):
+    """Clubs sharing some members, and one event announced to all of them; returns the expected recipients"""
+    leader = User(name='Bench Leader', email='bench@campus.edu', role='verified_leader', password_hash='-')
+    db.session.add(leader)
+    db.session.flush()
+
+    club_rows = [Club(name=f'Club {index}', created_by=leader.id, verification_status='approved')
+                 for index in range(clubs)]
+    db.session.add_all(club_rows)
+    db.session.flush()
+    club_ids = [club.id for club in club_rows]
+
+    # Club 0 has students 1..members; each other club takes `overlap` of them and new students for the rest
+    student_clubs = {leader.id + 1 + index: [club_ids[0]] for index in range(members)}
+    next_id = leader.id + 1 + members
+    for club_id in club_ids[1:]:
+        shared = random.sample(range(leader.id + 1, leader.id + 1 + members), int(members * overlap))
+        for student_id in shared:
+            student_clubs[student_id].append(club_id)
+        for _ in range(members - len(shared)):
+            student_clubs[next_id] = [club_id]
+            next_id += 1
+
+    student_ids = list(student_clubs)
+    for start in range(0, len(student_ids), 100000):
+        db.session.bulk_insert_mappings(User, [{
+            'id': student_id, 'name': f'Student {student_id}', 'email': f'student{student_id}@campus.edu',
+            'password_hash': '-', 'role': 'student'
+        } for student_id in student_ids[start:start + 100000]])
+    db.session.bulk_insert_mappings(ClubMember, [
+        {'club_id': club_id, 'student_id': student_id, 'role': 'member'}
+        for student_id, clubs_of_student in student_clubs.items() for club_id in clubs_of_student
+    ])
+    opted_out = set(random.sample(student_ids, int(len(student_ids) * opt_out)))
+    db.session.bulk_insert_mappings(NotificationPreference, [
+        {'user_id': student_id, 'new_events': False} for student_id in opted_out
+    ])
+
+    # The after_insert hook queues the job for the host club; widen it to every club
+    event = Event(
+        title='Bench Social', date=date.today() + timedelta(days=7), start_time=datetime(2030, 1, 1, 18).time(),
+        end_time=datetime(2030, 1, 1, 20).time(), location='Main Hall', created_by=leader.id, club_id=club_ids[0]
+    )
+    db.session.add(event)
+    db.session.commit()
+    NotificationJob.query.filter_by(event_id=event.id).update({'club_ids': json.dumps(club_ids)})
+    db.session.commit()
+
+    return len(student_ids) - len(opted_out), sum(len(clubs_of_student) for clubs_of_student in student_clubs.values())
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the club event notification fan-out')
+    parser.add_argument('--members', type=int, default=100000, help='Members per club')
+    parser.add_argument('--clubs', type=int, default=3)
+    parser.add_argument('--overlap', type=float, default=0.3, help='Share of each club also in the first club')
+    parser.add_argument('--opt-out', type=float, default=0.1, help='Share of students with notifications off')
+    parser.add_argument('--batch-size', type=int, default=None, help='Members per batch (default: NOTIFY_BATCH_SIZE)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--database', help='SQLAlchemy URL to use instead of in-memory SQLite')
+    args = parser.parse_args()
+
+    if args.database:
+        BenchmarkConfig.SQLALCHEMY_DATABASE_URI = args.database
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        expected, memberships = seed(args.members, args.clubs, args.overlap, args.opt_out)
+        channels = {name: channel(app.config) for name, channel in NOTIFICATION_CHANNELS.items()}
+        job = NotificationJob.query.one()
+
+        timings = []
+        correct = True
+        for _ in range(args.repeat):
+            EmailOutbox.query.delete()
+            job.status, job.last_student_id, job.sent_count, job.completed_at = 'queued', 0, 0, None
+            db.session.commit()
+
+            started = time.perf_counter()
+            sent = run_notification_job(job, channels, args.batch_size)
+            timings.append(time.perf_counter() - started)
+
+            emails = EmailOutbox.query.count()
+            distinct = db.session.query(EmailOutbox.to_email).distinct().count()
+            correct = correct and sent == emails == distinct == expected
+
+    best = min(timings)
+    print(f'{args.clubs} clubs x {args.members} members ({memberships} memberships), '
+          f'{expected} opted-in students to notify')
+    print(f'Fan-out (best of {args.repeat}): {best:8.2f}s ({expected / best:,.0f} notifications/s)')
+    print(f'Every opted-in member notified exactly once: {correct}')
+
+if __name__ == '__main__':
+    main()
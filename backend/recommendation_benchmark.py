@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Benchmark: rebuilding per-student recommendations, and reading one student's list.
+
+Usage:
+    python recommendation_benchmark.py [--students 1000000] [--clubs 500] [--events 5000] [--top-k 20]
+
+Seeds a SQLite database (in memory unless --database is given) with students
+in one to four clubs each (popular clubs are larger), upcoming club events,
+and a few registrations per student. It then times the full
+build-recommendations rebuild (best of --builds) and the indexed read behind
+GET /api/events/recommended (best of --repeat over a sample of students). It
+also checks every stored list: at most top-K upcoming events, ranked from 1,
+best first, and none the student already registered for.
+"""
+
+import argparse
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from app import create_app, db
+from config import TestingConfig
+from models import User, Club, ClubMember, Event, Registration, EventRecommendation
+from services.recommendations import build_recommendations, recommended_event_ids
+
+class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+def seed(students, clubs, events, registrations, chunk=100000):
+    leader = User(name='Bench Leader', email='bench@campus.edu', role='verified_leader', password_hash='-')
+    db.session.add(leader)
+    db.session.flush()
+
+    db.session.bulk_insert_mappings(Club, [{
+        'id': index + 1, 'name': f'Club {index}', 'created_by': leader.id, 'verification_status': 'approved'
+    } for index in range(clubs)])
+
+    start = datetime(2030, 1, 1, 18, 0)
+    db.session.bulk_insert_mappings(Event, [{
+        'id': index + 1,
+        'title': f'Event {index}',
+        'date': date.today() + timedelta(days=index % 120 - 10),  # A few already past
+        'start_time': start.time(),
+        'end_time': (start + timedelta(hours=2)).time(),
+        'location': f'Hall {index}',
+        'created_by': leader.id,
+        'club_id': 1 + index % clubs,
+        'created_at': start
+    } for index in range(events)])
+
+    first_student = leader.id + 1
+    for offset in range(0, students, chunk):
+        student_ids = range(first_student + offset, first_student + min(students, offset + chunk))
+        db.session.bulk_insert_mappings(User, [{
+            'id': student_id, 'name': f'Student {student_id}', 'email': f'student{student_id}@campus.edu',
+            'password_hash': '-', 'role': 'student'
+        } for student_id in student_ids])
+
+        memberships, rows = [], []
+        for student_id in student_ids:
+            # A few clubs have most of the members
+            club_ids = {min(clubs, int(random.paretovariate(1.1))) for _ in range(random.randint(1, 4))}
+            memberships.extend({'club_id': club_id, 'student_id': student_id} for club_id in club_ids)
+            for event_id in random.sample(range(1, events + 1), min(events, registrations)):
+                rows.append({'student_id': student_id, 'event_id': event_id, 'status': 'going'})
+        db.session.bulk_insert_mappings(ClubMember, memberships)
+        db.session.bulk_insert_mappings(Registration, rows)
+        db.session.commit()
+
+def check(top_k, today):
+    """Every stored list is a short, ranked list of upcoming events the student hasn't registered for"""
+    upcoming = {event_id for event_id, in db.session.query(Event.id).filter(Event.date >= today)}
+    registered = {(student_id, event_id) for student_id, event_id in db.session.query(
+        Registration.student_id, Registration.event_id
+    )}
+
+    lists = defaultdict(list)
+    for row in db.session.query(EventRecommendation).order_by(EventRecommendation.student_id, EventRecommendation.rank):
+        lists[row.student_id].append(row)
+
+    for student_id, rows in lists.items():
+        if len(rows) > top_k or [row.rank for row in rows] != list(range(1, len(rows) + 1)):
+            return False
+        if any(earlier.score < later.score for earlier, later in zip(rows, rows[1:])):
+            return False
+        if any(row.event_id not in upcoming or (student_id, row.event_id) in registered for row in rows):
+            return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark building and reading event recommendations')
+    parser.add_argument('--students', type=int, default=1000000)
+    parser.add_argument('--clubs', type=int, default=500)
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--registrations', type=int, default=3, help='Registrations per student')
+    parser.add_argument('--top-k', type=int, default=20)
+    parser.add_argument('--builds', type=int, default=1, help='Full rebuilds to time')
+    parser.add_argument('--lookups', type=int, default=1000, help='Students read per timed lookup pass')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database', help='SQLAlchemy URL to use instead of in-memory SQLite')
+    args = parser.parse_args()
+
+    if args.database:
+        BenchmarkConfig.SQLALCHEMY_DATABASE_URI = args.database
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        seed(args.students, args.clubs, args.events, args.registrations)
+
+        builds = []
+        for _ in range(args.builds):
+            started = time.perf_counter()
+            result = build_recommendations(args.top_k)
+            builds.append(time.perf_counter() - started)
+
+        today = date.today()
+        sample = random.sample(range(2, args.students + 2), min(args.students, args.lookups))
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            for student_id in sample:
+                recommended_event_ids(student_id, today)
+            timings.append(time.perf_counter() - started)
+
+        correct = check(args.top_k, today)
+
+    best = min(builds)
+    print(f"{args.students} students, {args.clubs} clubs, {args.events} events, "
+          f"{result['club_sets']} distinct club sets")
+    print(f"Rebuild (best of {args.builds}): {best:8.1f}s ({result['students'] / best:,.0f} students/s, "
+          f"{result['rows']} rows)")
+    print(f'Lookup (best of {args.repeat}): {min(timings) / len(sample) * 1000:8.3f}ms per student')
+    print(f'Every list ranked, upcoming and unregistered: {correct}')
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,19 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from marshmallow import ValidationError
 from datetime import datetime, timedelta
 from app import db
-from models import User, Club, Event, Purchase, Commission, Subscription
+from models import User, Club, Event, Ticket, Purchase, Commission, Subscription, LedgerMismatch, RefundJob, Refund, AuditLog
 from schemas import UserSchema, ClubSchema, EventSchema
 from decorators import admin_required
+from services.email import queue_email
+from services.database import pool_metrics
+from services.replicas import read_replica
+from services.serialization import event_rows
+from services.commissions import commission_report
+from services.refunds import start_refund_job, refund_counts, unconfirmed_refunds, resolve_refund
+from services.audit import record_audit
+from services.venues import calendar_conflicts
+from services.archive import with_archive
+from money import to_cents, from_cents
 
 admin_bp = Blueprint('admin', __name__)
 user_schema = UserSchema()
@@ -15,6 +25,7 @@ event_schema = EventSchema()
 @admin_bp.route('/dashboard', methods=['GET'])
 @jwt_required()
 @admin_required
+@read_replica
 def admin_dashboard():
     """Get admin dashboard statistics"""
     
@@ -27,10 +38,11 @@ def admin_dashboard():
     total_events = Event.query.count()
     paid_events = Event.query.filter_by(is_paid=True).count()
     
-    # Revenue statistics
-    total_revenue = db.session.query(db.func.sum(Commission.platform_fee_amount)).scalar() or 0
-    monthly_revenue = db.session.query(db.func.sum(Commission.platform_fee_amount)).filter(
-        Commission.created_at >= datetime.now() - timedelta(days=30)
+    # Revenue statistics, archived commissions included
+    commissions = with_archive(Commission)
+    total_revenue = db.session.query(db.func.sum(commissions.c.platform_fee_amount)).scalar() or 0
+    monthly_revenue = db.session.query(db.func.sum(commissions.c.platform_fee_amount)).filter(
+        commissions.c.created_at >= datetime.now() - timedelta(days=30)
     ).scalar() or 0
     
     # Recent activity
@@ -102,16 +114,29 @@ def verify_leader(user_id):
         user.role = 'verified_leader'
         user.start_trial()  # Start 2-month trial
         
-        # TODO: Send approval email
+        queue_email(
+            to_email=user.email,
+            to_name=user.name,
+            template='leader_approved',
+            context={'name': user.name, 'trial_end_date': user.trial_end_date.strftime('%d %B %Y')},
+            dedupe_key=f'leader_approved:{user.id}'
+        )
         message = 'Leader application approved successfully'
         
     else:  # reject
         user.verification_status = 'rejected'
         
-        # TODO: Send rejection email with reason
+        queue_email(
+            to_email=user.email,
+            to_name=user.name,
+            template='leader_rejected',
+            context={'name': user.name, 'reason': reason or 'No reason given'},
+            dedupe_key=f'leader_rejected:{user.id}'
+        )
         message = 'Leader application rejected'
     
     db.session.commit()
+    record_audit(f'leader.{action}', 'user', user.id, reason)
     
     return jsonify({
         'success': True,
@@ -122,6 +147,7 @@ def verify_leader(user_id):
 @admin_bp.route('/users', methods=['GET'])
 @jwt_required()
 @admin_required
+@read_replica
 def get_all_users():
     """Get all users with filtering options"""
     
@@ -181,6 +207,7 @@ def suspend_user(user_id):
         }), 400
     
     db.session.commit()
+    record_audit(f'user.{action}', 'user', user.id, reason)
     
     return jsonify({
         'success': True,
@@ -190,20 +217,21 @@ def suspend_user(user_id):
 @admin_bp.route('/events', methods=['GET'])
 @jwt_required()
 @admin_required
+@read_replica
 def get_all_events():
     """Get all events for admin management"""
     
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     
-    events = Event.query.order_by(Event.created_at.desc()).paginate(
+    events = Event.query.with_entities(Event.id).order_by(Event.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
     return jsonify({
         'success': True,
         'data': {
-            'events': [event.to_dict(include_tickets=True) for event in events.items],
+            'events': event_rows([event.id for event in events.items], include_tickets=True),
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -233,6 +261,7 @@ def moderate_event(event_id):
                 'message': 'Cannot remove event with existing ticket sales'
             }), 400
         
+        details = {'title': event.title}
         db.session.delete(event)
         message = 'Event removed successfully'
     else:
@@ -242,15 +271,89 @@ def moderate_event(event_id):
         }), 400
     
     db.session.commit()
+    record_audit(f'event.{action}', 'event', event_id, reason, details)
     
     return jsonify({
         'success': True,
         'message': message
     }), 200
 
+@admin_bp.route('/events/<int:event_id>/refund', methods=['POST'])
+@jwt_required()
+@admin_required
+def refund_event(event_id):
+    """Start refunding every ticket sold for a cancelled event"""
+    
+    data = request.json or {}
+    event = Event.query.get_or_404(event_id)
+    
+    job, created = start_refund_job(event, get_jwt_identity(), data.get('reason'))
+    
+    return jsonify({
+        'success': True,
+        'message': 'Refund job started' if created else 'A refund job is already running for this event',
+        'data': job.to_dict(refund_counts(job.id))
+    }), 202
+
+@admin_bp.route('/refund-jobs/<int:job_id>', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_refund_job(job_id):
+    """Get progress of an event refund job"""
+    
+    job = RefundJob.query.get_or_404(job_id)
+    
+    return jsonify({
+        'success': True,
+        'data': job.to_dict(refund_counts(job.id))
+    }), 200
+
+@admin_bp.route('/refunds/unconfirmed', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_unconfirmed_refunds():
+    """List refunds M-Pesa never confirmed, to check against the statement"""
+    
+    refunds = unconfirmed_refunds(request.args.get('job_id', type=int)).order_by(Refund.id).limit(500).all()
+    
+    return jsonify({
+        'success': True,
+        'data': [refund.to_dict() for refund in refunds]
+    }), 200
+
+@admin_bp.route('/refunds/<int:refund_id>/resolve', methods=['POST'])
+@jwt_required()
+@admin_required
+def resolve_unconfirmed_refund(refund_id):
+    """Settle an unconfirmed refund: completed (with its M-Pesa code), failed, or queued to resend"""
+    
+    data = request.json or {}
+    try:
+        refund = resolve_refund(
+            refund_id, data.get('outcome'), data.get('mpesa_code'), data.get('reason'), get_jwt_identity()
+        )
+    except ValueError as err:
+        return jsonify({
+            'success': False,
+            'message': str(err)
+        }), 400
+    
+    if refund is None:
+        return jsonify({
+            'success': False,
+            'message': 'Refund not found or not unconfirmed'
+        }), 409
+    
+    return jsonify({
+        'success': True,
+        'message': f'Refund marked {refund.status}',
+        'data': refund.to_dict()
+    }), 200
+
 @admin_bp.route('/revenue/analytics', methods=['GET'])
 @jwt_required()
 @admin_required
+@read_replica
 def revenue_analytics():
     """Get detailed revenue analytics"""
     
@@ -258,49 +361,57 @@ def revenue_analytics():
     days = request.args.get('days', 30, type=int)
     start_date = datetime.now() - timedelta(days=days)
     
+    # Archived commissions and purchases count too, for periods reaching back past the archive cutoff
+    commissions = with_archive(Commission)
+    purchases = with_archive(Purchase)
+    
     # Revenue by day
     daily_revenue = db.session.query(
-        db.func.date(Commission.created_at).label('date'),
-        db.func.sum(Commission.platform_fee_amount).label('revenue')
+        db.func.date(commissions.c.created_at).label('date'),
+        db.func.sum(commissions.c.platform_fee_amount).label('revenue')
     ).filter(
-        Commission.created_at >= start_date
+        commissions.c.created_at >= start_date
     ).group_by(
-        db.func.date(Commission.created_at)
+        db.func.date(commissions.c.created_at)
     ).all()
     
     # Top performing events
     top_events = db.session.query(
         Event.title,
-        db.func.sum(Commission.platform_fee_amount).label('revenue')
+        db.func.sum(commissions.c.platform_fee_amount).label('revenue')
+    ).select_from(commissions).join(
+        purchases, purchases.c.id == commissions.c.purchase_id
     ).join(
-        Purchase, Purchase.ticket_id == Event.id
+        Ticket, Ticket.id == purchases.c.ticket_id
     ).join(
-        Commission, Commission.purchase_id == Purchase.id
+        Event, Event.id == Ticket.event_id
     ).filter(
-        Commission.created_at >= start_date
+        commissions.c.created_at >= start_date
     ).group_by(
         Event.id, Event.title
     ).order_by(
-        db.func.sum(Commission.platform_fee_amount).desc()
+        db.func.sum(commissions.c.platform_fee_amount).desc()
     ).limit(10).all()
     
     # Revenue by organizer
     organizer_revenue = db.session.query(
         User.name,
-        db.func.sum(Commission.platform_fee_amount).label('platform_revenue'),
-        db.func.sum(Commission.organizer_amount).label('organizer_revenue')
+        db.func.sum(commissions.c.platform_fee_amount).label('platform_revenue'),
+        db.func.sum(commissions.c.organizer_amount).label('organizer_revenue')
+    ).select_from(commissions).join(
+        purchases, purchases.c.id == commissions.c.purchase_id
     ).join(
-        Event, Event.created_by == User.id
+        Ticket, Ticket.id == purchases.c.ticket_id
     ).join(
-        Purchase, Purchase.ticket_id == Event.id
+        Event, Event.id == Ticket.event_id
     ).join(
-        Commission, Commission.purchase_id == Purchase.id
+        User, User.id == Event.created_by
     ).filter(
-        Commission.created_at >= start_date
+        commissions.c.created_at >= start_date
     ).group_by(
         User.id, User.name
     ).order_by(
-        db.func.sum(Commission.platform_fee_amount).desc()
+        db.func.sum(commissions.c.platform_fee_amount).desc()
     ).limit(10).all()
     
     return jsonify({
@@ -328,6 +439,7 @@ def revenue_analytics():
 @admin_bp.route('/commissions/pending-payouts', methods=['GET'])
 @jwt_required()
 @admin_required
+@read_replica
 def pending_payouts():
     """Get pending commission payouts"""
     
@@ -345,13 +457,16 @@ def pending_payouts():
             organizer_payouts[organizer_id] = {
                 'organizer_id': organizer_id,
                 'organizer_name': organizer_name,
-                'total_amount': 0,
+                'total_cents': 0,
                 'commission_count': 0
             }
         
-        organizer_payouts[organizer_id]['total_amount'] += float(commission.organizer_amount)
+        organizer_payouts[organizer_id]['total_cents'] += to_cents(commission.organizer_amount)
         organizer_payouts[organizer_id]['commission_count'] += 1
     
+    for payout in organizer_payouts.values():
+        payout['total_amount'] = float(from_cents(payout.pop('total_cents')))
+    
     return jsonify({
         'success': True,
         'data': list(organizer_payouts.values())
@@ -365,6 +480,7 @@ def process_payout():
     
     data = request.json
     organizer_id = data.get('organizer_id')
+    reason = data.get('reason', '')
     
     if not organizer_id:
         return jsonify({
@@ -389,12 +505,18 @@ def process_payout():
         }), 400
     
     # Mark commissions as paid
-    total_payout = 0
+    total_cents = 0
     for commission in pending_commissions:
         commission.payout_status = 'paid'
         commission.payout_date = datetime.utcnow()
-        total_payout += float(commission.organizer_amount)
-    
+        total_cents += to_cents(commission.organizer_amount)
+    total_payout = from_cents(total_cents)
+    
+    # Committed together with the payout
+    record_audit('payout.process', 'organizer', organizer_id, reason, {
+        'total_amount': total_payout,
+        'commission_ids': [commission.id for commission in pending_commissions]
+    }, financial=True)
     db.session.commit()
     
     # TODO: Integrate with actual payout system (bank transfer, mobile money, etc.)
@@ -403,7 +525,140 @@ def process_payout():
         'success': True,
         'message': f'Payout of KES {total_payout:.2f} processed successfully',
         'data': {
-            'total_amount': total_payout,
+            'total_amount': float(total_payout),
             'commission_count': len(pending_commissions)
         }
-    }), 200
\ No newline at end of file
+    }), 200
+
+@admin_bp.route('/commissions/reconciliation', methods=['GET'])
+@jwt_required()
+@admin_required
+@read_replica
+def commission_reconciliation():
+    """Get commission totals checked against purchases to the cent"""
+    
+    days = request.args.get('days', type=int)
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+    
+    return jsonify({
+        'success': True,
+        'data': commission_report(since)
+    }), 200
+
+@admin_bp.route('/venue-conflicts', methods=['GET'])
+@jwt_required()
+@admin_required
+@read_replica
+def venue_conflicts():
+    """Get every double-booked venue in a term calendar"""
+    
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else None
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else None
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'Dates must be YYYY-MM-DD'
+        }), 400
+    
+    conflicts = calendar_conflicts(start, end)
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'conflicts': conflicts,
+            'count': len(conflicts)
+        }
+    }), 200
+
+@admin_bp.route('/ledger/mismatches', methods=['GET'])
+@jwt_required()
+@admin_required
+@read_replica
+def ledger_mismatches():
+    """Get mismatches found by the ledger reconciliation job"""
+    
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
+    status = request.args.get('status', 'open')
+    kind = request.args.get('kind')
+    
+    query = LedgerMismatch.query.filter_by(status=status)
+    if kind:
+        query = query.filter_by(kind=kind)
+    
+    mismatches = query.order_by(LedgerMismatch.detected_at.desc()).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'mismatches': [mismatch.to_dict() for mismatch in mismatches.items],
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': mismatches.total,
+                'pages': mismatches.pages
+            }
+        }
+    }), 200
+
+@admin_bp.route('/db-pool', methods=['GET'])
+@jwt_required()
+@admin_required
+def db_pool_status():
+    """Get database connection pool usage and checkout wait times"""
+    
+    pool = db.engine.pool
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'pool': pool.status(),
+            'checked_out': pool.checkedout() if hasattr(pool, 'checkedout') else None,
+            'size': pool.size() if hasattr(pool, 'size') else None,
+            'checkout_wait': pool_metrics.snapshot()
+        }
+    }), 200
+
+@admin_bp.route('/audit-log', methods=['GET'])
+@jwt_required()
+@admin_required
+@read_replica
+def audit_log():
+    """Get admin audit log entries, newest first"""
+    
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
+    target_type = request.args.get('target_type')
+    target_id = request.args.get('target_id', type=int)
+    actor_id = request.args.get('actor_id', type=int)
+    action = request.args.get('action')
+    
+    query = AuditLog.query
+    if target_type:
+        query = query.filter_by(target_type=target_type)
+    if target_id is not None:
+        query = query.filter_by(target_id=target_id)
+    if actor_id is not None:
+        query = query.filter_by(actor_id=actor_id)
+    if action:
+        query = query.filter_by(action=action)
+    
+    entries = query.order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'entries': [entry.to_dict() for entry in entries.items],
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': entries.total,
+                'pages': entries.pages
+            }
+        }
+    }), 200
@@ -2,8 +2,9 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from marshmallow import ValidationError
 from app import db
-from models import Student
+from models import Student, NotificationPreference
 from schemas import StudentSchema, LoginSchema
+from services.notifications import NOTIFICATION_CHANNELS
 
 auth_bp = Blueprint('auth', __name__)
 student_schema = StudentSchema()
@@ -84,4 +85,30 @@ def get_current_user():
     return jsonify({
         'success': True,
         'data': student.to_dict()
-    }), 200
\ No newline at end of file
+    }), 200
+
+@auth_bp.route('/me/notifications', methods=['GET', 'PUT'])
+@jwt_required()
+def notification_preferences():
+    """Get or update the current user's notification preferences"""
+    current_user_id = get_jwt_identity()
+    preference = NotificationPreference.query.get(current_user_id) or NotificationPreference(
+        user_id=current_user_id, new_events=True
+    )
+    
+    if request.method == 'PUT':
+        data = request.json or {}
+        if 'channel' in data and data['channel'] is not None and data['channel'] not in NOTIFICATION_CHANNELS:
+            return jsonify({'success': False, 'message': 'Invalid channel'}), 400
+        
+        if 'new_events' in data:
+            preference.new_events = bool(data['new_events'])
+        if 'channel' in data:
+            preference.channel = data['channel']
+        db.session.add(preference)
+        db.session.commit()
+    
+    return jsonify({
+        'success': True,
+        'data': preference.to_dict()
+    }), 200
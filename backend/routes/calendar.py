@@ -0,0 +1,66 @@
+from flask import Blueprint, request, jsonify, url_for, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import date
+from models import Club
+from services.calendar import feed_token, user_for_token, feed_window, feed_etag, cached_feed
+
+calendar_bp = Blueprint('calendar', __name__)
+
+def feed_response(kind, owner_id, name, private=False):
+    """Serve a feed, or 304 if the client already has this version"""
+    since = feed_window(date.today())
+    etag = feed_etag(kind, owner_id, since)
+    max_age = current_app.config['CALENDAR_MAX_AGE']
+    cache_control = f"{'private' if private else 'public'}, max-age={max_age}"
+    
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(
+            cached_feed(kind, owner_id, name, etag, since),
+            mimetype='text/calendar'
+        )
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+@calendar_bp.route('/me', methods=['GET'])
+@jwt_required()
+def my_calendar():
+    """Get the current user's calendar subscription URL"""
+    
+    token = feed_token(get_jwt_identity())
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'url': url_for('calendar.user_feed', token=token, _external=True)
+        }
+    }), 200
+
+@calendar_bp.route('/users/<token>.ics', methods=['GET'])
+def user_feed(token):
+    """iCalendar feed of a user's RSVPs and club events"""
+    
+    user_id = user_for_token(token)
+    if user_id is None:
+        return jsonify({
+            'success': False,
+            'message': 'Invalid calendar link'
+        }), 404
+    
+    return feed_response('user', user_id, 'My EventHub events', private=True)
+
+@calendar_bp.route('/clubs/<int:club_id>.ics', methods=['GET'])
+def club_feed(club_id):
+    """iCalendar feed of a club's events"""
+    
+    club = Club.query.get_or_404(club_id)
+    return feed_response('club', club_id, club.name)
+
+@calendar_bp.route('/campus.ics', methods=['GET'])
+def campus_feed():
+    """iCalendar feed of every campus event"""
+    
+    return feed_response('campus', 0, 'Campus events')
@@ -0,0 +1,92 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import datetime
+from app import db
+from models import User, Event, IssuedTicket
+from services.ticket_codes import verify_code, code_digest
+
+checkin_bp = Blueprint('checkin', __name__)
+
+def can_manage_event(event_id):
+    """Only the event's organizer or an admin may scan tickets"""
+    current_user_id = get_jwt_identity()
+    event = Event.query.get_or_404(event_id)
+
+    if event.created_by == current_user_id:
+        return True
+
+    user = User.query.get(current_user_id)
+    return user is not None and user.role == 'admin'
+
+@checkin_bp.route('/events/<int:event_id>/scan', methods=['POST'])
+@jwt_required()
+def scan_ticket(event_id):
+    """Validate a scanned ticket code and mark it as checked in"""
+    if not can_manage_event(event_id):
+        return jsonify({'success': False, 'message': 'Not allowed to check in for this event'}), 403
+
+    code = (request.json or {}).get('code', '')
+
+    # Forged or mistyped codes are rejected without a database round-trip
+    if not verify_code(code, event_id):
+        return jsonify({'success': False, 'message': 'Invalid ticket code'}), 400
+
+    now = datetime.utcnow()
+    result = db.session.execute(
+        db.update(IssuedTicket).where(
+            IssuedTicket.code == code,
+            IssuedTicket.event_id == event_id,
+            IssuedTicket.status == 'valid',
+            IssuedTicket.checked_in_at.is_(None)
+        ).values(checked_in_at=now)
+    )
+    db.session.commit()
+
+    if result.rowcount == 1:
+        return jsonify({
+            'success': True,
+            'data': {'code': code, 'checked_in_at': now.isoformat()},
+            'message': 'Ticket admitted'
+        }), 200
+
+    issued = IssuedTicket.query.filter_by(code=code).first()
+
+    if not issued:
+        return jsonify({'success': False, 'message': 'Ticket not found'}), 404
+
+    if issued.status != 'valid':
+        return jsonify({'success': False, 'message': f'Ticket has been {issued.status}'}), 409
+
+    return jsonify({
+        'success': False,
+        'message': 'Ticket already checked in',
+        'data': {'checked_in_at': issued.checked_in_at.isoformat()}
+    }), 409
+
+@checkin_bp.route('/events/<int:event_id>/allowlist', methods=['GET'])
+@jwt_required()
+def event_allowlist(event_id):
+    """Export digests of the event's codes for offline scanners
+
+    Scanners hash what they read and look it up in these lists. Neither the
+    codes nor the signing key are sent, so a lost scanner export can't be
+    used to make tickets.
+    """
+    if not can_manage_event(event_id):
+        return jsonify({'success': False, 'message': 'Not allowed to check in for this event'}), 403
+
+    rows = db.session.query(
+        IssuedTicket.code, IssuedTicket.status, IssuedTicket.checked_in_at
+    ).filter(IssuedTicket.event_id == event_id).all()
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'event_id': event_id,
+            'digest': 'sha256',
+            'generated_at': datetime.utcnow().isoformat(),
+            'valid': [code_digest(row.code) for row in rows if row.status == 'valid' and not row.checked_in_at],
+            'checked_in': [code_digest(row.code) for row in rows if row.checked_in_at],
+            'revoked': [code_digest(row.code) for row in rows if row.status != 'valid']
+        }
+    }), 200
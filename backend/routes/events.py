@@ -0,0 +1,79 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import date, datetime
+from services.replicas import read_replica
+from services.serialization import event_rows
+from services.trending import trending_event_ids
+from services.recommendations import recommended_event_ids
+from services.venues import find_conflicts
+
+events_bp = Blueprint('events', __name__)
+
+@events_bp.route('/trending', methods=['GET'])
+@read_replica
+def trending_events():
+    """Get the top upcoming events by trending score"""
+    
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    
+    return jsonify({
+        'success': True,
+        'data': event_rows(trending_event_ids(limit, date.today()))
+    }), 200
+
+@events_bp.route('/recommended', methods=['GET'])
+@jwt_required()
+@read_replica
+def recommended_events():
+    """Get upcoming events recommended for the current user"""
+    
+    today = date.today()
+    event_ids = recommended_event_ids(get_jwt_identity(), today)
+    source = 'recommended'
+    
+    if not event_ids:
+        # Not in any club yet (or the job hasn't run): show what's trending
+        event_ids = trending_event_ids(current_app.config['RECOMMEND_TOP_K'], today)
+        source = 'trending'
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'source': source,
+            'events': event_rows(event_ids)
+        }
+    }), 200
+
+@events_bp.route('/venue-availability', methods=['GET'])
+@jwt_required()
+def venue_availability():
+    """Check whether a location is free on a date between two times"""
+    
+    location = request.args.get('location')
+    exclude_id = request.args.get('exclude_event_id', type=int)
+    
+    try:
+        day = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d').date()
+        start_time = datetime.strptime(request.args.get('start_time', ''), '%H:%M').time()
+        end_time = datetime.strptime(request.args.get('end_time', ''), '%H:%M').time()
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'date (YYYY-MM-DD), start_time and end_time (HH:MM) are required'
+        }), 400
+    
+    if not location or end_time <= start_time:
+        return jsonify({
+            'success': False,
+            'message': 'A location and an end time after the start time are required'
+        }), 400
+    
+    conflicts = find_conflicts(location, day, start_time, end_time, exclude_id)
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'available': not conflicts,
+            'conflicts': conflicts
+        }
+    }), 200
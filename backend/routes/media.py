@@ -0,0 +1,87 @@
+import os
+from flask import Blueprint, request, jsonify, current_app, send_from_directory
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app import limiter
+from models import User, Event, Club, ImageAsset
+from services.media import upload_image
+
+media_bp = Blueprint('media', __name__)
+
+ALLOWED_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
+
+def owner_or_admin(owner_id):
+    """Check that the current user owns the resource or is an admin"""
+    current_user_id = get_jwt_identity()
+    if owner_id == current_user_id:
+        return True
+
+    user = User.query.get(current_user_id)
+    return user is not None and user.role == 'admin'
+
+def handle_upload(kind, target_id):
+    """Validate the 'image' file field and queue it for processing"""
+    upload = request.files.get('image')
+
+    if not upload or not upload.filename:
+        return jsonify({
+            'success': False,
+            'errors': {'image': ['An image file is required']}
+        }), 400
+
+    extension = os.path.splitext(upload.filename)[1].lower()
+    if extension not in ALLOWED_IMAGE_EXTENSIONS or not (upload.mimetype or '').startswith('image/'):
+        return jsonify({
+            'success': False,
+            'errors': {'image': ['Only JPEG, PNG, WebP and GIF images are allowed']}
+        }), 400
+
+    asset = upload_image(upload, kind, target_id, get_jwt_identity())
+
+    return jsonify({
+        'success': True,
+        'data': asset.to_dict(),
+        'message': 'Image ready' if asset.status == 'ready' else 'Image is being processed'
+    }), 200 if asset.status == 'ready' else 202
+
+@media_bp.route('/events/<int:event_id>/image', methods=['POST'])
+@jwt_required()
+def upload_event_image(event_id):
+    """Upload an event banner image"""
+    event = Event.query.get_or_404(event_id)
+
+    if not owner_or_admin(event.created_by):
+        return jsonify({'success': False, 'message': 'Not allowed to edit this event'}), 403
+
+    return handle_upload('event', event.id)
+
+@media_bp.route('/clubs/<int:club_id>/logo', methods=['POST'])
+@jwt_required()
+def upload_club_logo(club_id):
+    """Upload a club logo"""
+    club = Club.query.get_or_404(club_id)
+
+    if not owner_or_admin(club.created_by):
+        return jsonify({'success': False, 'message': 'Not allowed to edit this club'}), 403
+
+    return handle_upload('club', club.id)
+
+@media_bp.route('/<int:asset_id>', methods=['GET'])
+@jwt_required()
+def get_image(asset_id):
+    """Get processing status and variant URLs for an uploaded image"""
+    asset = ImageAsset.query.get_or_404(asset_id)
+
+    return jsonify({
+        'success': True,
+        'data': asset.to_dict()
+    }), 200
+
+@media_bp.route('/files/<path:filename>', methods=['GET'])
+@limiter.exempt
+def serve_file(filename):
+    """Serve locally stored images (local storage backend only)"""
+    response = send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+    # Variant paths contain the content hash, so they never change
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    return response
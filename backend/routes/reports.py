@@ -0,0 +1,143 @@
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import datetime
+from app import db
+from models import User, Event, Ticket, Purchase, Commission, Registration
+from decorators import premium_required
+from services.exports import EXPORT_FORMATS, stream_export
+from services.archive import with_archive
+
+reports_bp = Blueprint('reports', __name__)
+
+PURCHASE_COLUMNS = [
+    'purchase_id', 'event_id', 'event_title', 'ticket_name', 'buyer_name',
+    'buyer_email', 'quantity', 'unit_price', 'total_amount', 'mpesa_code',
+    'status', 'created_at'
+]
+
+COMMISSION_COLUMNS = [
+    'commission_id', 'purchase_id', 'event_title', 'platform_fee_rate',
+    'platform_fee_amount', 'organizer_amount', 'payout_status',
+    'payout_date', 'created_at'
+]
+
+REGISTRATION_COLUMNS = [
+    'registration_id', 'event_id', 'event_title', 'attendee_name',
+    'attendee_email', 'status', 'created_at'
+]
+
+def export_response(name, columns, query):
+    """Stream query rows as CSV/NDJSON using a server-side cursor"""
+    export_format = request.args.get('format', 'csv')
+
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'message': 'Invalid export format. Use "csv" or "ndjson"'
+        }), 400
+
+    # yield_per streams rows from the database cursor in batches instead of
+    # loading the whole result set into memory
+    rows = query.yield_per(current_app.config['EXPORT_BATCH_SIZE'])
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{export_format}"
+
+    return Response(
+        stream_with_context(stream_export(export_format, columns, rows)),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@reports_bp.route('/export/purchases', methods=['GET'])
+@jwt_required()
+@premium_required
+def export_purchases():
+    """Export all purchases for the current organizer's events, archived ones included"""
+    current_user_id = get_jwt_identity()
+    purchases = with_archive(Purchase)
+
+    query = db.session.query(
+        purchases.c.id,
+        Event.id,
+        Event.title,
+        Ticket.name,
+        User.name,
+        User.email,
+        purchases.c.quantity,
+        purchases.c.unit_price,
+        purchases.c.total_amount,
+        purchases.c.mpesa_code,
+        purchases.c.status,
+        purchases.c.created_at
+    ).select_from(purchases).join(
+        Ticket, Ticket.id == purchases.c.ticket_id
+    ).join(
+        Event, Event.id == Ticket.event_id
+    ).join(
+        User, User.id == purchases.c.user_id
+    ).filter(
+        Event.created_by == current_user_id
+    ).order_by(purchases.c.id)
+
+    return export_response('purchases', PURCHASE_COLUMNS, query)
+
+@reports_bp.route('/export/commissions', methods=['GET'])
+@jwt_required()
+@premium_required
+def export_commissions():
+    """Export all commissions for the current organizer's events, archived ones included"""
+    current_user_id = get_jwt_identity()
+    commissions = with_archive(Commission)
+    purchases = with_archive(Purchase)
+
+    query = db.session.query(
+        commissions.c.id,
+        commissions.c.purchase_id,
+        Event.title,
+        commissions.c.platform_fee_rate,
+        commissions.c.platform_fee_amount,
+        commissions.c.organizer_amount,
+        commissions.c.payout_status,
+        commissions.c.payout_date,
+        commissions.c.created_at
+    ).select_from(commissions).join(
+        purchases, purchases.c.id == commissions.c.purchase_id
+    ).join(
+        Ticket, Ticket.id == purchases.c.ticket_id
+    ).join(
+        Event, Event.id == Ticket.event_id
+    ).filter(
+        Event.created_by == current_user_id
+    ).order_by(commissions.c.id)
+
+    return export_response('commissions', COMMISSION_COLUMNS, query)
+
+@reports_bp.route('/export/registrations', methods=['GET'])
+@jwt_required()
+@premium_required
+def export_registrations():
+    """Export attendee registrations for the current organizer's events"""
+    current_user_id = get_jwt_identity()
+    event_id = request.args.get('event_id', type=int)
+
+    query = db.session.query(
+        Registration.id,
+        Event.id,
+        Event.title,
+        User.name,
+        User.email,
+        Registration.status,
+        Registration.created_at
+    ).join(
+        Event, Event.id == Registration.event_id
+    ).join(
+        User, User.id == Registration.student_id
+    ).filter(
+        Event.created_by == current_user_id
+    )
+
+    if event_id:
+        query = query.filter(Event.id == event_id)
+
+    query = query.order_by(Registration.id)
+
+    return export_response('registrations', REGISTRATION_COLUMNS, query)
@@ -3,6 +3,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 from app import db
 from models import User, Subscription
+from services.idempotency import idempotent
 
 subscriptions_bp = Blueprint('subscriptions', __name__)
 
@@ -71,6 +72,7 @@ def get_my_subscription():
 
 @subscriptions_bp.route('/subscribe', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_subscription():
     """Create new subscription for user"""
     current_user_id = get_jwt_identity()
@@ -0,0 +1,274 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from marshmallow import ValidationError
+from datetime import datetime
+from app import db
+from models import User, Event, Ticket, Purchase
+from schemas import TicketTierSchema, TicketUpdateSchema, ComplimentaryGuestSchema
+from decorators import premium_required
+from services.ticket_codes import issue_tickets
+
+tickets_bp = Blueprint('tickets', __name__)
+ticket_tier_schema = TicketTierSchema()
+ticket_update_schema = TicketUpdateSchema()
+complimentary_guest_schema = ComplimentaryGuestSchema()
+
+# Keep IN (...) lists well below SQLite's bound parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+def chunked(items, size):
+    """Split a list into lists of at most `size` items"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def load_items(schema, items):
+    """Validate every item, returning (index, data) pairs and per-item errors"""
+    valid_items = []
+    errors = []
+
+    for index, item in enumerate(items):
+        try:
+            valid_items.append((index, schema.load(item)))
+        except ValidationError as err:
+            errors.append({'index': index, 'errors': err.messages})
+
+    return valid_items, errors
+
+def bulk_items(key):
+    """Read the list of items for a bulk request, or return an error response"""
+    items = (request.json or {}).get(key)
+
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({
+            'success': False,
+            'message': f'"{key}" must be a non-empty list'
+        }), 400)
+
+    max_items = current_app.config['BULK_TICKET_MAX_ITEMS']
+    if len(items) > max_items:
+        return None, (jsonify({
+            'success': False,
+            'message': f'A single request can contain at most {max_items} items'
+        }), 400)
+
+    return items, None
+
+@tickets_bp.route('/events/<int:event_id>/bulk-create', methods=['POST'])
+@jwt_required()
+@premium_required
+def bulk_create_tickets(event_id):
+    """Create several ticket tiers for an event in one statement"""
+    current_user_id = get_jwt_identity()
+    event = Event.query.get_or_404(event_id)
+
+    if event.created_by != current_user_id:
+        return jsonify({
+            'success': False,
+            'message': 'You can only manage tickets for your own events'
+        }), 403
+
+    items, error_response = bulk_items('tickets')
+    if error_response:
+        return error_response
+
+    valid_items, errors = load_items(ticket_tier_schema, items)
+    now = datetime.utcnow()
+
+    rows = [{
+        'event_id': event_id,
+        'name': data['name'],
+        'description': data.get('description'),
+        'price': data['price'],
+        'quantity': data['quantity'],
+        'sold_count': 0,
+        'sale_start_date': data.get('sale_start_date') or now,
+        'sale_end_date': data.get('sale_end_date'),
+        'created_at': now
+    } for index, data in valid_items]
+
+    if rows:
+        db.session.bulk_insert_mappings(Ticket, rows)
+        if not event.is_paid:
+            event.is_paid = True
+        db.session.commit()
+
+    return jsonify({
+        'success': bool(rows),
+        'data': {
+            'created': len(rows),
+            'errors': errors
+        }
+    }), 201 if rows else 400
+
+@tickets_bp.route('/bulk-update', methods=['POST'])
+@jwt_required()
+@premium_required
+def bulk_update_tickets():
+    """Adjust quantity and/or price across many tickets in one transaction"""
+    current_user_id = get_jwt_identity()
+
+    items, error_response = bulk_items('tickets')
+    if error_response:
+        return error_response
+
+    valid_items, errors = load_items(ticket_update_schema, items)
+
+    # Fetch ownership and sold counts for every requested ticket up front
+    ticket_ids = list({data['id'] for index, data in valid_items})
+    current = {}
+    for ids in chunked(ticket_ids, LOOKUP_CHUNK_SIZE):
+        rows = db.session.query(
+            Ticket.id, Ticket.sold_count, Event.created_by
+        ).join(Event, Event.id == Ticket.event_id).filter(Ticket.id.in_(ids)).all()
+        current.update({row.id: row for row in rows})
+
+    mappings = []
+    seen_ids = set()
+    for index, data in valid_items:
+        ticket = current.get(data['id'])
+
+        if not ticket or ticket.created_by != current_user_id:
+            errors.append({'index': index, 'errors': {'id': ['Ticket not found']}})
+        elif data['id'] in seen_ids:
+            errors.append({'index': index, 'errors': {'id': ['Ticket listed more than once']}})
+        elif 'price' not in data and 'quantity' not in data:
+            errors.append({'index': index, 'errors': {'_schema': ['Nothing to update']}})
+        elif data.get('quantity') is not None and data['quantity'] < (ticket.sold_count or 0):
+            errors.append({
+                'index': index,
+                'errors': {'quantity': [f'Cannot be lower than tickets already sold ({ticket.sold_count})']}
+            })
+        else:
+            seen_ids.add(data['id'])
+            mappings.append((index, data))
+
+    # The sold-count check above is only a fast path: a sale can commit after that
+    # read, so each lowered quantity is guarded again in its own UPDATE
+    conflicts = []
+    for index, data in mappings:
+        statement = db.update(Ticket).where(Ticket.id == data['id'])
+        if 'quantity' in data:
+            statement = statement.where(db.func.coalesce(Ticket.sold_count, 0) <= data['quantity'])
+        values = {key: value for key, value in data.items() if key != 'id'}
+
+        if db.session.execute(statement.values(**values)).rowcount == 0:
+            conflicts.append({
+                'index': index,
+                'errors': {'quantity': ['Cannot be lower than tickets already sold']}
+            })
+
+    if conflicts:
+        # The batch is one transaction, so none of it is applied
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'Tickets were sold while updating; nothing was changed',
+            'data': {'updated': 0, 'errors': sorted(errors + conflicts, key=lambda error: error['index'])}
+        }), 409
+
+    if mappings:
+        db.session.commit()
+
+    errors.sort(key=lambda error: error['index'])
+
+    return jsonify({
+        'success': bool(mappings),
+        'data': {
+            'updated': len(mappings),
+            'errors': errors
+        }
+    }), 200 if mappings else 400
+
+@tickets_bp.route('/<int:ticket_id>/complimentary', methods=['POST'])
+@jwt_required()
+@premium_required
+def issue_complimentary_tickets(ticket_id):
+    """Issue free tickets to a list of guests by email"""
+    current_user_id = get_jwt_identity()
+    ticket = Ticket.query.get_or_404(ticket_id)
+
+    if ticket.event.created_by != current_user_id:
+        return jsonify({
+            'success': False,
+            'message': 'You can only manage tickets for your own events'
+        }), 403
+
+    items, error_response = bulk_items('guests')
+    if error_response:
+        return error_response
+
+    valid_items, errors = load_items(complimentary_guest_schema, items)
+
+    # Resolve all guest emails with a handful of IN queries
+    emails = list({data['email'].lower() for index, data in valid_items})
+    user_ids = {}
+    for chunk in chunked(emails, LOOKUP_CHUNK_SIZE):
+        rows = db.session.query(User.id, User.email).filter(
+            db.func.lower(User.email).in_(chunk)
+        ).all()
+        user_ids.update({row.email.lower(): row.id for row in rows})
+
+    guests = []
+    seen_emails = set()
+    for index, data in valid_items:
+        email = data['email'].lower()
+
+        if email not in user_ids:
+            errors.append({'index': index, 'errors': {'email': ['No user with this email']}})
+        elif email in seen_emails:
+            errors.append({'index': index, 'errors': {'email': ['Guest listed more than once']}})
+        else:
+            seen_emails.add(email)
+            guests.append((user_ids[email], data['quantity']))
+
+    errors.sort(key=lambda error: error['index'])
+
+    if not guests:
+        return jsonify({
+            'success': False,
+            'data': {'issued': 0, 'errors': errors}
+        }), 400
+
+    total_quantity = sum(quantity for user_id, quantity in guests)
+
+    # Reserve inventory atomically; fails if another sale took the last seats
+    result = db.session.execute(
+        db.update(Ticket).where(
+            Ticket.id == ticket_id,
+            db.func.coalesce(Ticket.sold_count, 0) + total_quantity <= Ticket.quantity
+        ).values(sold_count=db.func.coalesce(Ticket.sold_count, 0) + total_quantity)
+    )
+
+    if result.rowcount == 0:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'Only {ticket.remaining_quantity()} tickets remaining, '
+                       f'{total_quantity} requested'
+        }), 409
+
+    now = datetime.utcnow()
+    purchases = [{
+        'user_id': user_id,
+        'ticket_id': ticket_id,
+        'quantity': quantity,
+        'unit_price': 0,
+        'total_amount': 0,
+        'status': 'completed',
+        'created_at': now
+    } for user_id, quantity in guests]
+
+    # return_defaults fills in the new ids so codes can be issued right away
+    db.session.bulk_insert_mappings(Purchase, purchases, return_defaults=True)
+    issue_tickets((purchase['id'], ticket.event_id, purchase['quantity']) for purchase in purchases)
+
+    db.session.commit()
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'issued': len(guests),
+            'tickets_issued': total_quantity,
+            'errors': errors
+        }
+    }), 201
@@ -1,5 +1,5 @@
 from marshmallow import Schema, fields, validate, validates, ValidationError
-from datetime import datetime, time
+from datetime import date, time
 
 class StudentSchema(Schema):
     id = fields.Int(dump_only=True)
@@ -41,7 +41,7 @@ class EventSchema(Schema):
     
     @validates('date')
     def validate_date(self, value):
-        if value < datetime.now().date():
+        if value < date.today():
             raise ValidationError('Event date cannot be in the past')
     
     @validates('end_time')
@@ -64,4 +64,21 @@ class ClubMemberSchema(Schema):
     student_id = fields.Int(dump_only=True)
     student_name = fields.Str(dump_only=True)
     role = fields.Str(validate=validate.OneOf(['leader', 'member']), missing='member')
-    joined_at = fields.DateTime(dump_only=True)
\ No newline at end of file
+    joined_at = fields.DateTime(dump_only=True)
+
+class TicketTierSchema(Schema):
+    name = fields.Str(required=True, validate=validate.Length(min=1, max=100))
+    description = fields.Str(validate=validate.Length(max=500))
+    price = fields.Decimal(required=True, places=2, validate=validate.Range(min=0))
+    quantity = fields.Int(required=True, validate=validate.Range(min=1))
+    sale_start_date = fields.DateTime()
+    sale_end_date = fields.DateTime(allow_none=True)
+
+class TicketUpdateSchema(Schema):
+    id = fields.Int(required=True)
+    price = fields.Decimal(places=2, validate=validate.Range(min=0))
+    quantity = fields.Int(validate=validate.Range(min=1))
+
+class ComplimentaryGuestSchema(Schema):
+    email = fields.Email(required=True)
+    quantity = fields.Int(validate=validate.Range(min=1, max=10), missing=1)
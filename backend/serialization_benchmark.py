@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Microbenchmark: Event.to_dict() + stdlib JSON vs event_rows() + FastJSONProvider.
+
+Usage:
+    python serialization_benchmark.py [--events 10000] [--repeat 3]
+
+Seeds an in-memory SQLite database and reports the best of N runs for each path.
+"""
+
+import argparse
+import time
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from flask.json.provider import DefaultJSONProvider
+from app import create_app, db
+from config import TestingConfig
+from models import User, Club, Event, Ticket
+from services.serialization import event_rows
+
+class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+def seed(count):
+    """Create count events, each with two ticket tiers"""
+    leader = User(name='Bench Leader', email='bench@campus.edu', role='verified_leader')
+    leader.set_password('password123')
+    db.session.add(leader)
+    db.session.flush()
+
+    club = Club(name='Bench Club', description='Benchmark club', created_by=leader.id)
+    db.session.add(club)
+    db.session.flush()
+
+    start = datetime(2030, 1, 1, 18, 0)
+    db.session.bulk_insert_mappings(Event, [{
+        'id': index + 1,
+        'title': f'Event {index}',
+        'description': 'Benchmark event',
+        'date': date(2030, 1, 1) + timedelta(days=index % 365),
+        'start_time': start.time(),
+        'end_time': (start + timedelta(hours=2)).time(),
+        'location': f'Hall {index % 20}',
+        'club_id': club.id if index % 2 else None,
+        'created_by': leader.id,
+        'is_paid': True,
+        'created_at': start
+    } for index in range(count)])
+    db.session.bulk_insert_mappings(Ticket, [{
+        'event_id': index // 2 + 1,
+        'name': 'VIP' if index % 2 else 'General',
+        'price': Decimal('500.00') if index % 2 else Decimal('150.00'),
+        'quantity': 100,
+        'sold_count': index % 100,
+        'sale_start_date': start - timedelta(days=30),
+        'created_at': start
+    } for index in range(count * 2)])
+    db.session.commit()
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()  # Start each run with a cold identity map
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark event list serialization')
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        seed(args.events)
+
+        stdlib = DefaultJSONProvider(app)
+        event_ids = [event_id for event_id, in db.session.query(Event.id).order_by(Event.id)]
+
+        to_dict_time = best_of(args.repeat, lambda: stdlib.dumps(
+            [event.to_dict(include_tickets=True) for event in Event.query.order_by(Event.id)]
+        ))
+        fast_time = best_of(args.repeat, lambda: app.json.dumps(
+            event_rows(event_ids, include_tickets=True)
+        ))
+
+    print(f'{args.events} events, best of {args.repeat}')
+    print(f'to_dict + stdlib json:      {to_dict_time * 1000:8.1f}ms')
+    print(f'event_rows + FastJSON:      {fast_time * 1000:8.1f}ms')
+    print(f'Speedup:                    {to_dict_time / fast_time:8.1f}x')
+
+if __name__ == '__main__':
+    main()
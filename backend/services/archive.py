@@ -0,0 +1,158 @@
+import time
+import click
+from datetime import date
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import exists, func, insert, select, text, union_all
+from app import db
+from models import (
+    Event, Ticket, Purchase, Commission, IssuedTicket, Refund, MpesaCallback,
+    PurchaseArchive, CommissionArchive, IssuedTicketArchive
+)
+
+# Live table -> archive table, in the order rows are copied
+ARCHIVES = (
+    (Purchase, PurchaseArchive),
+    (Commission, CommissionArchive),
+    (IssuedTicket, IssuedTicketArchive)
+)
+
+# Purchases still moving (pending, refund_requested) stay in the live table
+FINAL_STATUSES = ('completed', 'failed', 'refunded')
+
+# Commissions in any other payout status (pending, failed, clawback) are still
+# owed one way or the other and keep their purchase live
+SETTLED_PAYOUT_STATUSES = ('paid', 'reversed')
+
+def months_before(today, months):
+    """First day of the month `months` before today's month"""
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def batch_rows(model, purchase_ids):
+    """Filter for a live table's rows belonging to the given purchases"""
+    column = model.id if model is Purchase else model.purchase_id
+    return column.in_(purchase_ids)
+
+def ensure_partitions(purchase_ids):
+    """Create the monthly archive partitions that a batch is about to land in (PostgreSQL only)
+
+    Each archive is partitioned on its own created_at, and a commission or
+    ticket code can be created months after its purchase (late callbacks,
+    ledger repairs), so every table's months are looked up separately.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+
+    for model, archive in ARCHIVES:
+        table = archive.__tablename__
+        months = db.session.query(func.date_trunc('month', model.created_at)).filter(
+            batch_rows(model, purchase_ids)
+        ).distinct().all()
+        for (month,) in sorted(months):
+            month = month.date()
+            db.session.execute(text(
+                f'CREATE TABLE IF NOT EXISTS {table}_{month:%Y_%m} PARTITION OF {table} '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+            ))
+
+def with_archive(model):
+    """A model's live and archived rows as one UNION ALL subquery, for all-time figures
+
+    Columns match the archive table (without archived_at), so the result has
+    the same column names as the live table.
+    """
+    archive = dict(ARCHIVES)[model]
+    columns = [column.name for column in archive.__table__.columns if column.name != 'archived_at']
+    return union_all(
+        select(*[model.__table__.c[name] for name in columns]),
+        select(*[archive.__table__.c[name] for name in columns])
+    ).subquery(f'all_{model.__tablename__}')
+
+def archivable(cutoff, after_id, batch_size):
+    """Settled purchases for events before cutoff among the next batch_size purchase ids
+
+    Scanning a fixed id window keeps each batch a primary-key range read
+    however many purchases there are; an open-ended "next N matching" query
+    gets planned as a sort of every remaining match, once per batch.
+    """
+    return db.session.query(Purchase.id, Purchase.created_at).join(
+        Ticket, Ticket.id == Purchase.ticket_id
+    ).join(
+        Event, Event.id == Ticket.event_id
+    ).filter(
+        Event.date < cutoff,
+        Purchase.status.in_(FINAL_STATUSES),
+        Purchase.id > after_id,
+        Purchase.id <= after_id + batch_size,
+        # Unsettled commissions and refunds keep their purchase live
+        ~exists().where(
+            Commission.purchase_id == Purchase.id,
+            Commission.payout_status.notin_(SETTLED_PAYOUT_STATUSES)
+        ),
+        ~exists().where(Refund.purchase_id == Purchase.id)
+    ).all()
+
+def copy_to_archive(model, archive, where):
+    """INSERT ... SELECT matching rows into the archive table, entirely in the database"""
+    columns = [column.name for column in archive.__table__.columns if column.name != 'archived_at']
+    db.session.execute(insert(archive.__table__).from_select(
+        columns,
+        select(*[model.__table__.c[name] for name in columns]).where(where)
+    ))
+
+def archive_batch(rows):
+    """Move purchases and their commissions and ticket codes to the archive in one transaction"""
+    purchase_ids = [row.id for row in rows]
+    ensure_partitions(purchase_ids)
+
+    for model, archive in ARCHIVES:
+        copy_to_archive(model, archive, batch_rows(model, purchase_ids))
+
+    # The inbox keeps the raw callback; only the link to the live purchase goes
+    MpesaCallback.query.filter(MpesaCallback.purchase_id.in_(purchase_ids)).update(
+        {'purchase_id': None}, synchronize_session=False
+    )
+    IssuedTicket.query.filter(IssuedTicket.purchase_id.in_(purchase_ids)).delete(synchronize_session=False)
+    Commission.query.filter(Commission.purchase_id.in_(purchase_ids)).delete(synchronize_session=False)
+    Purchase.query.filter(Purchase.id.in_(purchase_ids)).delete(synchronize_session=False)
+    db.session.commit()
+
+def archive_past_purchases(months=None, batch_size=None):
+    """Archive purchases for events that ended more than `months` months ago"""
+    config = current_app.config
+    months = config['ARCHIVE_AFTER_MONTHS'] if months is None else months
+    batch_size = batch_size or config['ARCHIVE_BATCH_SIZE']
+    cutoff = months_before(date.today(), months)
+    started = time.perf_counter()
+    archived = 0
+    last_id = db.session.query(db.func.max(Purchase.id)).scalar() or 0
+
+    for after_id in range(0, last_id, batch_size):
+        rows = archivable(cutoff, after_id, batch_size)
+        if rows:
+            archive_batch(rows)
+            archived += len(rows)
+
+    duration = time.perf_counter() - started
+    current_app.logger.info(
+        'Archived %d purchases for events before %s in %.3fs', archived, cutoff, duration
+    )
+    return {'archived': archived, 'cutoff': cutoff, 'duration': duration}
+
+@click.command('archive-purchases')
+@click.option('--months', type=int, default=None,
+              help='Archive events older than N months (default: ARCHIVE_AFTER_MONTHS)')
+@click.option('--batch-size', type=int, default=None,
+              help='Purchases moved per transaction (default: ARCHIVE_BATCH_SIZE)')
+@with_appcontext
+def archive_purchases_command(months, batch_size):
+    """Move purchases of long-past events to the archive tables"""
+    result = archive_past_purchases(months, batch_size)
+    click.echo(
+        f"Archived {result['archived']} purchases for events before {result['cutoff']} "
+        f"in {result['duration']:.3f}s"
+    )
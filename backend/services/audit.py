@@ -0,0 +1,99 @@
+import atexit
+import json
+import threading
+from datetime import datetime
+from flask import request, has_request_context
+from sqlalchemy import event
+from app import db
+from models import AuditLog
+from services.replicas import current_identity
+from services.serialization import json_default
+
+class AuditBuffer:
+    """Holds audit entries in memory and writes them with one multi-row INSERT per flush
+
+    Requests only append to a list. A background thread flushes it every
+    AUDIT_FLUSH_SECONDS, or as soon as AUDIT_BUFFER_SIZE entries are waiting,
+    on its own connection so a request's transaction never waits on it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.entries = []
+        self.app = None
+        self.thread = None
+        self.max_size = 100
+        self.interval = 1.0
+
+    def init_app(self, app):
+        self.app = app
+        self.max_size = app.config['AUDIT_BUFFER_SIZE']
+        self.interval = app.config['AUDIT_FLUSH_SECONDS']
+        atexit.register(self.flush)
+
+    def add(self, entry):
+        with self.lock:
+            self.entries.append(entry)
+            full = len(self.entries) >= self.max_size
+            # Started here rather than in init_app so each forked worker gets its own thread
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='audit-flush', daemon=True)
+                self.thread.start()
+        if full:
+            self.wake.set()
+
+    def run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered; returns how many entries were written"""
+        with self.lock:
+            entries, self.entries = self.entries, []
+        if not entries or self.app is None:
+            return 0
+
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as connection:
+                    connection.execute(AuditLog.__table__.insert(), entries)
+        except Exception:
+            self.app.logger.exception('Could not write %d audit entries', len(entries))
+            with self.lock:
+                # Keep them for the next flush, but don't grow without bound while the database is down
+                self.entries[:0] = entries[-self.max_size * 10:]
+            return 0
+
+        return len(entries)
+
+audit_buffer = AuditBuffer()
+
+def record_audit(action, target_type, target_id, reason=None, details=None, financial=False, actor_id=None):
+    """Record an admin action; financial ones are added to the caller's transaction
+
+    A financial entry commits (or rolls back) with the change it describes.
+    Other entries go through the buffer and are written within a second or so.
+    """
+    entry = {
+        'actor_id': actor_id if actor_id is not None else current_identity(),
+        'action': action,
+        'target_type': target_type,
+        'target_id': target_id,
+        'reason': reason or None,
+        'details': json.dumps(details, default=json_default) if details else None,
+        'ip_address': request.remote_addr if has_request_context() else None,
+        'created_at': datetime.utcnow()
+    }
+
+    if financial:
+        db.session.add(AuditLog(**entry))
+    else:
+        audit_buffer.add(entry)
+
+@event.listens_for(AuditLog, 'before_update')
+@event.listens_for(AuditLog, 'before_delete')
+def refuse_audit_change(mapper, connection, target):
+    raise ValueError('Audit log entries are append-only')
@@ -0,0 +1,177 @@
+import base64
+import hashlib
+import hmac
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, or_, select, true
+from app import db
+from models import Event, Registration, ClubMember
+
+# Rendered VEVENT blocks, and whole feeds, kept per worker
+EVENT_CACHE_SIZE = 50000
+FEED_CACHE_SIZE = 2000
+
+# Keep IN lists under SQLite's bound parameter limit
+ID_CHUNK_SIZE = 500
+
+class LRUCache:
+    """A small thread-safe least-recently-used cache"""
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            if len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+event_cache = LRUCache(EVENT_CACHE_SIZE)
+feed_cache = LRUCache(FEED_CACHE_SIZE)
+
+def chunked(ids, size=ID_CHUNK_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def feed_token(user_id):
+    """Secret part of a user's feed URL; calendar apps can't send a JWT"""
+    secret = current_app.config['SECRET_KEY'].encode()
+    digest = hmac.new(secret, f'calendar:{user_id}'.encode(), hashlib.sha256).digest()[:12]
+    return f'{user_id}.{base64.urlsafe_b64encode(digest).decode()}'
+
+def user_for_token(token):
+    """The user id a feed token was issued for, or None if it doesn't verify"""
+    user_id, _, _ = token.partition('.')
+    if not user_id.isdigit():
+        return None
+    return int(user_id) if hmac.compare_digest(feed_token(int(user_id)), token) else None
+
+def feed_condition(kind, owner_id):
+    """Which events belong in a feed: a user's RSVPs and clubs, one club, or the whole campus"""
+    if kind == 'user':
+        return or_(
+            Event.id.in_(select(Registration.event_id).where(
+                Registration.student_id == owner_id,
+                Registration.status != 'declined'
+            )),
+            Event.club_id.in_(select(ClubMember.club_id).where(ClubMember.student_id == owner_id))
+        )
+    if kind == 'club':
+        return Event.club_id == owner_id
+    return true()
+
+def escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def fold(line):
+    """Split a content line into 75-octet pieces as RFC 5545 requires, never inside a UTF-8 character"""
+    data = line.encode()
+    pieces = []
+    limit = 75
+    while len(data) > limit:
+        cut = limit
+        while data[cut] & 0xC0 == 0x80:
+            cut -= 1
+        pieces.append(data[:cut].decode())
+        data = data[cut:]
+        limit = 74  # Continuation lines start with a space
+    pieces.append(data.decode())
+    return '\r\n '.join(pieces)
+
+def ics_time(day, at, offset):
+    """Campus local time as a UTC iCalendar timestamp"""
+    return (datetime.combine(day, at) - offset).strftime('%Y%m%dT%H%M%SZ')
+
+def render_event(row, stamp, offset):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{row.id}@eventhub',
+        f'DTSTAMP:{stamp.strftime("%Y%m%dT%H%M%SZ")}',
+        f'LAST-MODIFIED:{stamp.strftime("%Y%m%dT%H%M%SZ")}',
+        f'DTSTART:{ics_time(row.date, row.start_time, offset)}',
+        f'DTEND:{ics_time(row.date, row.end_time, offset)}',
+        f'SUMMARY:{escape(row.title)}',
+        f'LOCATION:{escape(row.location)}',
+        f'DESCRIPTION:{escape(row.description)}',
+        'END:VEVENT'
+    ]
+    return ''.join(fold(line) + '\r\n' for line in lines)
+
+def feed_window(today):
+    """Feeds include events from CALENDAR_PAST_DAYS ago onwards"""
+    return today - timedelta(days=current_app.config['CALENDAR_PAST_DAYS'])
+
+def feed_etag(kind, owner_id, since):
+    """ETag for a feed's current contents, from one aggregate over its events
+
+    The count, the sum of ids and the latest change between them move
+    whenever an event in the feed is added, removed or edited, so clients
+    polling an unchanged feed get a 304 without the feed being rebuilt.
+    """
+    stamp = func.coalesce(Event.updated_at, Event.created_at)
+    count, id_sum, latest = db.session.query(
+        func.count(Event.id), func.sum(Event.id), func.max(stamp)
+    ).filter(Event.date >= since, feed_condition(kind, owner_id)).one()
+
+    version = f'{kind}:{owner_id}:{since}:{count}:{id_sum or 0}:{latest}'
+    return hashlib.sha1(version.encode()).hexdigest()[:20]
+
+def build_feed(kind, owner_id, name, since):
+    """Render a feed, re-rendering only events that changed since they were cached"""
+    offset = timedelta(hours=current_app.config['CALENDAR_UTC_OFFSET_HOURS'])
+    stamp = func.coalesce(Event.updated_at, Event.created_at)
+    entries = db.session.query(Event.id, stamp.label('stamp')).filter(
+        Event.date >= since,
+        feed_condition(kind, owner_id)
+    ).order_by(Event.date, Event.start_time).all()
+
+    blocks = {}
+    stale = []
+    for entry in entries:
+        cached = event_cache.get(entry.id)
+        if cached is not None and cached[0] == entry.stamp:
+            blocks[entry.id] = cached[1]
+        else:
+            stale.append(entry.id)
+
+    for chunk in chunked(stale):
+        for row in db.session.query(
+            Event.id, Event.title, Event.description, Event.date, Event.start_time,
+            Event.end_time, Event.location, stamp.label('stamp')
+        ).filter(Event.id.in_(chunk)):
+            blocks[row.id] = render_event(row, row.stamp, offset)
+            event_cache.set(row.id, (row.stamp, blocks[row.id]))
+
+    header = ''.join(fold(line) + '\r\n' for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//EventHub//Calendar//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape(name)}'
+    ))
+    body = ''.join(blocks[entry.id] for entry in entries if entry.id in blocks)
+    return header + body + 'END:VCALENDAR\r\n'
+
+def cached_feed(kind, owner_id, name, etag, since):
+    """A feed's body for this ETag, built at most once per change per worker"""
+    key = (kind, owner_id)
+    cached = feed_cache.get(key)
+    if cached is not None and cached[0] == etag:
+        return cached[1]
+
+    body = build_feed(kind, owner_id, name, since)
+    feed_cache.set(key, (etag, body))
+    return body
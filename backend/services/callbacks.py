@@ -0,0 +1,218 @@
+import json
+import time
+import click
+from collections import defaultdict
+from datetime import datetime
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.orm import joinedload
+from app import db
+from models import Ticket, Event, Purchase, MpesaCallback
+from services.commissions import fee_rate_for, record_commission
+from services.email import queue_email
+from services.ticket_codes import issue_tickets
+from services.trending import record_purchases
+
+# Keep IN lists under SQLite's bound parameter limit
+ID_CHUNK_SIZE = 500
+
+def chunked(ids, size=ID_CHUNK_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def store_callback(raw_body):
+    """Append a raw callback to the inbox and commit it; nothing else runs while Safaricom waits"""
+    try:
+        checkout_request_id = json.loads(raw_body)['Body']['stkCallback'].get('CheckoutRequestID')
+    except (ValueError, KeyError, TypeError, AttributeError):
+        checkout_request_id = None  # Still stored; the worker marks it invalid
+
+    db.session.add(MpesaCallback(checkout_request_id=checkout_request_id, payload=raw_body))
+    db.session.commit()
+
+def parse_callback(payload):
+    """Payment result from an STK callback body, or None if it isn't one"""
+    try:
+        stk_callback = json.loads(payload)['Body']['stkCallback']
+        items = stk_callback.get('CallbackMetadata', {}).get('Item', [])
+        metadata = {item.get('Name'): item.get('Value') for item in items}
+
+        return {
+            'checkout_request_id': stk_callback['CheckoutRequestID'],
+            'result_code': int(stk_callback['ResultCode']),
+            'mpesa_code': metadata.get('MpesaReceiptNumber'),
+            'phone_number': metadata.get('PhoneNumber')
+        }
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+def load_pending(results):
+    """Lock the pending purchases the results refer to; {checkout_request_id: purchase}"""
+    purchases = {}
+
+    for chunk in chunked(list(results)):
+        query = Purchase.query.options(
+            joinedload(Purchase.user),
+            joinedload(Purchase.ticket).joinedload(Ticket.event).joinedload(Event.creator)
+        ).filter(
+            Purchase.checkout_request_id.in_(chunk),
+            Purchase.status == 'pending'
+        ).with_for_update(of=Purchase)
+
+        for purchase in query:
+            purchases[purchase.checkout_request_id] = purchase
+
+    # Purchases made before checkout ids were stored can only be matched by phone
+    for checkout_request_id, result in results.items():
+        if checkout_request_id in purchases or result['result_code'] != 0 or not result['phone_number']:
+            continue
+
+        purchase = Purchase.query.filter_by(
+            payment_phone=str(result['phone_number']),
+            checkout_request_id=None,
+            status='pending'
+        ).order_by(Purchase.id).with_for_update().first()
+        if purchase is not None:
+            purchases[checkout_request_id] = purchase
+
+    return purchases
+
+def apply_payment_results(results):
+    """Complete or fail pending purchases from payment results, in the caller's transaction
+
+    Only purchases still pending are touched, so a result delivered twice (or
+    already applied by the status reconciler) changes nothing. sold_count
+    increments are summed per ticket and written with one UPDATE per ticket.
+    Returns {checkout_request_id: purchase id, or None if nothing was pending}.
+    """
+    by_checkout = {}
+    for result in results:
+        seen = by_checkout.get(result['checkout_request_id'])
+        # A success beats a failure reported for the same checkout
+        if seen is None or (seen['result_code'] != 0 and result['result_code'] == 0):
+            by_checkout[result['checkout_request_id']] = result
+
+    purchases = load_pending(by_checkout)
+    increments = defaultdict(int)
+    completed = []
+    rates = {}
+
+    for checkout_request_id, result in by_checkout.items():
+        purchase = purchases.get(checkout_request_id)
+        if purchase is None:
+            continue
+
+        if result['result_code'] != 0:
+            purchase.status = 'failed'
+            continue
+
+        purchase.status = 'completed'
+        purchase.mpesa_code = result['mpesa_code']
+        increments[purchase.ticket_id] += purchase.quantity
+        completed.append(purchase)
+
+        ticket = purchase.ticket
+        event = ticket.event
+        if event.created_by not in rates:
+            rates[event.created_by] = fee_rate_for(event.creator)
+        record_commission(purchase, event.creator, rates[event.created_by])
+
+        # Queued in the same transaction; the email worker delivers it
+        queue_email(
+            to_email=purchase.user.email,
+            to_name=purchase.user.name,
+            template='ticket_confirmation',
+            context={
+                'name': purchase.user.name,
+                'mpesa_code': result['mpesa_code'],
+                'quantity': purchase.quantity,
+                'ticket_name': ticket.name,
+                'event_title': event.title,
+                'event_date': event.date.strftime('%d %B %Y'),
+                'location': event.location
+            },
+            dedupe_key=f'ticket_confirmation:{purchase.id}'
+        )
+
+    # Ticket id order keeps concurrent workers from deadlocking on each other
+    for ticket_id in sorted(increments):
+        Ticket.query.filter_by(id=ticket_id).update(
+            {Ticket.sold_count: Ticket.sold_count + increments[ticket_id]},
+            synchronize_session=False
+        )
+
+    # One signed, scannable code per ticket bought
+    issue_tickets([(purchase.id, purchase.ticket.event_id, purchase.quantity) for purchase in completed])
+    record_purchases(completed)
+
+    return {
+        checkout_request_id: purchases[checkout_request_id].id if checkout_request_id in purchases else None
+        for checkout_request_id in by_checkout
+    }
+
+def process_inbox(batch_size=None):
+    """Apply one batch of stored callbacks; return (processed, ignored, invalid) counts
+
+    The batch is locked with SKIP LOCKED so workers can run side by side, and
+    its purchase updates commit together with the inbox rows being marked, so
+    each callback takes effect exactly once even if a worker dies mid-batch.
+    """
+    batch_size = batch_size or current_app.config['CALLBACK_BATCH_SIZE']
+    callbacks = MpesaCallback.query.filter_by(status='received').order_by(
+        MpesaCallback.id
+    ).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    if not callbacks:
+        db.session.rollback()
+        return 0, 0, 0
+
+    parsed = {callback.id: parse_callback(callback.payload) for callback in callbacks}
+    matched = apply_payment_results([result for result in parsed.values() if result])
+
+    now = datetime.utcnow()
+    counts = {'processed': 0, 'ignored': 0, 'invalid': 0}
+    claimed = set()
+
+    for callback in callbacks:
+        result = parsed[callback.id]
+        purchase_id = matched.get(result['checkout_request_id']) if result else None
+
+        if result is None:
+            callback.status = 'invalid'
+        elif purchase_id is not None and purchase_id not in claimed:
+            callback.status = 'processed'
+            callback.purchase_id = purchase_id
+            claimed.add(purchase_id)
+        else:
+            callback.status = 'ignored'  # Duplicate, late, or for an unknown checkout
+        callback.processed_at = now
+        counts[callback.status] += 1
+
+    db.session.commit()
+    return counts['processed'], counts['ignored'], counts['invalid']
+
+@click.command('process-callbacks')
+@click.option('--interval', type=int, default=0,
+              help='Keep polling the inbox every N seconds (default: drain once)')
+@click.option('--batch-size', type=int, default=None,
+              help='Callbacks applied per transaction (default: CALLBACK_BATCH_SIZE)')
+@with_appcontext
+def process_callbacks_command(interval, batch_size):
+    """Apply stored M-Pesa callbacks to purchases"""
+    batch_size = batch_size or current_app.config['CALLBACK_BATCH_SIZE']
+
+    while True:
+        started = time.perf_counter()
+        processed, ignored, invalid = process_inbox(batch_size)
+
+        if processed or ignored or invalid:
+            click.echo(
+                f'Applied {processed} callbacks ({ignored} ignored, {invalid} invalid) '
+                f'in {time.perf_counter() - started:.3f}s'
+            )
+
+        if processed + ignored + invalid >= batch_size:
+            continue  # More may be waiting, keep draining
+        if not interval:
+            break
+        time.sleep(interval)
@@ -0,0 +1,194 @@
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import case, func, select
+from app import db
+from models import Purchase, Commission, Subscription
+from money import to_cents, to_decimal, from_cents, split_commission
+from services.audit import record_audit
+
+def fee_rate_for(organizer):
+    """Commission rate for an organizer: their own rate, else their plan's, else the default"""
+    config = current_app.config
+
+    if organizer.platform_fee_rate is not None:
+        return to_decimal(organizer.platform_fee_rate)
+
+    plan_type = db.session.query(Subscription.plan_type).filter(
+        Subscription.user_id == organizer.id,
+        Subscription.status == 'active'
+    ).order_by(Subscription.end_date.desc()).limit(1).scalar()
+
+    rate = config['PLATFORM_FEE_RATES'].get(plan_type)
+    return to_decimal(rate or config['PLATFORM_FEE_RATE'])
+
+def record_commission(purchase, organizer, rate=None):
+    """Add the commission for a completed purchase in the caller's transaction"""
+    rate = fee_rate_for(organizer) if rate is None else rate
+    fee, organizer_share = split_commission(to_cents(purchase.total_amount), rate)
+
+    commission = Commission(
+        purchase_id=purchase.id,
+        platform_fee_rate=rate,
+        platform_fee_amount=from_cents(fee),
+        organizer_amount=from_cents(organizer_share)
+    )
+    db.session.add(commission)
+    return commission
+
+def cents(amount):
+    """SQL amount rounded to the cent
+
+    SQLite keeps Numeric columns as floats, so sums and differences of
+    amounts pick up fractions of a cent; rounded, they compare exactly.
+    """
+    return func.round(amount, 2)
+
+def split_mismatch():
+    """SQL condition for a commission whose fee and organizer share don't add up to the purchase total"""
+    return cents(Commission.platform_fee_amount + Commission.organizer_amount) != cents(Purchase.total_amount)
+
+def expected_fee():
+    """SQL expression for the fee a commission should carry (half up, like split_commission)"""
+    return func.round(Purchase.total_amount * Commission.platform_fee_rate, 2)
+
+def fix_commission_amounts(commission_ids):
+    """Set fee and organizer amounts from purchase total x stored rate, in one UPDATE"""
+    total = select(Purchase.total_amount).where(
+        Purchase.id == Commission.purchase_id
+    ).scalar_subquery()
+    rounded_fee = func.round(total * Commission.platform_fee_rate, 2)
+
+    db.session.query(Commission).filter(
+        Commission.id.in_(commission_ids)
+    ).update({
+        Commission.platform_fee_amount: rounded_fee,
+        Commission.organizer_amount: total - rounded_fee
+    }, synchronize_session=False)
+
+def recompute_commissions(batch_size=None, dry_run=False):
+    """Rewrite fee/organizer amounts that don't match total x rate, in bounded batches
+
+    Amounts are recomputed in SQL from the stored rate, so nothing is loaded
+    into Python. Commissions already paid out are left alone (the report
+    still counts them). Each batch commits with an audit entry holding the
+    amounts it replaced.
+    """
+    batch_size = batch_size or current_app.config['COMMISSION_BATCH_SIZE']
+    fee = expected_fee()
+    last_id = 0
+    fixed = 0
+
+    while True:
+        rows = db.session.query(
+            Commission.id, Commission.platform_fee_amount, Commission.organizer_amount
+        ).join(
+            Purchase, Purchase.id == Commission.purchase_id
+        ).filter(
+            Commission.id > last_id,
+            Commission.payout_status != 'paid'
+        ).filter(
+            (Commission.platform_fee_amount != fee) |
+            (Commission.organizer_amount != cents(Purchase.total_amount - fee))
+        ).order_by(Commission.id).limit(batch_size).all()
+        commission_ids = [row.id for row in rows]
+
+        if not commission_ids:
+            break
+
+        if not dry_run:
+            fix_commission_amounts(commission_ids)
+            # target_id is the batch's last commission; details hold every (fee, organizer) replaced
+            record_audit('commission.recompute', 'commission', commission_ids[-1], 'Amounts did not match total x rate', {
+                'replaced': {row.id: [str(row.platform_fee_amount), str(row.organizer_amount)] for row in rows}
+            }, financial=True)
+            db.session.commit()
+
+        fixed += len(commission_ids)
+        last_id = commission_ids[-1]
+        if len(commission_ids) < batch_size:
+            break
+
+    return fixed
+
+def commission_report(since=None):
+    """Aggregate commissions against purchases and count anything that doesn't add up
+
+    All sums run in the database on the Decimal columns and are returned as
+    two-place strings, so the figures are exact to the cent.
+    """
+    fee = expected_fee()
+    query = db.session.query(
+        func.count(Commission.id).label('commissions'),
+        func.coalesce(func.sum(Purchase.total_amount), 0).label('purchase_total'),
+        func.coalesce(func.sum(Commission.platform_fee_amount), 0).label('platform_fee_total'),
+        func.coalesce(func.sum(Commission.organizer_amount), 0).label('organizer_total'),
+        func.coalesce(func.sum(case(
+            (split_mismatch(), 1),
+            else_=0
+        )), 0).label('split_mismatches'),
+        func.coalesce(func.sum(case(
+            (Commission.platform_fee_amount != fee, 1),
+            else_=0
+        )), 0).label('rate_mismatches')
+    ).join(Purchase, Purchase.id == Commission.purchase_id)
+
+    # Complimentary tickets complete at 0 and never carry a commission
+    missing = db.session.query(func.count(Purchase.id)).outerjoin(
+        Commission, Commission.purchase_id == Purchase.id
+    ).filter(
+        Purchase.status == 'completed',
+        Purchase.total_amount > 0,
+        Commission.id.is_(None)
+    )
+
+    if since is not None:
+        query = query.filter(Commission.created_at >= since)
+        missing = missing.filter(Purchase.created_at >= since)
+
+    row = query.one()
+    purchase_cents = to_cents(row.purchase_total)
+    fee_cents = to_cents(row.platform_fee_total)
+    organizer_cents = to_cents(row.organizer_total)
+
+    report = {
+        'commissions': row.commissions,
+        'purchase_total': str(from_cents(purchase_cents)),
+        'platform_fee_total': str(from_cents(fee_cents)),
+        'organizer_total': str(from_cents(organizer_cents)),
+        'unbalanced_amount': str(from_cents(purchase_cents - fee_cents - organizer_cents)),
+        'split_mismatches': int(row.split_mismatches),
+        'rate_mismatches': int(row.rate_mismatches),
+        'missing_commissions': missing.scalar()
+    }
+    report['balanced'] = (
+        purchase_cents == fee_cents + organizer_cents and
+        not report['split_mismatches'] and
+        not report['rate_mismatches'] and
+        not report['missing_commissions']
+    )
+    return report
+
+@click.command('recompute-commissions')
+@click.option('--batch-size', type=int, default=None,
+              help='Commissions updated per batch (default: COMMISSION_BATCH_SIZE)')
+@click.option('--dry-run', is_flag=True, help='Count what would change without writing')
+@with_appcontext
+def recompute_commissions_command(batch_size, dry_run):
+    """Recompute unpaid commission amounts that don't match total x rate"""
+    started = time.perf_counter()
+    fixed = recompute_commissions(batch_size, dry_run)
+    verb = 'Would fix' if dry_run else 'Fixed'
+    click.echo(f'{verb} {fixed} commissions in {time.perf_counter() - started:.3f}s')
+
+@click.command('commission-report')
+@with_appcontext
+def commission_report_command():
+    """Print a reconciliation of commissions against purchases"""
+    report = commission_report()
+    for key, value in report.items():
+        click.echo(f'{key}: {value}')
+
+    if not report['balanced']:
+        raise SystemExit(1)
@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, NullPool
+
+logger = logging.getLogger(__name__)
+
+class PoolMetrics:
+    """Counters for how long requests wait to check out a database connection"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.slow_wait_threshold = 0.1
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait, timed_out=False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+        if wait >= self.slow_wait_threshold:
+            logger.warning('Waited %.0fms for a database connection', wait * 1000)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0,
+                'max_wait_ms': round(self.max_wait * 1000, 3)
+            }
+
+pool_metrics = PoolMetrics()
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records checkout wait time in pool_metrics"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.record(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_metrics.record(time.perf_counter() - started)
+        return connection
+
+def engine_options(config, cli=False):
+    """Build SQLALCHEMY_ENGINE_OPTIONS for PostgreSQL from the deployment shape
+
+    Every gunicorn worker gets its own pool, so the connection budget is split
+    across WEB_CONCURRENCY workers and each pool is sized for the worker's
+    thread (or gevent connection) count. `flask` commands (cli=True) get
+    DB_CLI_STATEMENT_TIMEOUT_MS instead of the web request timeout.
+    """
+    uri = config['SQLALCHEMY_DATABASE_URI'] or ''
+    if not uri.startswith(('postgres://', 'postgresql')):
+        return {}  # Let Flask-SQLAlchemy pick its SQLite defaults
+
+    pool_metrics.slow_wait_threshold = config['DB_POOL_WAIT_WARN_MS'] / 1000
+    connect_args = {}
+
+    if config['DB_PGBOUNCER']:
+        # PgBouncer owns pooling; in transaction mode it rejects startup options
+        # and cannot keep server-side prepared statements between transactions
+        if uri.startswith('postgresql+psycopg://'):
+            connect_args['prepare_threshold'] = None
+        return {
+            'poolclass': NullPool,
+            'pool_pre_ping': True,
+            'connect_args': connect_args
+        }
+
+    # Sent even when 0 so jobs are not held to a timeout set on the database role
+    timeout = config['DB_CLI_STATEMENT_TIMEOUT_MS'] if cli else config['DB_STATEMENT_TIMEOUT_MS']
+    connect_args['options'] = f"-c statement_timeout={timeout}"
+
+    workers = max(1, config['WEB_CONCURRENCY'])
+    threads = max(1, config['GUNICORN_THREADS'])
+    if config['GUNICORN_WORKER_CLASS'] == 'gevent':
+        # Each greenlet may hold a connection; the budget below still caps the pool
+        threads = max(1, config['GUNICORN_WORKER_CONNECTIONS'])
+    budget = max(1, config['DB_MAX_CONNECTIONS'] // workers)
+
+    pool_size = config['DB_POOL_SIZE'] or min(threads, budget)
+    max_overflow = config['DB_MAX_OVERFLOW']
+    if max_overflow is None:
+        max_overflow = max(0, min(threads, budget - pool_size))
+
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+        'connect_args': connect_args
+    }
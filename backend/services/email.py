@@ -0,0 +1,255 @@
+import json
+import string
+import time
+import click
+from datetime import datetime, timedelta
+from flask import current_app
+from flask.cli import with_appcontext
+from app import db
+from models import EmailOutbox
+
+EMAIL_TEMPLATES = {
+    'leader_approved': {
+        'subject': 'Your EventHub organizer application was approved',
+        'body': (
+            'Hi {name},\n\n'
+            'Your application to become an event organizer has been approved. '
+            'Your free trial runs until {trial_end_date}.\n\n'
+            'The EventHub Team'
+        )
+    },
+    'leader_rejected': {
+        'subject': 'Your EventHub organizer application',
+        'body': (
+            'Hi {name},\n\n'
+            'Unfortunately your application to become an event organizer was not approved.\n'
+            'Reason: {reason}\n\n'
+            'The EventHub Team'
+        )
+    },
+    'ticket_confirmation': {
+        'subject': 'Your tickets for {event_title}',
+        'body': (
+            'Hi {name},\n\n'
+            'Payment received (M-Pesa {mpesa_code}). You have {quantity} x {ticket_name} '
+            'for {event_title} on {event_date} at {location}.\n\n'
+            'The EventHub Team'
+        )
+    },
+    'event_announcement': {
+        'subject': '{club_name}: {event_title}',
+        'body': (
+            'Hi {name},\n\n'
+            '{club_name} just announced {event_title} on {event_date} at {location}.\n\n'
+            'The EventHub Team'
+        )
+    }
+}
+
+# SendGrid accepts at most 1000 personalizations per request
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+
+def queue_email(to_email, template, context, dedupe_key, to_name=None):
+    """Add an email to the outbox in the caller's transaction (commit sends it)"""
+    if EmailOutbox.query.filter_by(dedupe_key=dedupe_key).first():
+        return None
+
+    message = EmailOutbox(
+        to_email=to_email,
+        to_name=to_name,
+        template=template,
+        context=json.dumps(context, default=str),
+        dedupe_key=dedupe_key
+    )
+    db.session.add(message)
+    return message
+
+def template_fields(text):
+    """Names of the {placeholders} used in a template string"""
+    return [name for _, name, _, _ in string.Formatter().parse(text) if name]
+
+def render(message):
+    """Render (subject, body) for a single outbox message"""
+    template = EMAIL_TEMPLATES[message.template]
+    context = json.loads(message.context or '{}')
+    return template['subject'].format(**context), template['body'].format(**context)
+
+class SendGridBackend:
+    """Send through the SendGrid v3 API, one request per template batch"""
+
+    def __init__(self, config):
+        import requests  # Deferred: only the email worker sends mail
+
+        self.api_url = config['SENDGRID_API_URL']
+        self.api_key = config['SENDGRID_API_KEY']
+        self.from_email = config['FROM_EMAIL']
+        self.session = requests.Session()
+
+    def send_batch(self, template, messages):
+        """Send messages sharing a template; return {message id: error or None}"""
+        body = EMAIL_TEMPLATES[template]['body']
+        # The body is sent once with -field- tags filled in per recipient
+        tagged_body = body.format(**{name: f'-{name}-' for name in template_fields(body)})
+        results = {}
+
+        for start in range(0, len(messages), SENDGRID_MAX_PERSONALIZATIONS):
+            chunk = messages[start:start + SENDGRID_MAX_PERSONALIZATIONS]
+            personalizations = []
+
+            for message in chunk:
+                context = json.loads(message.context or '{}')
+                subject, _ = render(message)
+                personalizations.append({
+                    'to': [{'email': message.to_email, 'name': message.to_name or message.to_email}],
+                    'subject': subject,
+                    'substitutions': {f'-{name}-': str(context.get(name, '')) for name in template_fields(body)}
+                })
+
+            response = self.session.post(
+                self.api_url,
+                json={
+                    'personalizations': personalizations,
+                    'from': {'email': self.from_email},
+                    'content': [{'type': 'text/plain', 'value': tagged_body}]
+                },
+                headers={'Authorization': f'Bearer {self.api_key}'},
+                timeout=30
+            )
+
+            error = None if response.status_code < 300 else f'SendGrid {response.status_code}: {response.text[:500]}'
+            results.update({message.id: error for message in chunk})
+
+        return results
+
+class SMTPBackend:
+    """Send over SMTP on one connection per batch (also works with a local SMTP stand-in)"""
+
+    def __init__(self, config):
+        self.host = config['SMTP_HOST']
+        self.port = config['SMTP_PORT']
+        self.from_email = config['FROM_EMAIL']
+
+    def send_batch(self, template, messages):
+        """Send messages sharing a template; return {message id: error or None}"""
+        import smtplib  # Deferred: only the email worker sends mail
+        from email.message import EmailMessage
+
+        results = {}
+
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            for message in messages:
+                subject, body = render(message)
+                email = EmailMessage()
+                email['From'] = self.from_email
+                email['To'] = message.to_email
+                email['Subject'] = subject
+                email.set_content(body)
+
+                try:
+                    smtp.send_message(email)
+                    results[message.id] = None
+                except smtplib.SMTPException as err:
+                    results[message.id] = str(err)
+
+        return results
+
+class ConsoleBackend:
+    """Log emails instead of sending them (development default)"""
+
+    def __init__(self, config):
+        pass
+
+    def send_batch(self, template, messages):
+        """Log messages sharing a template; return {message id: None}"""
+        for message in messages:
+            subject, body = render(message)
+            current_app.logger.info('Email to %s: %s\n%s', message.to_email, subject, body)
+        return {message.id: None for message in messages}
+
+EMAIL_BACKENDS = {
+    'sendgrid': SendGridBackend,
+    'smtp': SMTPBackend,
+    'console': ConsoleBackend
+}
+
+def claim_due_messages(batch_size, lease_seconds):
+    """Lease a batch of due messages so other workers skip them"""
+    now = datetime.utcnow()
+
+    # 'sending' rows whose lease ran out belong to a worker that crashed mid-batch
+    messages = EmailOutbox.query.filter(
+        EmailOutbox.status.in_(['pending', 'sending']),
+        EmailOutbox.next_attempt_at <= now
+    ).order_by(EmailOutbox.next_attempt_at).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    for message in messages:
+        message.status = 'sending'
+        message.next_attempt_at = now + timedelta(seconds=lease_seconds)
+    db.session.commit()
+
+    return messages
+
+def process_outbox(backend=None):
+    """Send one batch of due outbox messages; return (sent, failed) counts"""
+    config = current_app.config
+    backend = backend or EMAIL_BACKENDS[config['EMAIL_BACKEND']](config)
+    messages = claim_due_messages(config['EMAIL_BATCH_SIZE'], config['EMAIL_LEASE_SECONDS'])
+
+    by_template = {}
+    for message in messages:
+        by_template.setdefault(message.template, []).append(message)
+
+    results = {}
+    for template, batch in by_template.items():
+        try:
+            results.update(backend.send_batch(template, batch))
+        except Exception as err:
+            results.update({message.id: str(err) for message in batch})
+
+    now = datetime.utcnow()
+    sent = failed = 0
+
+    for message in messages:
+        error = results.get(message.id)
+        message.attempts = (message.attempts or 0) + 1
+
+        if error is None:
+            message.status = 'sent'
+            message.sent_at = now
+            message.last_error = None
+            sent += 1
+        elif message.attempts >= config['EMAIL_MAX_ATTEMPTS']:
+            message.status = 'failed'
+            message.last_error = error
+            failed += 1
+        else:
+            # Exponential backoff: 30s, 60s, 120s, ... capped at an hour
+            delay = min(3600, 30 * 2 ** (message.attempts - 1))
+            message.status = 'pending'
+            message.next_attempt_at = now + timedelta(seconds=delay)
+            message.last_error = error
+            failed += 1
+
+    db.session.commit()
+    return sent, failed
+
+@click.command('send-emails')
+@click.option('--interval', type=int, default=0,
+              help='Keep polling the outbox every N seconds (default: drain once)')
+@with_appcontext
+def send_emails_command(interval):
+    """Send queued emails from the outbox"""
+    backend = EMAIL_BACKENDS[current_app.config['EMAIL_BACKEND']](current_app.config)
+
+    while True:
+        started = time.perf_counter()
+        sent, failed = process_outbox(backend)
+
+        if sent or failed:
+            click.echo(f'Sent {sent} emails, {failed} failed in {time.perf_counter() - started:.3f}s')
+
+        if sent + failed >= current_app.config['EMAIL_BATCH_SIZE']:
+            continue  # More may be waiting, keep draining
+        if not interval:
+            break
+        time.sleep(interval)
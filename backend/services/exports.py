@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+# Rows are written into the output buffer and flushed to the client in
+# chunks, so the response never holds more than one chunk in memory.
+FLUSH_EVERY = 500
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+def _export_value(value):
+    """Convert a column value into a plain text/JSON friendly value"""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)  # Keep money exact, float() would round
+    return value
+
+def stream_csv(columns, rows, flush_every=FLUSH_EVERY):
+    """Yield CSV chunks for an iterable of row tuples"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([_export_value(value) for value in row])
+
+        if count % flush_every == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue()
+
+def stream_ndjson(columns, rows, flush_every=FLUSH_EVERY):
+    """Yield newline-delimited JSON chunks for an iterable of row tuples"""
+    lines = []
+
+    for row in rows:
+        record = {column: _export_value(value) for column, value in zip(columns, row)}
+        lines.append(json.dumps(record))
+
+        if len(lines) >= flush_every:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def stream_export(export_format, columns, rows, flush_every=FLUSH_EVERY):
+    """Pick the chunk generator for the requested export format"""
+    if export_format == 'ndjson':
+        return stream_ndjson(columns, rows, flush_every)
+    return stream_csv(columns, rows, flush_every)
@@ -0,0 +1,178 @@
+import hashlib
+import time
+import click
+from functools import wraps
+from datetime import datetime, timedelta
+from flask import request, jsonify, current_app, make_response
+from flask.cli import with_appcontext
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+def take_over_stale(record, request_hash):
+    """Claim a record whose 'processing' owner stopped before finishing; True if we got it
+
+    The conditional UPDATE lets exactly one of several racing retries win.
+    """
+    config = current_app.config
+    now = datetime.utcnow()
+    taken = IdempotencyKey.query.filter(
+        IdempotencyKey.id == record.id,
+        IdempotencyKey.status == 'processing',
+        IdempotencyKey.request_hash == request_hash,
+        # Records claimed before locked_at existed count from when they were created
+        db.func.coalesce(IdempotencyKey.locked_at, IdempotencyKey.created_at)
+        < now - timedelta(seconds=config['IDEMPOTENCY_LOCK_TIMEOUT_SECONDS'])
+    ).update({
+        'locked_at': now,
+        'expires_at': now + timedelta(hours=config['IDEMPOTENCY_KEY_TTL_HOURS'])
+    }, synchronize_session=False)
+    db.session.commit()
+    return taken == 1
+
+def claim_key(key, user_id, endpoint, request_hash):
+    """Insert a 'processing' record for the key, or return the existing record
+
+    A 'processing' record older than IDEMPOTENCY_LOCK_TIMEOUT_SECONDS is left
+    by a request that died (worker killed mid-request), so it is taken over
+    rather than blocking retries until the key expires.
+    """
+    now = datetime.utcnow()
+    record = IdempotencyKey(
+        key=key,
+        user_id=user_id,
+        endpoint=endpoint,
+        request_hash=request_hash,
+        status='processing',
+        locked_at=now,
+        expires_at=now + timedelta(hours=current_app.config['IDEMPOTENCY_KEY_TTL_HOURS'])
+    )
+    db.session.add(record)
+
+    try:
+        db.session.commit()
+        return record, True
+    except IntegrityError:
+        # Someone (a retry or a concurrent duplicate) claimed the key first
+        db.session.rollback()
+
+    existing = IdempotencyKey.query.filter_by(
+        user_id=user_id, endpoint=endpoint, key=key
+    ).first()
+
+    if existing and existing.is_expired():
+        db.session.delete(existing)
+        db.session.commit()
+        return claim_key(key, user_id, endpoint, request_hash)
+
+    if existing and existing.status == 'processing' and take_over_stale(existing, request_hash):
+        db.session.refresh(existing)
+        return existing, True
+
+    return existing, False
+
+def replay_response(record):
+    """Rebuild the stored first response for a retried request"""
+    response = current_app.response_class(
+        record.response_body,
+        status=record.response_code,
+        mimetype='application/json'
+    )
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def idempotent(fn):
+    """Replay the first response for requests that repeat an Idempotency-Key (use after @jwt_required)"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+
+        if not key:
+            return fn(*args, **kwargs)
+
+        if len(key) > 255:
+            return jsonify({
+                'success': False,
+                'message': f'{IDEMPOTENCY_HEADER} must be at most 255 characters'
+            }), 400
+
+        endpoint = request.endpoint
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+        record, claimed = claim_key(key, get_jwt_identity(), endpoint, request_hash)
+
+        if not claimed:
+            if record is None:
+                # The other request failed and released the key between our insert and read
+                return fn(*args, **kwargs)
+
+            if record.request_hash != request_hash:
+                return jsonify({
+                    'success': False,
+                    'message': f'{IDEMPOTENCY_HEADER} was already used with a different request'
+                }), 422
+
+            if record.status == 'processing':
+                response = jsonify({
+                    'success': False,
+                    'message': 'A request with this Idempotency-Key is still being processed'
+                })
+                response.status_code = 409
+                response.headers['Retry-After'] = '1'
+                return response
+
+            return replay_response(record)
+
+        try:
+            response = make_response(fn(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            db.session.delete(record)
+            db.session.commit()
+            raise
+
+        if response.status_code >= 500:
+            # Server errors are not cached so that the client can retry
+            db.session.delete(record)
+        else:
+            record.status = 'completed'
+            record.response_code = response.status_code
+            record.response_body = response.get_data(as_text=True)
+        db.session.commit()
+
+        return response
+    return wrapper
+
+def purge_expired_keys(batch_size=1000):
+    """Delete idempotency records past their TTL in bounded batches"""
+    now = datetime.utcnow()
+    deleted = 0
+
+    while True:
+        ids = [row.id for row in db.session.query(IdempotencyKey.id).filter(
+            IdempotencyKey.expires_at < now
+        ).limit(batch_size).all()]
+
+        if not ids:
+            break
+
+        db.session.query(IdempotencyKey).filter(
+            IdempotencyKey.id.in_(ids)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            break
+
+    return deleted
+
+@click.command('purge-idempotency-keys')
+@with_appcontext
+def purge_idempotency_keys_command():
+    """Delete expired idempotency keys"""
+    started = time.perf_counter()
+    deleted = purge_expired_keys()
+    click.echo(f'Deleted {deleted} expired idempotency keys in {time.perf_counter() - started:.3f}s')
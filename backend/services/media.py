@@ -0,0 +1,301 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+import click
+from datetime import datetime, timedelta
+from flask import Request, current_app
+from flask.cli import with_appcontext
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import Event, Club, ImageAsset
+
+# Which stored variant is written back to each model's image column
+TARGET_VARIANTS = {
+    'event': 'large',
+    'club': 'small'
+}
+
+_pool = None
+
+class HashingFile:
+    """Temporary upload file that hashes the body as Werkzeug streams it to disk"""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=directory, prefix='upload-', delete=False)
+        self.sha256 = hashlib.sha256()
+        self.detached = False
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+    def detach(self):
+        """Flush to disk and hand the file over; it will no longer be deleted on close"""
+        self.file.flush()
+        self.detached = True
+        return self.file.name
+
+    def close(self):
+        self.file.close()
+        if not self.detached and os.path.exists(self.file.name):
+            os.remove(self.file.name)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+class UploadRequest(Request):
+    """Request class that streams every uploaded file straight to disk"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingFile(current_app.config['UPLOAD_TMP_DIR'])
+
+class LocalStorage:
+    """Store files under UPLOAD_FOLDER, served from MEDIA_URL (stands in for Cloudinary)"""
+
+    def __init__(self, settings):
+        self.folder = settings['folder']
+        self.base_url = settings['base_url']
+
+    def save(self, data, name):
+        path = os.path.join(self.folder, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as output:
+            output.write(data)
+        return f'{self.base_url}/{name}'
+
+class CloudinaryStorage:
+    """Store files in Cloudinary"""
+
+    def __init__(self, settings):
+        import cloudinary  # Optional integration, only loaded in the image workers
+        import cloudinary.uploader
+
+        cloudinary.config(
+            cloud_name=settings['cloud_name'],
+            api_key=settings['api_key'],
+            api_secret=settings['api_secret'],
+            secure=True
+        )
+        self.uploader = cloudinary.uploader
+
+    def save(self, data, name):
+        public_id = os.path.splitext(name)[0]
+        result = self.uploader.upload(io.BytesIO(data), public_id=f'eventhub/{public_id}', overwrite=True)
+        return result['secure_url']
+
+STORAGE_BACKENDS = {
+    'local': LocalStorage,
+    'cloudinary': CloudinaryStorage
+}
+
+def render_variants(path, content_hash, sizes, storage_settings):
+    """Resize an uploaded image and store each variant (runs in the process pool)"""
+    from PIL import Image, ImageOps  # Only the image workers need Pillow
+
+    try:
+        storage = STORAGE_BACKENDS[storage_settings['backend']](storage_settings)
+        urls = {}
+
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            for name, width in sizes.items():
+                variant = image.copy()
+                variant.thumbnail((width, width * 4))  # Bound by width, keep aspect ratio
+                buffer = io.BytesIO()
+                variant.save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+                urls[name] = storage.save(buffer.getvalue(), f'{content_hash[:2]}/{content_hash}/{name}.jpg')
+
+        return urls
+    finally:
+        os.remove(path)
+
+def get_pool():
+    """Process pool for image work, created lazily so each gunicorn worker gets its own"""
+    global _pool
+    if _pool is None:
+        from concurrent.futures import ProcessPoolExecutor  # Deferred until the first upload
+
+        _pool = ProcessPoolExecutor(max_workers=current_app.config['IMAGE_WORKERS'])
+    return _pool
+
+def submit_to_pool(fn, *args):
+    """Submit work to the pool, replacing it first if a pool process has died
+
+    Once a process dies (e.g. killed for memory on a huge image) the pool is
+    broken and refuses every later submit, so it is swapped for a new one.
+    """
+    global _pool
+    from concurrent.futures.process import BrokenProcessPool
+
+    try:
+        return get_pool().submit(fn, *args)
+    except BrokenProcessPool:
+        current_app.logger.warning('Image process pool was broken; starting a new one')
+        _pool.shutdown(wait=False)
+        _pool = None
+        return get_pool().submit(fn, *args)
+
+def storage_settings(config):
+    """Plain dict of storage settings that can be sent to a pool process"""
+    return {
+        'backend': config['MEDIA_STORAGE'],
+        'folder': config['UPLOAD_FOLDER'],
+        'base_url': config['MEDIA_URL'],
+        'cloud_name': config['CLOUDINARY_CLOUD_NAME'],
+        'api_key': config['CLOUDINARY_API_KEY'],
+        'api_secret': config['CLOUDINARY_API_SECRET']
+    }
+
+def apply_to_targets(asset, targets):
+    """Write the asset's variant URL into the waiting Event/Club rows"""
+    variants = json.loads(asset.variants or '{}')
+
+    for kind, target_id in targets:
+        url = variants.get(TARGET_VARIANTS[kind])
+        if kind == 'event':
+            Event.query.filter_by(id=target_id).update({'image_url': url})
+        elif kind == 'club':
+            Club.query.filter_by(id=target_id).update({'logo_url': url})
+
+def processing_cutoff():
+    """Assets that started processing before this are assumed lost"""
+    return datetime.utcnow() - timedelta(seconds=current_app.config['IMAGE_PROCESSING_TIMEOUT_SECONDS'])
+
+def is_stale(asset):
+    started = asset.processing_started_at
+    return asset.status == 'processing' and (started is None or started < processing_cutoff())
+
+def finish_processing(app, asset_id, started, future):
+    """Record the pool result (runs in the parent process once the future completes)"""
+    with app.app_context():
+        asset = ImageAsset.query.filter_by(id=asset_id).with_for_update().first()
+
+        if asset.processing_started_at != started:
+            db.session.rollback()  # The asset was reclaimed and resubmitted since; that attempt owns it
+            return
+
+        try:
+            asset.variants = json.dumps(future.result())
+            asset.status = 'ready'
+            apply_to_targets(asset, json.loads(asset.targets or '[]'))
+        except Exception as err:
+            asset.status = 'failed'
+            asset.error = str(err)[:500]
+            app.logger.warning('Image %s failed to process: %s', asset.content_hash, err)
+
+        asset.targets = '[]'
+        db.session.commit()
+
+def submit_processing(asset, upload):
+    """Hand the uploaded file to the process pool and record the result when done"""
+    asset_id = asset.id
+    started = asset.processing_started_at
+    path = upload.stream.detach()
+    app = current_app._get_current_object()
+
+    try:
+        future = submit_to_pool(
+            render_variants, path, asset.content_hash,
+            app.config['IMAGE_SIZES'], storage_settings(app.config)
+        )
+    except Exception as err:
+        # Nothing will ever report back, so fail now rather than wait for fail-stale-images
+        app.logger.warning('Image %s could not be queued: %s', asset.content_hash, err)
+        os.remove(path)
+        ImageAsset.query.filter_by(id=asset_id, processing_started_at=started).update({
+            'status': 'failed',
+            'error': f'Could not start processing: {err}'[:500],
+            'targets': '[]'
+        }, synchronize_session=False)
+        db.session.commit()
+        return
+
+    future.add_done_callback(lambda done: finish_processing(app, asset_id, started, done))
+
+def upload_image(upload, kind, target_id, user_id):
+    """Dedupe an uploaded image by content hash, then process it off the request thread"""
+    content_hash = upload.stream.hexdigest()
+    target = [kind, target_id]
+
+    asset = ImageAsset.query.filter_by(content_hash=content_hash).with_for_update().first()
+
+    if asset is None:
+        asset = ImageAsset(
+            content_hash=content_hash,
+            status='processing',
+            targets=json.dumps([target]),
+            processing_started_at=datetime.utcnow(),
+            created_by=user_id
+        )
+        db.session.add(asset)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # The same image was uploaded concurrently; attach to that one
+            db.session.rollback()
+            return upload_image(upload, kind, target_id, user_id)
+
+        submit_processing(asset, upload)
+        return asset
+
+    # Seen this exact image before: nothing to resize or upload again
+    if asset.status == 'ready':
+        apply_to_targets(asset, [target])
+        db.session.commit()
+    elif asset.status == 'processing' and not is_stale(asset):
+        asset.targets = json.dumps(json.loads(asset.targets or '[]') + [target])
+        db.session.commit()
+    else:
+        # A previous attempt failed or never finished, try again with this copy
+        waiting = json.loads(asset.targets or '[]') if asset.status == 'processing' else []
+        asset.status = 'processing'
+        asset.error = None
+        asset.targets = json.dumps(waiting + [target])
+        asset.processing_started_at = datetime.utcnow()
+        db.session.commit()
+        submit_processing(asset, upload)
+
+    return asset
+
+def fail_stale_images():
+    """Mark assets stuck in processing past IMAGE_PROCESSING_TIMEOUT_SECONDS as failed; returns how many
+
+    A pool worker that dies, or a web process restarted mid-resize, never
+    reports back. Failed assets are processed again on the next upload of
+    the same image.
+    """
+    failed = ImageAsset.query.filter(
+        ImageAsset.status == 'processing',
+        or_(ImageAsset.processing_started_at < processing_cutoff(), ImageAsset.processing_started_at.is_(None))
+    ).update({
+        'status': 'failed',
+        'error': 'Processing did not finish in time',
+        'targets': '[]'
+    }, synchronize_session=False)
+    db.session.commit()
+    return failed
+
+@click.command('fail-stale-images')
+@click.option('--interval', type=int, default=0,
+              help='Repeat every N seconds (default: run once)')
+@with_appcontext
+def fail_stale_images_command(interval):
+    """Fail image uploads whose processing never finished"""
+    while True:
+        failed = fail_stale_images()
+        click.echo(f'Marked {failed} stale image uploads as failed')
+
+        if not interval:
+            break
+        time.sleep(interval)
@@ -0,0 +1,177 @@
+import base64
+import hmac
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+
+def format_phone(phone_number):
+    """Format a phone number for Daraja (remove + and ensure it starts with 254)"""
+    phone_number = str(phone_number)
+    if phone_number.startswith('+'):
+        phone_number = phone_number[1:]
+    if phone_number.startswith('0'):
+        phone_number = '254' + phone_number[1:]
+    return phone_number
+
+def b2c_token_valid(token):
+    """Whether a B2C result URL carries our MPESA_B2C_CALLBACK_TOKEN"""
+    return hmac.compare_digest(token.encode(), current_app.config['MPESA_B2C_CALLBACK_TOKEN'].encode())
+
+class RequestPacer:
+    """Spaces calls out to at most `rate` per second across threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            at = max(now, self.next_at)
+            self.next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+class MpesaClient:
+    """Daraja API client sharing one pooled HTTP session and a cached access token
+
+    Reusing keep-alive connections and the OAuth token saves a TLS handshake
+    and a token round-trip on every STK push. Under the gevent worker these
+    calls yield instead of blocking the worker.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.session = None
+        self.token = None
+        self.token_expires_at = 0
+
+    def get_session(self):
+        if self.session is None:
+            import requests  # Deferred: only needed once a payment is made
+            from requests.adapters import HTTPAdapter
+
+            pool_size = current_app.config['MPESA_POOL_SIZE']
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+            session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+            self.session = session
+        return self.session
+
+    def base_url(self):
+        config = current_app.config
+        if config['MPESA_BASE_URL']:
+            return config['MPESA_BASE_URL'].rstrip('/')
+        return f"https://{'sandbox' if config['MPESA_ENVIRONMENT'] == 'sandbox' else 'api'}.safaricom.co.ke"
+
+    def get_token(self):
+        """Get an M-Pesa access token, reusing it until shortly before it expires"""
+        if self.token and time.time() < self.token_expires_at:
+            return self.token
+
+        with self.lock:
+            if self.token and time.time() < self.token_expires_at:
+                return self.token  # Another thread refreshed it while we waited
+
+            config = current_app.config
+            credentials = base64.b64encode(
+                f"{config['MPESA_CONSUMER_KEY']}:{config['MPESA_CONSUMER_SECRET']}".encode()
+            ).decode()
+
+            response = self.get_session().get(
+                f'{self.base_url()}/oauth/v1/generate?grant_type=client_credentials',
+                headers={'Authorization': f'Basic {credentials}'},
+                timeout=config['MPESA_TIMEOUT']
+            )
+            data = response.json()
+
+            self.token = data.get('access_token')
+            # Tokens last an hour; refresh a minute early
+            self.token_expires_at = time.time() + int(data.get('expires_in', 3599)) - 60
+            return self.token
+
+    def post(self, path, payload):
+        """POST to a Daraja endpoint; returns Daraja's JSON answer, or None if the outcome is unknown
+
+        A timeout, a dropped connection or a reply that isn't Daraja's JSON
+        (e.g. a gateway error page) says nothing about whether the request
+        took effect, so callers must not treat None as a rejection.
+        """
+        import requests
+
+        try:
+            response = self.get_session().post(
+                f'{self.base_url()}{path}',
+                json=payload,
+                headers={'Authorization': f'Bearer {self.get_token()}'},
+                timeout=current_app.config['MPESA_TIMEOUT']
+            )
+            data = response.json()
+        except (requests.RequestException, ValueError) as err:
+            current_app.logger.warning('M-Pesa request to %s failed: %s', path, err)
+            return None
+
+        if not isinstance(data, dict):
+            current_app.logger.warning('Unexpected M-Pesa response from %s: %r', path, data)
+            return None
+        return data
+
+    def password(self, timestamp):
+        config = current_app.config
+        return base64.b64encode(
+            f"{config['MPESA_SHORTCODE']}{config['MPESA_PASSKEY']}{timestamp}".encode()
+        ).decode()
+
+    def stk_push(self, phone_number, amount, account_reference, transaction_desc):
+        """Initiate M-Pesa STK push payment"""
+        config = current_app.config
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+
+        phone_number = format_phone(phone_number)
+
+        return self.post('/mpesa/stkpush/v1/processrequest', {
+            "BusinessShortCode": config['MPESA_SHORTCODE'],
+            "Password": self.password(timestamp),
+            "Timestamp": timestamp,
+            "TransactionType": "CustomerPayBillOnline",
+            "Amount": amount,
+            "PartyA": phone_number,
+            "PartyB": config['MPESA_SHORTCODE'],
+            "PhoneNumber": phone_number,
+            "CallBackURL": config['MPESA_CALLBACK_URL'],
+            "AccountReference": account_reference,
+            "TransactionDesc": transaction_desc
+        })
+
+    def stk_query(self, checkout_request_id):
+        """Ask Daraja for the outcome of an STK push"""
+        config = current_app.config
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+
+        return self.post('/mpesa/stkpushquery/v1/query', {
+            "BusinessShortCode": config['MPESA_SHORTCODE'],
+            "Password": self.password(timestamp),
+            "Timestamp": timestamp,
+            "CheckoutRequestID": checkout_request_id
+        })
+
+    def b2c_payment(self, phone_number, amount, remarks, occasion=''):
+        """Send money to a customer (used for refunds); the outcome arrives at MPESA_B2C_RESULT_URL"""
+        config = current_app.config
+
+        return self.post('/mpesa/b2c/v1/paymentrequest', {
+            "InitiatorName": config['MPESA_B2C_INITIATOR'],
+            "SecurityCredential": config['MPESA_B2C_SECURITY_CREDENTIAL'],
+            "CommandID": "BusinessPayment",
+            "Amount": amount,
+            "PartyA": config['MPESA_B2C_SHORTCODE'],
+            "PartyB": format_phone(phone_number),
+            "Remarks": remarks,
+            "QueueTimeOutURL": f"{config['MPESA_B2C_TIMEOUT_URL'].rstrip('/')}/{config['MPESA_B2C_CALLBACK_TOKEN']}",
+            "ResultURL": f"{config['MPESA_B2C_RESULT_URL'].rstrip('/')}/{config['MPESA_B2C_CALLBACK_TOKEN']}",
+            "Occasion": occasion
+        })
+
+mpesa = MpesaClient()
@@ -0,0 +1,158 @@
+import json
+import time
+import click
+from collections import defaultdict
+from datetime import datetime
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event as orm_event
+from app import db
+from models import User, Event, EmailOutbox, ClubMember, NotificationPreference, NotificationJob
+
+class EmailChannel:
+    """Queue one outbox email per recipient; the email worker delivers them"""
+
+    def __init__(self, config):
+        pass
+
+    def send_batch(self, club_event, recipients, context):
+        """Queue emails in the caller's transaction; returns how many were new"""
+        keys = {f'event_announcement:{club_event.id}:{recipient.student_id}': recipient for recipient in recipients}
+        existing = {key for (key,) in db.session.query(EmailOutbox.dedupe_key).filter(
+            EmailOutbox.dedupe_key.in_(list(keys))
+        )}
+        now = datetime.utcnow()
+
+        db.session.bulk_insert_mappings(EmailOutbox, [{
+            'to_email': recipient.email,
+            'to_name': recipient.name,
+            'template': 'event_announcement',
+            'context': json.dumps({**context, 'name': recipient.name}),
+            'dedupe_key': key,
+            'status': 'pending',
+            'next_attempt_at': now
+        } for key, recipient in keys.items() if key not in existing])
+        return len(keys) - len(existing)
+
+class ConsoleChannel:
+    """Log notifications instead of sending them (local stand-in)"""
+
+    def __init__(self, config):
+        pass
+
+    def send_batch(self, club_event, recipients, context):
+        for recipient in recipients:
+            current_app.logger.info(
+                'Notify %s <%s>: %s on %s', recipient.name, recipient.email,
+                context['event_title'], context['event_date']
+            )
+        return len(recipients)
+
+NOTIFICATION_CHANNELS = {
+    'email': EmailChannel,
+    'console': ConsoleChannel
+}
+
+@orm_event.listens_for(Event, 'after_insert')
+def queue_event_notifications(mapper, connection, target):
+    """Queue the fan-out job for a new club event; it commits with the event"""
+    if target.club_id is not None:
+        connection.execute(NotificationJob.__table__.insert().values(
+            event_id=target.id,
+            club_ids=json.dumps([target.club_id])
+        ))
+
+def next_recipients(club_ids, after_student_id, exclude_id, batch_size):
+    """Next batch of members of any of the clubs, each once, who want new-event notifications"""
+    return db.session.query(
+        ClubMember.student_id, User.name, User.email, NotificationPreference.channel
+    ).join(
+        User, User.id == ClubMember.student_id
+    ).outerjoin(
+        NotificationPreference, NotificationPreference.user_id == ClubMember.student_id
+    ).filter(
+        ClubMember.club_id.in_(club_ids),
+        ClubMember.student_id > after_student_id,
+        ClubMember.student_id != exclude_id,
+        User.role != 'suspended',
+        NotificationPreference.new_events.isnot(False)  # No preference row means opted in
+    ).distinct().order_by(ClubMember.student_id).limit(batch_size).all()
+
+def run_notification_job(job, channels, batch_size=None):
+    """Notify an event's club members in batches; returns how many were notified
+
+    Members are read in student id order over the (club_id, student_id)
+    index, so members of several of the clubs are only picked once. The
+    job's cursor commits with each batch, so a restart carries on after the
+    last batch rather than starting over.
+    """
+    config = current_app.config
+    batch_size = batch_size or config['NOTIFY_BATCH_SIZE']
+    default_channel = config['NOTIFY_DEFAULT_CHANNEL']
+    club_event = Event.query.get(job.event_id)
+    club_ids = json.loads(job.club_ids)
+    sent = 0
+
+    if club_event is not None:
+        job.status = 'running'
+        context = {
+            'club_name': club_event.club.name if club_event.club else 'A club',
+            'event_title': club_event.title,
+            'event_date': club_event.date.strftime('%d %B %Y'),
+            'location': club_event.location
+        }
+
+        while True:
+            recipients = next_recipients(club_ids, job.last_student_id or 0, club_event.created_by, batch_size)
+            if not recipients:
+                break
+
+            by_channel = defaultdict(list)
+            for recipient in recipients:
+                by_channel[recipient.channel if recipient.channel in channels else default_channel].append(recipient)
+
+            batch_sent = sum(
+                channels[name].send_batch(club_event, batch, context) for name, batch in by_channel.items()
+            )
+
+            job.last_student_id = recipients[-1].student_id
+            job.sent_count = (job.sent_count or 0) + batch_sent
+            db.session.commit()
+            sent += batch_sent
+
+            if len(recipients) < batch_size:
+                break
+
+    job.status = 'completed'
+    job.completed_at = datetime.utcnow()
+    db.session.commit()
+    return sent
+
+@click.command('send-notifications')
+@click.option('--interval', type=int, default=0,
+              help='Keep checking for new events every N seconds (default: run once)')
+@click.option('--batch-size', type=int, default=None,
+              help='Members notified per batch (default: NOTIFY_BATCH_SIZE)')
+@with_appcontext
+def send_notifications_command(interval, batch_size):
+    """Notify club members about new club events"""
+    config = current_app.config
+    channels = {name: channel(config) for name, channel in NOTIFICATION_CHANNELS.items()}
+
+    while True:
+        jobs = NotificationJob.query.filter(
+            NotificationJob.status.in_(['queued', 'running'])
+        ).order_by(NotificationJob.id).all()
+
+        for job in jobs:
+            started = time.perf_counter()
+            sent = run_notification_job(job, channels, batch_size)
+            duration = time.perf_counter() - started
+            click.echo(
+                f'Event {job.event_id}: notified {sent} members in {duration:.3f}s '
+                f'({sent / duration if duration else 0:.0f}/s)'
+            )
+
+        if not interval:
+            break
+        time.sleep(interval)
@@ -0,0 +1,186 @@
+import math
+import threading
+import time
+from flask import request, jsonify, current_app
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+
+RATE_PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400
+}
+
+def parse_rate(rate):
+    """Parse a rate string such as '5/minute' into (limit, period seconds)"""
+    limit, period = rate.split('/')
+    return int(limit), RATE_PERIODS[period.strip().rstrip('s')]
+
+class MemoryBackend:
+    """Token buckets kept in this process; fine for a single worker"""
+
+    # Forget idle buckets every N calls so the dict does not grow forever
+    PRUNE_EVERY = 10000
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def consume(self, key, capacity, refill_rate, now):
+        """Take one token; return (allowed, seconds until a token is available)"""
+        with self.lock:
+            self.calls += 1
+            if self.calls % self.PRUNE_EVERY == 0:
+                self.prune(now)
+
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+            else:
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * refill_rate)
+
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now, capacity / refill_rate)
+                return True, 0
+
+            self.buckets[key] = (tokens, now, capacity / refill_rate)
+            return False, (1 - tokens) / refill_rate
+
+    def prune(self, now):
+        """Drop buckets that have been idle long enough to be full again"""
+        self.buckets = {
+            key: bucket for key, bucket in self.buckets.items()
+            if now - bucket[1] < bucket[2]
+        }
+
+# Refill and take a token in one atomic step on the Redis server
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+if tokens == nil then
+    tokens = capacity
+else
+    tokens = math.min(capacity, tokens + (now - tonumber(state[2])) * refill_rate)
+end
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / refill_rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill_rate))
+return {allowed, tostring(retry_after)}
+"""
+
+class RedisBackend:
+    """Token buckets shared by every gunicorn worker through Redis"""
+
+    def __init__(self, url):
+        import redis  # Optional dependency, only needed for the shared backend
+
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def consume(self, key, capacity, refill_rate, now):
+        """Take one token; return (allowed, seconds until a token is available)"""
+        allowed, retry_after = self.script(
+            keys=[f'ratelimit:{key}'],
+            args=[capacity, refill_rate, now]
+        )
+        return allowed == 1, float(retry_after)
+
+def create_backend(url):
+    """Pick a storage backend from RATELIMIT_STORAGE_URL"""
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    return MemoryBackend()
+
+class RateLimiter:
+    """Per-blueprint token bucket rate limiting"""
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.rates = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATELIMIT_ENABLED', True)
+        self.backend = create_backend(app.config.get('RATELIMIT_STORAGE_URL', 'memory://'))
+        self.rates = {}
+        app.extensions['rate_limiter'] = self
+        # One app-level hook, so limits can be set after blueprints are registered
+        app.before_request(self.check_rate_limit)
+
+    def exempt(self, fn):
+        """Skip rate limiting for a view (e.g. server-to-server callbacks)"""
+        fn.rate_limit_exempt = True
+        return fn
+
+    def limit(self, blueprint, rate, per='ip', endpoints=None):
+        """Apply a rate such as '100/minute' to every view in a blueprint
+
+        per='ip' keys buckets by client address; per='user' keys them by the
+        JWT identity and falls back to the address for anonymous requests.
+        With endpoints (view names in the blueprint), the rate applies to just
+        those views, each with its own bucket, and overrides the blueprint's.
+        """
+        capacity, period = parse_rate(rate)
+        for name in [f'{blueprint.name}.{endpoint}' for endpoint in endpoints or ()] or [blueprint.name]:
+            self.rates[name] = (capacity, capacity / period, per)
+
+    def check_rate_limit(self):
+        """Take a token from the bucket of the view or blueprint handling this request"""
+        if not self.enabled:
+            return None
+
+        name = request.endpoint if request.endpoint in self.rates else request.blueprint
+        if name not in self.rates:
+            return None
+
+        view = current_app.view_functions.get(request.endpoint)
+        if view is None or getattr(view, 'rate_limit_exempt', False):
+            return None
+
+        capacity, refill_rate, per = self.rates[name]
+        key = f'{name}:{self.client_key(per)}'
+
+        try:
+            allowed, retry_after = self.backend.consume(key, capacity, refill_rate, time.time())
+        except Exception:
+            # A broken shared store should not take the API down with it
+            current_app.logger.exception('Rate limit backend unavailable')
+            return None
+
+        if allowed:
+            return None
+
+        response = jsonify({
+            'success': False,
+            'message': 'Too many requests. Please try again later.'
+        })
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def client_key(self, per):
+        """Identify the caller for the bucket key"""
+        if per == 'user':
+            try:
+                verify_jwt_in_request(optional=True)
+                identity = get_jwt_identity()
+            except Exception:
+                identity = None
+
+            if identity is not None:
+                return f'user:{identity}'
+
+        # The real client address when PROXY_FIX_HOPS trusts the proxies in front
+        return f'ip:{request.remote_addr}'
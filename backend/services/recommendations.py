@@ -0,0 +1,209 @@
+import heapq
+import math
+import time
+import click
+from collections import defaultdict
+from datetime import date
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from app import db
+from models import Event, ClubMember, Registration, EventRecommendation
+
+# Keep IN lists under SQLite's bound parameter limit
+ID_CHUNK_SIZE = 500
+
+# Rankings kept for reuse by students with the same clubs
+CLUB_SET_CACHE_SIZE = 100000
+
+def chunked(ids, size=ID_CHUNK_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def club_affinity():
+    """Cosine similarity of clubs by shared members: {club: {other club: similarity}}
+
+    The club x club co-membership counts are aggregated by the database in
+    one self-join, so only one row per pair of clubs that share members
+    comes back, not one per student.
+    """
+    sizes = dict(db.session.query(ClubMember.club_id, func.count()).group_by(ClubMember.club_id))
+    other = aliased(ClubMember)
+    pairs = db.session.query(ClubMember.club_id, other.club_id, func.count()).join(
+        other, (other.student_id == ClubMember.student_id) & (other.club_id != ClubMember.club_id)
+    ).group_by(ClubMember.club_id, other.club_id)
+
+    affinity = defaultdict(dict)
+    for club_id, other_id, shared in pairs:
+        affinity[club_id][other_id] = shared / math.sqrt(sizes[club_id] * sizes[other_id])
+    for club_id in sizes:
+        affinity[club_id][club_id] = 1.0  # A member's own clubs count fully
+    return affinity, sizes
+
+def club_event_scores(affinity, sizes, today, limit):
+    """Best upcoming events for a member of each club: {club: [(score, event id)]}
+
+    An event scores for a club by how similar its host club is, plus the
+    share of the club's members already registered for it.
+    """
+    events_by_club = defaultdict(list)
+    for event_id, club_id in db.session.query(Event.id, Event.club_id).filter(
+        Event.date >= today,
+        Event.club_id.isnot(None)
+    ):
+        events_by_club[club_id].append(event_id)
+
+    # Registrations per (club, upcoming event), counted in the database
+    turnout = defaultdict(dict)
+    for club_id, event_id, count in db.session.query(
+        ClubMember.club_id, Registration.event_id, func.count()
+    ).join(
+        Registration, Registration.student_id == ClubMember.student_id
+    ).join(
+        Event, Event.id == Registration.event_id
+    ).filter(
+        Event.date >= today,
+        Registration.status != 'declined'
+    ).group_by(ClubMember.club_id, Registration.event_id):
+        turnout[club_id][event_id] = count / sizes[club_id]
+
+    scores = {}
+    for club_id, neighbours in affinity.items():
+        candidates = defaultdict(float)
+        for other_id, similarity in neighbours.items():
+            for event_id in events_by_club.get(other_id, ()):
+                candidates[event_id] += similarity
+        for event_id, share in turnout.get(club_id, {}).items():
+            candidates[event_id] += share
+        scores[club_id] = heapq.nlargest(limit, ((score, event_id) for event_id, score in candidates.items()))
+    return scores
+
+def recommend(club_ids, scores, limit):
+    """Best (score, event id) pairs for a member of all the given clubs"""
+    totals = defaultdict(float)
+    for club_id in club_ids:
+        for score, event_id in scores.get(club_id, ()):
+            totals[event_id] += score
+    return heapq.nlargest(limit, ((score, event_id) for event_id, score in totals.items()))
+
+def next_students(after_id, batch_size):
+    """Memberships of the next batch of students: {student id: [club ids]}"""
+    student_ids = [student_id for student_id, in db.session.query(ClubMember.student_id).filter(
+        ClubMember.student_id > after_id
+    ).distinct().order_by(ClubMember.student_id).limit(batch_size)]
+
+    clubs = defaultdict(list)
+    for chunk in chunked(student_ids):
+        for student_id, club_id in db.session.query(ClubMember.student_id, ClubMember.club_id).filter(
+            ClubMember.student_id.in_(chunk)
+        ):
+            clubs[student_id].append(club_id)
+    return student_ids, clubs
+
+def build_recommendations(top_k=None, batch_size=None):
+    """Rebuild every club member's top-K recommended events; returns a summary dict
+
+    Students are handled in batches. Each batch's old rows are replaced in
+    one transaction, so readers always see a complete list. Students with
+    the same set of clubs share one computed ranking, and only their own
+    registrations are filtered out of it.
+    """
+    config = current_app.config
+    top_k = top_k or config['RECOMMEND_TOP_K']
+    batch_size = batch_size or config['RECOMMEND_BATCH_SIZE']
+    today = date.today()
+    started = time.perf_counter()
+
+    affinity, sizes = club_affinity()
+    # Extra candidates per club leave room for the events a student already registered for
+    scores = club_event_scores(affinity, sizes, today, top_k * 3)
+    upcoming = {event_id for ranked in scores.values() for _, event_id in ranked}
+    by_club_set = {}
+    computed = 0
+    students = 0
+    rows_written = 0
+    after_id = 0
+
+    while True:
+        student_ids, clubs = next_students(after_id, batch_size)
+        if not student_ids:
+            break
+
+        registered = defaultdict(set)
+        for chunk in chunked(student_ids):
+            for student_id, event_id in db.session.query(Registration.student_id, Registration.event_id).filter(
+                Registration.student_id.in_(chunk)
+            ):
+                if event_id in upcoming:
+                    registered[student_id].add(event_id)
+
+        rows = []
+        for student_id in student_ids:
+            club_set = frozenset(clubs[student_id])
+            if club_set not in by_club_set:
+                if len(by_club_set) >= CLUB_SET_CACHE_SIZE:
+                    by_club_set.clear()
+                by_club_set[club_set] = recommend(club_set, scores, top_k * 3)
+                computed += 1
+            ranked = [
+                (score, event_id) for score, event_id in by_club_set[club_set]
+                if event_id not in registered[student_id]
+            ][:top_k]
+            rows.extend({
+                'student_id': student_id,
+                'rank': rank,
+                'event_id': event_id,
+                'score': score
+            } for rank, (score, event_id) in enumerate(ranked, start=1))
+
+        for chunk in chunked(student_ids):
+            EventRecommendation.query.filter(EventRecommendation.student_id.in_(chunk)).delete(
+                synchronize_session=False
+            )
+        if rows:
+            # A Core executemany; the ORM's per-row bookkeeping was most of the rebuild time
+            db.session.execute(EventRecommendation.__table__.insert(), rows)
+        db.session.commit()
+
+        students += len(student_ids)
+        rows_written += len(rows)
+        after_id = student_ids[-1]
+        if len(student_ids) < batch_size:
+            break
+
+    # Students who have left all their clubs
+    EventRecommendation.query.filter(
+        ~EventRecommendation.student_id.in_(db.session.query(ClubMember.student_id))
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+    duration = time.perf_counter() - started
+    current_app.logger.info(
+        'Built recommendations for %d students (%d rows, %d club set rankings) in %.1fs',
+        students, rows_written, computed, duration
+    )
+    return {'students': students, 'rows': rows_written, 'club_sets': computed, 'duration': duration}
+
+def recommended_event_ids(student_id, today):
+    """A student's stored recommendations still upcoming, best first (one primary key range scan)"""
+    return [event_id for event_id, in db.session.query(EventRecommendation.event_id).join(
+        Event, Event.id == EventRecommendation.event_id
+    ).filter(
+        EventRecommendation.student_id == student_id,
+        Event.date >= today
+    ).order_by(EventRecommendation.rank)]
+
+@click.command('build-recommendations')
+@click.option('--top-k', type=int, default=None,
+              help='Events stored per student (default: RECOMMEND_TOP_K)')
+@click.option('--batch-size', type=int, default=None,
+              help='Students written per transaction (default: RECOMMEND_BATCH_SIZE)')
+@with_appcontext
+def build_recommendations_command(top_k, batch_size):
+    """Rebuild per-student event recommendations from club membership"""
+    result = build_recommendations(top_k, batch_size)
+    click.echo(
+        f"Recommended events for {result['students']} students ({result['rows']} rows, "
+        f"{result['club_sets']} club set rankings) in {result['duration']:.1f}s"
+    )
@@ -0,0 +1,237 @@
+import time
+import click
+from datetime import datetime, timedelta
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, select
+from app import db
+from models import Ticket, Purchase, Commission, LedgerCheckpoint, LedgerMismatch, PurchaseArchive
+from services.commissions import fix_commission_amounts, record_commission, split_mismatch
+from services.audit import record_audit
+
+CHECKPOINT_NAME = 'purchases'
+
+# Keep IN lists under SQLite's bound parameter limit
+ID_CHUNK_SIZE = 500
+
+def chunked(ids, size=ID_CHUNK_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def get_checkpoint():
+    checkpoint = LedgerCheckpoint.query.filter_by(name=CHECKPOINT_NAME).first()
+    if checkpoint is None:
+        checkpoint = LedgerCheckpoint(name=CHECKPOINT_NAME, last_id=0)
+        db.session.add(checkpoint)
+        db.session.flush()
+    return checkpoint
+
+def next_range(last_id, chunk_size, cutoff):
+    """Purchase id range (last_id, end] to check next, or None when caught up
+
+    The range stops short of the first purchase that hasn't settled (created
+    after cutoff, or still pending), and ends at the last purchase that
+    exists, so ids not handed out yet are never skipped by the checkpoint.
+    """
+    first_id = db.session.query(func.min(Purchase.id)).filter(Purchase.id > last_id).scalar()
+    if first_id is None:
+        return None
+
+    end_id = first_id + chunk_size - 1
+    unsettled_id = db.session.query(func.min(Purchase.id)).filter(
+        Purchase.id.between(first_id, end_id),
+        (Purchase.created_at >= cutoff) | (Purchase.status == 'pending')
+    ).scalar()
+    if unsettled_id is not None:
+        end_id = unsettled_id - 1
+
+    return db.session.query(func.max(Purchase.id)).filter(Purchase.id.between(first_id, end_id)).scalar()
+
+def completed_quantity():
+    """SQL expression for a ticket's completed quantity, live and archived purchases together
+
+    Archiving moves completed purchases out of the live table but leaves
+    sold_count alone, so both tables count towards it.
+    """
+    live = select(func.coalesce(func.sum(Purchase.quantity), 0)).where(
+        Purchase.ticket_id == Ticket.id,
+        Purchase.status == 'completed'
+    ).scalar_subquery()
+    archived = select(func.coalesce(func.sum(PurchaseArchive.quantity), 0)).where(
+        PurchaseArchive.ticket_id == Ticket.id,
+        PurchaseArchive.status == 'completed'
+    ).scalar_subquery()
+    return live + archived
+
+def sold_count_mismatches(ticket_ids):
+    """(ticket id, sold_count, completed quantity) for tickets that disagree"""
+    completed = completed_quantity()
+
+    rows = []
+    for chunk in chunked(ticket_ids):
+        rows.extend(db.session.query(Ticket.id, Ticket.sold_count, completed.label('completed')).filter(
+            Ticket.id.in_(chunk),
+            Ticket.sold_count != completed
+        ).all())
+    return rows
+
+def record_mismatches(kind, found):
+    """Add an open mismatch for each (object id, expected, actual) not already open"""
+    if not found:
+        return
+
+    already_open = set()
+    for chunk in chunked([object_id for object_id, _, _ in found]):
+        already_open.update(object_id for object_id, in db.session.query(LedgerMismatch.object_id).filter(
+            LedgerMismatch.kind == kind,
+            LedgerMismatch.object_id.in_(chunk),
+            LedgerMismatch.status == 'open'
+        ))
+
+    db.session.bulk_insert_mappings(LedgerMismatch, [{
+        'kind': kind,
+        'object_id': object_id,
+        'expected': str(expected),
+        'actual': str(actual),
+        'status': 'open',
+        'detected_at': datetime.utcnow()
+    } for object_id, expected, actual in found if object_id not in already_open])
+
+def mark_repaired(kind, object_ids):
+    for chunk in chunked(list(object_ids)):
+        LedgerMismatch.query.filter(
+            LedgerMismatch.kind == kind,
+            LedgerMismatch.object_id.in_(chunk),
+            LedgerMismatch.status == 'open'
+        ).update({'status': 'repaired', 'resolved_at': datetime.utcnow()}, synchronize_session=False)
+
+def reconcile_range(start_id, end_id, repair):
+    """Check purchases with ids in [start_id, end_id] and the tickets they touch"""
+    in_range = Purchase.id.between(start_id, end_id)
+    counts = {'split': 0, 'missing': 0, 'sold_count': 0, 'repaired': 0}
+
+    # organizer_amount + platform_fee_amount must add up to the purchase total
+    split = db.session.query(
+        Purchase.id, Purchase.total_amount, Commission.id.label('commission_id'),
+        (Commission.platform_fee_amount + Commission.organizer_amount).label('split_total'),
+        Commission.payout_status
+    ).join(Commission, Commission.purchase_id == Purchase.id).filter(
+        in_range,
+        split_mismatch()
+    ).all()
+    record_mismatches('commission_split', [(row.id, row.total_amount, row.split_total) for row in split])
+    counts['split'] = len(split)
+
+    # Every paid-for completed purchase needs a commission (complimentary ones are free)
+    missing = Purchase.query.outerjoin(Commission, Commission.purchase_id == Purchase.id).filter(
+        in_range,
+        Purchase.status == 'completed',
+        Purchase.total_amount > 0,
+        Commission.id.is_(None)
+    ).all()
+    record_mismatches('missing_commission', [(purchase.id, purchase.total_amount, None) for purchase in missing])
+    counts['missing'] = len(missing)
+
+    # sold_count must equal the quantity of completed purchases, archived ones included
+    ticket_ids = [ticket_id for ticket_id, in db.session.query(Purchase.ticket_id).filter(in_range).distinct()]
+    sold = sold_count_mismatches(ticket_ids)
+    record_mismatches('sold_count', [(row.id, row.completed, row.sold_count) for row in sold])
+    counts['sold_count'] = len(sold)
+
+    if repair:
+        # Paid-out commissions need a manual adjustment, so they stay open
+        unpaid = [row for row in split if row.payout_status != 'paid']
+        for chunk in chunked([row.commission_id for row in unpaid]):
+            fix_commission_amounts(chunk)
+        mark_repaired('commission_split', [row.id for row in unpaid])
+
+        for purchase in missing:
+            record_commission(purchase, purchase.ticket.event.creator)
+        mark_repaired('missing_commission', [purchase.id for purchase in missing])
+
+        completed = completed_quantity()
+        for chunk in chunked([row.id for row in sold]):
+            Ticket.query.filter(Ticket.id.in_(chunk)).update(
+                {Ticket.sold_count: completed}, synchronize_session=False
+            )
+        mark_repaired('sold_count', [row.id for row in sold])
+
+        counts['repaired'] = len(unpaid) + len(missing) + len(sold)
+        if counts['repaired']:
+            # Commits with the repairs and the checkpoint
+            record_audit('ledger.repair', 'ledger', end_id, 'Ledger reconciliation', {
+                'purchase_ids': [start_id, end_id],
+                'commission_splits': {row.commission_id: [str(row.total_amount), str(row.split_total)] for row in unpaid},
+                'missing_commissions': [purchase.id for purchase in missing],
+                'sold_counts': {row.id: [row.sold_count, row.completed] for row in sold}
+            }, financial=True)
+
+    return counts
+
+def run_reconciliation(chunk_size=None, max_chunks=None, repair=False):
+    """Reconcile purchases past the checkpoint, one committed chunk at a time
+
+    Each chunk's findings, repairs and the advanced checkpoint commit
+    together, so an interrupted run resumes exactly where it stopped.
+    """
+    config = current_app.config
+    chunk_size = chunk_size or config['RECONCILE_CHUNK_SIZE']
+    cutoff = datetime.utcnow() - timedelta(minutes=config['RECONCILE_SETTLE_MINUTES'])
+    started = time.perf_counter()
+    totals = {'chunks': 0, 'split': 0, 'missing': 0, 'sold_count': 0, 'repaired': 0}
+
+    while max_chunks is None or totals['chunks'] < max_chunks:
+        checkpoint = get_checkpoint()
+        end_id = next_range(checkpoint.last_id, chunk_size, cutoff)
+        if end_id is None:
+            db.session.rollback()
+            break
+
+        counts = reconcile_range(checkpoint.last_id + 1, end_id, repair)
+        checkpoint.last_id = end_id
+        db.session.commit()
+
+        totals['chunks'] += 1
+        for key, value in counts.items():
+            totals[key] += value
+
+    totals['checkpoint'] = get_checkpoint().last_id
+    db.session.commit()
+    totals['duration'] = time.perf_counter() - started
+
+    current_app.logger.info(
+        'Ledger reconciliation: %d chunks to purchase %d, %d split, %d missing, '
+        '%d sold_count mismatches, %d repaired in %.3fs',
+        totals['chunks'], totals['checkpoint'], totals['split'], totals['missing'],
+        totals['sold_count'], totals['repaired'], totals['duration']
+    )
+    return totals
+
+@click.command('reconcile-ledger')
+@click.option('--chunk-size', type=int, default=None,
+              help='Purchases checked per chunk (default: RECONCILE_CHUNK_SIZE)')
+@click.option('--max-chunks', type=int, default=None,
+              help='Stop after N chunks (default: run until caught up)')
+@click.option('--repair', is_flag=True, help='Fix mismatches instead of only reporting them')
+@click.option('--reset', is_flag=True, help='Start again from the first purchase')
+@click.option('--interval', type=int, default=0,
+              help='Repeat every N seconds (default: run once)')
+@with_appcontext
+def reconcile_ledger_command(chunk_size, max_chunks, repair, reset, interval):
+    """Check commissions and sold counts against purchases since the last checkpoint"""
+    if reset:
+        get_checkpoint().last_id = 0
+        db.session.commit()
+
+    while True:
+        result = run_reconciliation(chunk_size, max_chunks, repair)
+        click.echo(
+            f"Checked {result['chunks']} chunks up to purchase {result['checkpoint']}: "
+            f"{result['split']} split, {result['missing']} missing commission and "
+            f"{result['sold_count']} sold_count mismatches, {result['repaired']} repaired "
+            f"in {result['duration']:.3f}s"
+        )
+
+        if not interval:
+            break
+        time.sleep(interval)
@@ -0,0 +1,336 @@
+import time
+import click
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func
+from app import db
+from models import Ticket, Purchase, Commission, IssuedTicket, RefundJob, Refund
+from money import to_cents, to_shillings
+from services.mpesa import mpesa, RequestPacer
+from services.audit import record_audit
+
+# Purchases a cancelled event refunds (refund_requested ones are still counted as sold)
+REFUNDABLE_STATUSES = ('completed', 'refund_requested')
+
+def refundable_purchases(event_id):
+    return Purchase.query.join(Ticket, Ticket.id == Purchase.ticket_id).filter(
+        Ticket.event_id == event_id,
+        Purchase.status.in_(REFUNDABLE_STATUSES)
+    )
+
+def pending_purchases(event_id):
+    return Purchase.query.join(Ticket, Ticket.id == Purchase.ticket_id).filter(
+        Ticket.event_id == event_id,
+        Purchase.status == 'pending'
+    )
+
+def start_refund_job(event, requested_by, reason=None):
+    """Create a refund job for an event; returns (job, created) and reuses an unfinished one
+
+    Ticket sales for the event close in the same transaction, so no new
+    purchase can start once the job exists.
+    """
+    job = RefundJob.query.filter(
+        RefundJob.event_id == event.id,
+        RefundJob.status != 'completed'
+    ).first()
+    if job is not None:
+        return job, False
+
+    now = datetime.utcnow()
+    Ticket.query.filter(
+        Ticket.event_id == event.id,
+        (Ticket.sale_end_date.is_(None)) | (Ticket.sale_end_date > now)
+    ).update({'sale_end_date': now}, synchronize_session=False)
+
+    job = RefundJob(
+        event_id=event.id,
+        requested_by=requested_by,
+        reason=reason,
+        total_purchases=refundable_purchases(event.id).count()
+    )
+    db.session.add(job)
+    record_audit('event.refund', 'event', event.id, reason, {
+        'total_purchases': job.total_purchases
+    }, financial=True, actor_id=requested_by)
+    db.session.commit()
+    return job, True
+
+def refund_counts(job_id):
+    """{status: count} for a job's refunds"""
+    return dict(db.session.query(Refund.status, func.count(Refund.id)).filter(
+        Refund.job_id == job_id
+    ).group_by(Refund.status).all())
+
+def reverse_batch(job, batch_size):
+    """Reverse the next batch of an event's purchases; returns how many were reversed
+
+    Purchases, commissions, sold counts, ticket codes, the queued refunds and
+    the job's checkpoint all change in one transaction, so a crash either
+    keeps or loses the whole batch and the job resumes after the last one.
+    """
+    rows = db.session.query(
+        Purchase.id, Purchase.ticket_id, Purchase.quantity, Purchase.total_amount, Purchase.payment_phone
+    ).join(Ticket, Ticket.id == Purchase.ticket_id).filter(
+        Ticket.event_id == job.event_id,
+        Purchase.status.in_(REFUNDABLE_STATUSES),
+        Purchase.id > job.last_purchase_id
+    ).order_by(Purchase.id).limit(batch_size).with_for_update(of=Purchase).all()
+
+    if not rows:
+        return 0
+
+    purchase_ids = [row.id for row in rows]
+
+    Purchase.query.filter(Purchase.id.in_(purchase_ids)).update(
+        {'status': 'refunded'}, synchronize_session=False
+    )
+
+    # Unpaid commissions are cancelled; paid ones are flagged to recover from the organizer
+    Commission.query.filter(
+        Commission.purchase_id.in_(purchase_ids),
+        Commission.payout_status == 'pending'
+    ).update({'payout_status': 'reversed'}, synchronize_session=False)
+    Commission.query.filter(
+        Commission.purchase_id.in_(purchase_ids),
+        Commission.payout_status == 'paid'
+    ).update({'payout_status': 'clawback'}, synchronize_session=False)
+
+    quantities = defaultdict(int)
+    for row in rows:
+        quantities[row.ticket_id] += row.quantity
+    # Ticket id order keeps this from deadlocking with the callback worker
+    for ticket_id in sorted(quantities):
+        Ticket.query.filter_by(id=ticket_id).update(
+            {Ticket.sold_count: Ticket.sold_count - quantities[ticket_id]},
+            synchronize_session=False
+        )
+
+    IssuedTicket.query.filter(IssuedTicket.purchase_id.in_(purchase_ids)).update(
+        {'status': 'revoked'}, synchronize_session=False
+    )
+
+    # Complimentary tickets have nothing to pay back
+    db.session.bulk_insert_mappings(Refund, [{
+        'job_id': job.id,
+        'purchase_id': row.id,
+        'amount': row.total_amount,
+        'phone_number': row.payment_phone,
+        'status': 'queued' if row.payment_phone else 'failed',
+        'last_error': None if row.payment_phone else 'No payment phone number on the purchase'
+    } for row in rows if to_cents(row.total_amount) > 0])
+
+    job.last_purchase_id = purchase_ids[-1]
+    job.reversed_count = (job.reversed_count or 0) + len(purchase_ids)
+    db.session.commit()
+    return len(purchase_ids)
+
+def send_refunds(work, concurrency, pacer):
+    """Make B2C calls for [(refund id, phone, amount, purchase id)]; {refund id: response}"""
+    app = current_app._get_current_object()
+    mpesa.get_session()  # Create the shared session before the threads race to
+    concurrency = max(1, min(concurrency, app.config['MPESA_POOL_SIZE']))
+
+    def send(item):
+        refund_id, phone_number, amount, purchase_id = item
+        pacer.wait()
+        with app.app_context():
+            return refund_id, mpesa.b2c_payment(
+                phone_number,
+                to_shillings(amount),
+                remarks=f'Refund for purchase {purchase_id}',
+                occasion=f'REFUND-{refund_id}'
+            )
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return dict(executor.map(send, work))
+
+def pay_batch(job, batch_size, concurrency, pacer):
+    """Send the next batch of a job's queued refunds; returns how many were attempted"""
+    refunds = Refund.query.filter_by(job_id=job.id, status='queued').order_by(
+        Refund.id
+    ).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    if not refunds:
+        db.session.rollback()
+        return 0
+
+    now = datetime.utcnow()
+    for refund in refunds:
+        refund.status = 'sending'
+        refund.attempts = (refund.attempts or 0) + 1
+        refund.attempted_at = now
+    work = [(refund.id, refund.phone_number, refund.amount, refund.purchase_id) for refund in refunds]
+    # 'sending' is durable before any money moves, so a crash never re-sends blindly
+    db.session.commit()
+
+    responses = send_refunds(work, concurrency, pacer)
+    max_attempts = current_app.config['REFUND_MAX_ATTEMPTS']
+    now = datetime.utcnow()
+
+    for refund in Refund.query.filter(Refund.id.in_(list(responses))):
+        response = responses[refund.id]
+
+        if response is None:
+            # No answer: the payment may still have gone out, so it stays 'sending'
+            # until a person checks the statement and resolves it
+            refund.last_error = 'No response from M-Pesa; check the statement and resolve the refund'
+        elif response.get('ResponseCode') == '0':
+            refund.status = 'sent'
+            refund.conversation_id = response.get('ConversationID')
+            refund.sent_at = now
+        else:
+            refund.last_error = response.get('errorMessage') or response.get('ResponseDescription')
+            refund.status = 'failed' if refund.attempts >= max_attempts else 'queued'
+
+    db.session.commit()
+    return len(work)
+
+def apply_b2c_result(payload, timed_out=False):
+    """Settle a sent refund from a B2C result (or queue timeout) callback"""
+    result = payload.get('Result') or {}
+    conversation_id = result.get('ConversationID')
+    if not conversation_id:
+        return False
+
+    refund = Refund.query.filter_by(conversation_id=conversation_id, status='sent').first()
+    if refund is None:
+        return False  # Unknown or already settled
+
+    if not timed_out and str(result.get('ResultCode')) == '0':
+        refund.status = 'completed'
+        refund.mpesa_code = result.get('TransactionID')
+        refund.completed_at = datetime.utcnow()
+    else:
+        refund.status = 'failed'
+        refund.last_error = result.get('ResultDesc') or 'Timed out in the M-Pesa queue'
+
+    db.session.commit()
+    return True
+
+# How a person can settle an unconfirmed refund after checking the M-Pesa statement
+RESOLUTIONS = ('completed', 'failed', 'queued')
+
+def unconfirmed_refunds(job_id=None):
+    """Refunds stuck 'sending' (the B2C call got no answer, or the worker died during it) or
+    'sent' without a result callback for longer than REFUND_UNCONFIRMED_MINUTES
+
+    There is no conversation id to ask M-Pesa about for a call that got no
+    answer, so these wait for resolve_refund.
+    """
+    before = datetime.utcnow() - timedelta(minutes=current_app.config['REFUND_UNCONFIRMED_MINUTES'])
+    query = Refund.query.filter(
+        ((Refund.status == 'sending') & (Refund.attempted_at < before))
+        | ((Refund.status == 'sent') & (Refund.sent_at < before))
+    )
+    if job_id is not None:
+        query = query.filter(Refund.job_id == job_id)
+    return query
+
+def resolve_refund(refund_id, outcome, mpesa_code=None, reason=None, actor_id=None):
+    """Settle an unconfirmed refund by hand; returns the refund, or None if it is no longer unconfirmed
+
+    'completed' records the payment found on the statement (its M-Pesa code
+    is required), 'failed' closes a refund that will not be paid, and
+    'queued' sends it again because the statement shows it never went out.
+    """
+    if outcome not in RESOLUTIONS:
+        raise ValueError(f'outcome must be one of {", ".join(RESOLUTIONS)}')
+    if outcome == 'completed' and not mpesa_code:
+        raise ValueError('mpesa_code is required to mark a refund completed')
+
+    now = datetime.utcnow()
+    changes = {'status': outcome, 'last_error': reason or f'Resolved as {outcome} by hand'}
+    if outcome == 'completed':
+        changes.update(mpesa_code=mpesa_code, completed_at=now)
+    elif outcome == 'queued':
+        changes.update(conversation_id=None, sent_at=None)
+
+    # Conditional, so a result callback arriving meanwhile wins and nothing is settled twice
+    resolved = unconfirmed_refunds().filter(Refund.id == refund_id).update(changes, synchronize_session=False)
+    if not resolved:
+        db.session.rollback()
+        return None
+
+    record_audit('refund.resolve', 'refund', refund_id, reason, {
+        'outcome': outcome,
+        'mpesa_code': mpesa_code
+    }, financial=True, actor_id=actor_id)
+    db.session.commit()
+    # The job can't have completed with this refund in flight, so its next run picks up a re-queued one
+    return db.session.get(Refund, refund_id, populate_existing=True)
+
+def run_refund_job(job, batch_size=None, concurrency=None, progress=None):
+    """Reverse all of a job's purchases, then send its refunds; safe to re-run after a crash
+
+    Purchases that were still pending when the reversal passed them can
+    complete afterwards, so once the refunds are sent the event is checked
+    again and any new ones go through another reversal pass from the start.
+    The job only completes when none are left and none are still pending.
+    """
+    config = current_app.config
+    batch_size = batch_size or config['REFUND_BATCH_SIZE']
+    concurrency = concurrency or config['REFUND_CONCURRENCY']
+    pacer = RequestPacer(config['REFUND_RATE'])
+    progress = progress or (lambda job: None)
+
+    while True:
+        if job.status == 'reversing':
+            while reverse_batch(job, batch_size):
+                progress(job)
+            job.status = 'paying'
+            db.session.commit()
+
+        while pay_batch(job, batch_size, concurrency, pacer):
+            progress(job)
+
+        late = refundable_purchases(job.event_id).count()
+        if not late:
+            break
+        job.status = 'reversing'
+        job.last_purchase_id = 0
+        job.total_purchases = (job.reversed_count or 0) + late
+        db.session.commit()
+
+    counts = refund_counts(job.id)
+    unconfirmed = unconfirmed_refunds(job.id).count()
+    if unconfirmed:
+        current_app.logger.warning(
+            'Refund job %d has %d unconfirmed refunds; check the M-Pesa statement and resolve them',
+            job.id, unconfirmed
+        )
+    in_flight = any(counts.get(status) for status in ('queued', 'sending', 'sent'))
+    if not in_flight and not pending_purchases(job.event_id).count():
+        job.status = 'completed'
+        job.completed_at = datetime.utcnow()
+    db.session.commit()
+    progress(job)
+    return counts
+
+@click.command('process-refunds')
+@click.option('--interval', type=int, default=0,
+              help='Keep checking for refund jobs every N seconds (default: run once)')
+@click.option('--batch-size', type=int, default=None,
+              help='Purchases reversed / refunds sent per batch (default: REFUND_BATCH_SIZE)')
+@click.option('--concurrency', type=int, default=None,
+              help='Concurrent B2C calls (default: REFUND_CONCURRENCY)')
+@with_appcontext
+def process_refunds_command(interval, batch_size, concurrency):
+    """Run event refund jobs (reversals and B2C refunds)"""
+    def progress(job):
+        counts = refund_counts(job.id)
+        click.echo(
+            f'Refund job {job.id} (event {job.event_id}): {job.status}, '
+            f'{job.reversed_count}/{job.total_purchases} reversed, refunds {counts}'
+        )
+
+    while True:
+        for job in RefundJob.query.filter(RefundJob.status != 'completed').order_by(RefundJob.id).all():
+            run_refund_job(job, batch_size, concurrency, progress)
+
+        if not interval:
+            break
+        time.sleep(interval)
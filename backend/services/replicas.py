@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+from functools import wraps
+from flask import g, current_app, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+# Seconds of replay lag on a Postgres replica (0 when it has replayed everything received)
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+class RecentWriters:
+    """Remembers which users committed recently so their reads stay on the primary"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.writes = {}
+        self.client = None
+
+    def configure(self, url):
+        if url.startswith(('redis://', 'rediss://', 'unix://')):
+            import redis  # Optional dependency, only needed to share state across workers
+
+            self.client = redis.Redis.from_url(url)
+
+    def mark(self, user_id, window):
+        if self.client is not None:
+            self.client.set(f'recent-write:{user_id}', 1, ex=max(1, int(window)))
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            if len(self.writes) > 10000:
+                self.writes = {key: at for key, at in self.writes.items() if now - at < window}
+            self.writes[user_id] = now
+
+    def wrote_recently(self, user_id, window):
+        if self.client is not None:
+            return bool(self.client.exists(f'recent-write:{user_id}'))
+
+        with self.lock:
+            at = self.writes.get(user_id)
+        return at is not None and time.monotonic() - at < window
+
+recent_writers = RecentWriters()
+
+class ReplicaLagMonitor:
+    """Caches each replica's lag so the check costs one query per interval"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked = {}
+
+    def lag(self, bind_key, engine, interval):
+        now = time.monotonic()
+        with self.lock:
+            cached = self.checked.get(bind_key)
+        if cached and now - cached[0] < interval:
+            return cached[1]
+
+        try:
+            if engine.dialect.name == 'postgresql':
+                with engine.connect() as connection:
+                    lag = float(connection.execute(REPLICA_LAG_SQL).scalar() or 0)
+            else:
+                lag = 0.0  # Stand-in replicas (e.g. SQLite) have no replication to lag behind
+        except Exception:
+            current_app.logger.exception('Replica %s is unavailable', bind_key)
+            lag = float('inf')
+
+        with self.lock:
+            self.checked[bind_key] = (now, lag)
+        return lag
+
+lag_monitor = ReplicaLagMonitor()
+
+def current_identity():
+    """JWT identity for the request, or None outside an authenticated request"""
+    try:
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+def pick_replica(engines, config):
+    """Choose a healthy replica engine, or None to use the primary"""
+    candidates = [
+        (key, engine) for key, engine in engines.items()
+        if key and key.startswith('replica_')
+    ]
+    random.shuffle(candidates)
+
+    for key, engine in candidates:
+        if lag_monitor.lag(key, engine, config['REPLICA_LAG_CHECK_INTERVAL']) <= config['REPLICA_MAX_LAG_SECONDS']:
+            return engine
+
+    return None
+
+class RoutingSession(Session):
+    """Session that sends reads in @read_replica views to a replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and g.get('db_replica') is not None:
+            return g.db_replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def note_flush(session, flush_context):
+    session.info['has_writes'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def note_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['has_writes'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def remember_writer(session):
+    if not session.info.pop('has_writes', False) or not has_request_context():
+        return
+
+    user_id = current_identity()
+    if user_id is not None:
+        recent_writers.mark(user_id, current_app.config['REPLICA_READ_YOUR_WRITES_SECONDS'])
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def forget_writes(session):
+    session.info.pop('has_writes', None)
+
+def read_replica(fn):
+    """Serve a read-only view from a replica when one is configured and fresh enough
+
+    Users who committed something within REPLICA_READ_YOUR_WRITES_SECONDS keep
+    reading from the primary so they always see their own changes.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        config = current_app.config
+        user_id = current_identity()
+        replica = None
+
+        if config['SQLALCHEMY_BINDS'] and not (
+            user_id is not None and
+            recent_writers.wrote_recently(user_id, config['REPLICA_READ_YOUR_WRITES_SECONDS'])
+        ):
+            replica = pick_replica(current_app.extensions['sqlalchemy'].engines, config)
+
+        g.db_replica = replica
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            g.db_replica = None
+    return wrapper
@@ -0,0 +1,151 @@
+import time
+import click
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import and_, or_
+from app import db
+from models import Purchase
+from services.callbacks import apply_payment_results
+from services.mpesa import mpesa, RequestPacer
+
+def query_result(response):
+    """Result code from an STK Push Query response, or None while it is unresolved"""
+    if response is None or 'ResultCode' not in response:
+        return None  # errorCode (still processing) or no answer; ask again later
+    try:
+        return int(response['ResultCode'])
+    except (TypeError, ValueError):
+        return None
+
+def query_statuses(checkout_request_ids, concurrency, pacer):
+    """Query Daraja for each checkout concurrently; {checkout_request_id: result code or None}"""
+    app = current_app._get_current_object()
+    mpesa.get_session()  # Create the shared session before the threads race to
+    concurrency = max(1, min(concurrency, app.config['MPESA_POOL_SIZE']))
+
+    def query(checkout_request_id):
+        pacer.wait()
+        with app.app_context():
+            return checkout_request_id, query_result(mpesa.stk_query(checkout_request_id))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return dict(executor.map(query, checkout_request_ids))
+
+def stale_pending(after, cursor, batch_size):
+    """Next batch of pending purchases created before `after`, past the (created_at, id) cursor"""
+    query = Purchase.query.filter(
+        Purchase.status == 'pending',
+        Purchase.created_at < after
+    )
+    if cursor is not None:
+        query = query.filter(or_(
+            Purchase.created_at > cursor[0],
+            and_(Purchase.created_at == cursor[0], Purchase.id > cursor[1])
+        ))
+
+    # Served by the (status, created_at) index
+    return query.order_by(Purchase.created_at, Purchase.id).limit(batch_size).all()
+
+def reconcile_pending_payments(batch_size=None, concurrency=None):
+    """Resolve pending purchases whose callback never came, using the STK Push Query API
+
+    Purchases are read in bounded batches and queried concurrently at no more
+    than STK_QUERY_RATE per second over the client's pooled session. Answers
+    go through the same path as callbacks, so a callback arriving meanwhile is
+    never applied twice. Purchases still unresolved after
+    STK_QUERY_MAX_AGE_HOURS are failed. So are those without a checkout id by
+    then: their STK push got no answer, so it may have reached the phone, and
+    until then a successful callback can still match them by phone number.
+    """
+    config = current_app.config
+    batch_size = batch_size or config['STK_QUERY_BATCH_SIZE']
+    concurrency = concurrency or config['STK_QUERY_CONCURRENCY']
+    pacer = RequestPacer(config['STK_QUERY_RATE'])
+
+    now = datetime.utcnow()
+    after = now - timedelta(minutes=config['STK_QUERY_AFTER_MINUTES'])
+    give_up_before = now - timedelta(hours=config['STK_QUERY_MAX_AGE_HOURS'])
+    started = time.perf_counter()
+    counts = {'checked': 0, 'completed': 0, 'failed': 0, 'expired': 0, 'unresolved': 0}
+    cursor = None
+
+    while True:
+        purchases = stale_pending(after, cursor, batch_size)
+        if not purchases:
+            break
+
+        cursor = (purchases[-1].created_at, purchases[-1].id)
+        pending = {
+            purchase.checkout_request_id: (purchase.id, purchase.created_at)
+            for purchase in purchases if purchase.checkout_request_id
+        }
+        # Without a checkout id there is nothing to query; wait for a callback until giving up
+        unsent = [purchase for purchase in purchases if not purchase.checkout_request_id]
+        expired_ids = [purchase.id for purchase in unsent if purchase.created_at < give_up_before]
+        counts['unresolved'] += len(unsent) - len(expired_ids)
+        db.session.commit()  # Don't hold a transaction open while waiting on Safaricom
+
+        codes = query_statuses(list(pending), concurrency, pacer)
+        applied = apply_payment_results([{
+            'checkout_request_id': checkout_request_id,
+            'result_code': code,
+            'mpesa_code': None,  # The query API does not return the receipt number
+            'phone_number': None
+        } for checkout_request_id, code in codes.items() if code is not None])
+
+        for checkout_request_id, (purchase_id, created_at) in pending.items():
+            code = codes.get(checkout_request_id)
+            if code is None:
+                if created_at < give_up_before:
+                    expired_ids.append(purchase_id)
+                else:
+                    counts['unresolved'] += 1
+            elif applied.get(checkout_request_id):
+                counts['completed' if code == 0 else 'failed'] += 1
+
+        if expired_ids:
+            counts['expired'] += Purchase.query.filter(
+                Purchase.id.in_(expired_ids),
+                Purchase.status == 'pending'
+            ).update({'status': 'failed'}, synchronize_session=False)
+        db.session.commit()
+        counts['checked'] += len(purchases)
+
+        if len(purchases) < batch_size:
+            break
+
+    counts['duration'] = time.perf_counter() - started
+    resolved_total = counts['completed'] + counts['failed'] + counts['expired']
+    counts['resolved_per_minute'] = round(resolved_total / counts['duration'] * 60, 1) if counts['duration'] else 0
+
+    current_app.logger.info(
+        'Payment reconciliation: %d checked, %d completed, %d failed, %d expired, '
+        '%d unresolved in %.3fs (%.1f/min)',
+        counts['checked'], counts['completed'], counts['failed'], counts['expired'],
+        counts['unresolved'], counts['duration'], counts['resolved_per_minute']
+    )
+    return counts
+
+@click.command('reconcile-payments')
+@click.option('--interval', type=int, default=0,
+              help='Repeat every N seconds (default: run once)')
+@click.option('--batch-size', type=int, default=None,
+              help='Purchases per batch (default: STK_QUERY_BATCH_SIZE)')
+@click.option('--concurrency', type=int, default=None,
+              help='Concurrent status queries (default: STK_QUERY_CONCURRENCY)')
+@with_appcontext
+def reconcile_payments_command(interval, batch_size, concurrency):
+    """Resolve stale pending purchases with the STK Push Query API"""
+    while True:
+        result = reconcile_pending_payments(batch_size, concurrency)
+        click.echo(
+            f"Checked {result['checked']} pending purchases: {result['completed']} completed, "
+            f"{result['failed']} failed, {result['expired']} expired, {result['unresolved']} unresolved "
+            f"in {result['duration']:.3f}s ({result['resolved_per_minute']}/min)"
+        )
+
+        if not interval:
+            break
+        time.sleep(interval)
@@ -0,0 +1,110 @@
+import time
+import click
+from datetime import datetime
+from flask import current_app
+from flask.cli import with_appcontext
+from app import db
+from models import User, Subscription
+
+def expire_trials(now, batch_size):
+    """Mark trials past their trial_end_date as expired, one bounded batch at a time"""
+    expired = 0
+
+    while True:
+        # Served by the (subscription_status, trial_end_date) index
+        user_ids = [row.id for row in db.session.query(User.id).filter(
+            User.subscription_status == 'trial',
+            User.trial_end_date < now
+        ).limit(batch_size).all()]
+
+        if not user_ids:
+            break
+
+        db.session.query(User).filter(
+            User.id.in_(user_ids),
+            User.subscription_status == 'trial'
+        ).update({'subscription_status': 'expired'}, synchronize_session=False)
+        db.session.commit()
+
+        expired += len(user_ids)
+        if len(user_ids) < batch_size:
+            break
+
+    return expired
+
+def expire_subscriptions(now, batch_size):
+    """Mark subscriptions past their end_date as expired and update their owners"""
+    expired = 0
+
+    while True:
+        # Served by the (status, end_date) index; cancelled plans stay usable until end_date
+        rows = db.session.query(Subscription.id, Subscription.user_id).filter(
+            Subscription.status.in_(['active', 'cancelled']),
+            Subscription.end_date < now
+        ).limit(batch_size).all()
+
+        if not rows:
+            break
+
+        subscription_ids = [row.id for row in rows]
+        user_ids = list({row.user_id for row in rows})
+
+        db.session.query(Subscription).filter(
+            Subscription.id.in_(subscription_ids)
+        ).update({'status': 'expired'}, synchronize_session=False)
+
+        # Leave users alone if they already hold another current subscription
+        current_subscribers = db.session.query(Subscription.user_id).filter(
+            Subscription.user_id.in_(user_ids),
+            Subscription.status == 'active',
+            Subscription.end_date >= now
+        )
+
+        db.session.query(User).filter(
+            User.id.in_(user_ids),
+            User.subscription_status.in_(['active', 'cancelled']),
+            ~User.id.in_(current_subscribers)
+        ).update({'subscription_status': 'expired'}, synchronize_session=False)
+        db.session.commit()
+
+        expired += len(subscription_ids)
+        if len(subscription_ids) < batch_size:
+            break
+
+    return expired
+
+def run_expiry_sweep(batch_size=None):
+    """Expire trials and subscriptions, logging counts and duration"""
+    batch_size = batch_size or current_app.config['EXPIRY_SWEEP_BATCH_SIZE']
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    trials = expire_trials(now, batch_size)
+    subscriptions = expire_subscriptions(now, batch_size)
+
+    duration = time.perf_counter() - started
+    current_app.logger.info(
+        'Expiry sweep: %d trials and %d subscriptions expired in %.3fs',
+        trials, subscriptions, duration
+    )
+
+    return {'trials': trials, 'subscriptions': subscriptions, 'duration': duration}
+
+@click.command('expire-subscriptions')
+@click.option('--interval', type=int, default=0,
+              help='Repeat the sweep every N seconds (default: run once)')
+@click.option('--batch-size', type=int, default=None,
+              help='Rows updated per batch (default: EXPIRY_SWEEP_BATCH_SIZE)')
+@with_appcontext
+def expire_subscriptions_command(interval, batch_size):
+    """Expire lapsed trials and subscriptions"""
+    while True:
+        result = run_expiry_sweep(batch_size)
+        click.echo(
+            f"Expired {result['trials']} trials and {result['subscriptions']} "
+            f"subscriptions in {result['duration']:.3f}s"
+        )
+
+        if not interval:
+            break
+        time.sleep(interval)
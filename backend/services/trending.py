@@ -0,0 +1,132 @@
+import math
+import time
+import click
+from datetime import datetime
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, event as orm_event
+from app import db
+from models import Event, Registration, EventInteraction
+
+# Scores are log2(sum of weight * 2 ** (hours since TRENDING_EPOCH / half-life)).
+# Growing every new interaction instead of shrinking old ones keeps stored
+# scores comparable without ever rewriting them, and the log keeps them finite.
+TRENDING_EPOCH = datetime(2024, 1, 1)
+
+# Keep IN lists under SQLite's bound parameter limit
+ID_CHUNK_SIZE = 500
+
+# Interaction weight per RSVP status
+RSVP_WEIGHTS = {'going': 1.0, 'interested': 0.5}
+
+def chunked(ids, size=ID_CHUNK_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def log2_add(a, b):
+    """log2(2 ** a + 2 ** b) without overflowing"""
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+def decayed_weight(weight, at, half_life_hours):
+    """An interaction's contribution to the score, in log2 form"""
+    return math.log2(weight) + (at - TRENDING_EPOCH).total_seconds() / 3600 / half_life_hours
+
+def record_purchases(purchases):
+    """Queue a completed purchase for each event, weighted by tickets bought (caller's transaction)"""
+    weight = current_app.config['TRENDING_PURCHASE_WEIGHT']
+    now = datetime.utcnow()
+    db.session.bulk_insert_mappings(EventInteraction, [{
+        'event_id': purchase.ticket.event_id,
+        'weight': purchase.quantity * weight,
+        'created_at': now
+    } for purchase in purchases])
+
+@orm_event.listens_for(Registration, 'after_insert')
+def record_rsvp(mapper, connection, target):
+    """Queue an RSVP for the trending worker; it commits with the registration"""
+    weight = RSVP_WEIGHTS.get(target.status or 'going')
+    if weight:
+        connection.execute(EventInteraction.__table__.insert().values(
+            event_id=target.event_id,
+            weight=weight,
+            created_at=datetime.utcnow()
+        ))
+
+def apply_interactions(batch_size=None):
+    """Fold one batch of queued interactions into events.trending_score; returns how many
+
+    Interactions are summed per event first, so an event gets one UPDATE per
+    batch however many RSVPs and sales it had. Event rows are locked in id
+    order so concurrent workers can't deadlock.
+    """
+    config = current_app.config
+    batch_size = batch_size or config['TRENDING_BATCH_SIZE']
+    half_life = config['TRENDING_HALF_LIFE_HOURS']
+
+    interactions = EventInteraction.query.order_by(EventInteraction.id).limit(
+        batch_size
+    ).with_for_update(skip_locked=True).all()
+
+    if not interactions:
+        db.session.rollback()
+        return 0
+
+    increments = {}
+    for interaction in interactions:
+        if interaction.weight > 0:
+            increments[interaction.event_id] = log2_add(
+                increments.get(interaction.event_id),
+                decayed_weight(interaction.weight, interaction.created_at, half_life)
+            )
+
+    updates = []
+    for chunk in chunked(sorted(increments)):
+        for event_id, score in db.session.query(Event.id, Event.trending_score).filter(
+            Event.id.in_(chunk)
+        ).order_by(Event.id).with_for_update():
+            updates.append({'event_id': event_id, 'score': log2_add(score or 0, increments[event_id])})
+
+    if updates:
+        # updated_at is kept as it was: a score change doesn't change the event itself
+        db.session.execute(Event.__table__.update().where(
+            Event.__table__.c.id == bindparam('event_id')
+        ).values(
+            trending_score=bindparam('score'),
+            updated_at=Event.__table__.c.updated_at
+        ), updates)
+    for chunk in chunked([interaction.id for interaction in interactions]):
+        EventInteraction.query.filter(EventInteraction.id.in_(chunk)).delete(synchronize_session=False)
+    db.session.commit()
+    return len(interactions)
+
+def trending_event_ids(limit, today):
+    """Ids of the highest scoring upcoming events, read from the trending_score index"""
+    return [event_id for event_id, in db.session.query(Event.id).filter(
+        Event.date >= today
+    ).order_by(Event.trending_score.desc()).limit(limit)]
+
+@click.command('update-trending')
+@click.option('--interval', type=int, default=0,
+              help='Keep applying new interactions every N seconds (default: drain once)')
+@click.option('--batch-size', type=int, default=None,
+              help='Interactions applied per transaction (default: TRENDING_BATCH_SIZE)')
+@with_appcontext
+def update_trending_command(interval, batch_size):
+    """Apply queued RSVPs and ticket sales to event trending scores"""
+    batch_size = batch_size or current_app.config['TRENDING_BATCH_SIZE']
+
+    while True:
+        started = time.perf_counter()
+        applied = apply_interactions(batch_size)
+
+        if applied:
+            click.echo(f'Applied {applied} interactions in {time.perf_counter() - started:.3f}s')
+
+        if applied >= batch_size:
+            continue  # More may be waiting, keep draining
+        if not interval:
+            break
+        time.sleep(interval)
@@ -0,0 +1,124 @@
+import heapq
+import time
+import click
+from datetime import date
+from flask import jsonify
+from flask.cli import with_appcontext
+from sqlalchemy import event as orm_event, inspect, select
+from app import db
+from models import Event
+
+# Changing any of these can create a clash, so only then is the venue re-checked
+VENUE_FIELDS = ('location', 'date', 'start_time', 'end_time')
+
+class VenueConflict(ValueError):
+    """An event overlaps other events booked in the same location"""
+
+    def __init__(self, location, conflicts):
+        self.location = location
+        self.conflicts = conflicts
+        super().__init__(f'{location} is already booked at that time')
+
+def overlapping(location, day, start_time, end_time, exclude_id=None):
+    """Events in the location on that day whose times overlap [start_time, end_time)
+
+    The (location, date, start_time) index narrows this to one room's
+    bookings that start before end_time, so it never scans the venue's
+    whole history.
+    """
+    query = select(Event.id, Event.title, Event.start_time, Event.end_time).where(
+        Event.location == location,
+        Event.date == day,
+        Event.start_time < end_time,
+        Event.end_time > start_time
+    )
+    if exclude_id is not None:
+        query = query.where(Event.id != exclude_id)
+    return query.order_by(Event.start_time)
+
+def conflict_dict(row):
+    return {
+        'id': row.id,
+        'title': row.title,
+        'start_time': row.start_time.isoformat(timespec='minutes'),
+        'end_time': row.end_time.isoformat(timespec='minutes')
+    }
+
+def find_conflicts(location, day, start_time, end_time, exclude_id=None):
+    """Conflicting events as dicts, for checking a booking before saving it"""
+    return [conflict_dict(row) for row in db.session.execute(
+        overlapping(location, day, start_time, end_time, exclude_id)
+    )]
+
+@orm_event.listens_for(Event, 'before_insert')
+@orm_event.listens_for(Event, 'before_update')
+def check_venue(mapper, connection, target):
+    """Refuse to save an event that double-books its location"""
+    state = inspect(target)
+    if state.persistent and not any(state.attrs[field].history.has_changes() for field in VENUE_FIELDS):
+        return  # Nothing about the booking changed
+
+    rows = connection.execute(overlapping(
+        target.location, target.date, target.start_time, target.end_time, target.id
+    )).all()
+    if rows:
+        raise VenueConflict(target.location, [conflict_dict(row) for row in rows])
+
+def venue_conflict_response(error):
+    db.session.rollback()
+    return jsonify({
+        'success': False,
+        'message': str(error),
+        'data': {'location': error.location, 'conflicts': error.conflicts}
+    }), 409
+
+def calendar_conflicts(start=None, end=None):
+    """Every pair of overlapping events in the date range, in one ordered pass
+
+    Events stream in (location, date, start_time) order, straight off the
+    index. For each room and day, a heap of bookings still running holds
+    everything a new event can clash with, so the pass is O(n log n) in the
+    number of events rather than comparing every pair.
+    """
+    query = db.session.query(Event.id, Event.location, Event.date, Event.start_time, Event.end_time)
+    if start is not None:
+        query = query.filter(Event.date >= start)
+    if end is not None:
+        query = query.filter(Event.date <= end)
+
+    conflicts = []
+    venue_day = None
+    running = []  # (end_time, id) of events still in progress
+
+    rows = query.order_by(Event.location, Event.date, Event.start_time).yield_per(5000)
+    for row in rows:
+        if (row.location, row.date) != venue_day:
+            venue_day = (row.location, row.date)
+            running = []
+
+        while running and running[0][0] <= row.start_time:
+            heapq.heappop(running)
+        for _, event_id in running:
+            conflicts.append({'location': row.location, 'date': row.date, 'event_ids': [event_id, row.id]})
+        heapq.heappush(running, (row.end_time, row.id))
+
+    return conflicts
+
+@click.command('check-venues')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='First day of the term (default: today)')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Last day of the term (default: no limit)')
+@with_appcontext
+def check_venues_command(start, end):
+    """Report events that double-book a location; exits 1 if any do"""
+    started = time.perf_counter()
+    conflicts = calendar_conflicts(start.date() if start else date.today(), end.date() if end else None)
+
+    for conflict in conflicts:
+        first, second = conflict['event_ids']
+        click.echo(f"{conflict['date']} {conflict['location']}: events {first} and {second} overlap")
+    click.echo(f'{len(conflicts)} conflicts found in {time.perf_counter() - started:.3f}s')
+
+    if conflicts:
+        raise SystemExit(1)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Profile app startup with `python -X importtime` and enforce a time budget.
+
+Usage:
+    python startup_profile.py [--top 20] [--budget-ms 1500]
+
+Runs create_app() in a fresh interpreter, prints the slowest imports by
+cumulative time and exits non-zero if startup took longer than the budget
+(STARTUP_BUDGET_MS, default 1500ms).
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+BOOT_SNIPPET = 'from app import create_app; create_app()'
+
+class StartupFailed(Exception):
+    """create_app() raised in the profiling subprocess; the message is its stderr"""
+
+def budget_ms():
+    return int(os.environ.get('STARTUP_BUDGET_MS') or 1500)
+
+def parse_importtime(stderr):
+    """Return [(cumulative_us, self_us, module)] from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|', 2)
+        rows.append((int(cumulative_us), int(self_us), module.rstrip()[1:]))
+    return rows
+
+def profile_startup():
+    """Boot the app once in a subprocess; return (wall seconds, import rows)"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', BOOT_SNIPPET],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    elapsed = time.perf_counter() - started
+
+    if result.returncode != 0:
+        raise StartupFailed(result.stderr[-4000:])
+
+    return elapsed, parse_importtime(result.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile create_app() startup time')
+    parser.add_argument('--top', type=int, default=20, help='Number of slowest imports to list')
+    parser.add_argument('--budget-ms', type=int, default=budget_ms(),
+                        help='Fail if startup takes longer than this')
+    args = parser.parse_args()
+
+    try:
+        elapsed, rows = profile_startup()
+    except StartupFailed as err:
+        sys.stderr.write(str(err))
+        sys.exit(1)
+    # Top-level imports are the ones without leading indentation in the module column
+    top_level = [row for row in rows if not row[2].startswith('  ')]
+    total_import_ms = sum(cumulative for cumulative, _, _ in top_level) / 1000
+
+    print(f"{'cumulative ms':>14}  {'self ms':>8}  module")
+    for cumulative, self_us, module in sorted(rows, reverse=True)[:args.top]:
+        print(f'{cumulative / 1000:>14.1f}  {self_us / 1000:>8.1f}  {module.strip()}')
+
+    print(f'\nModules imported: {len(rows)}')
+    print(f'Total import time: {total_import_ms:.0f}ms')
+    print(f'Startup wall time: {elapsed * 1000:.0f}ms (budget {args.budget_ms}ms)')
+
+    if elapsed * 1000 > args.budget_ms:
+        print('Startup is over budget')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
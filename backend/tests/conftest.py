@@ -0,0 +1,28 @@
+import importlib
+import sys
+import pytest
+from flask import Flask
+
+# models_updated.py becomes models.py in the final layout (FINAL_FILE_ASSIGNMENTS.md).
+# Until the rename lands, load it under the name the services import.
+if 'models' not in sys.modules:
+    sys.modules['models'] = importlib.import_module('models_updated')
+
+from app import db
+from config import TestingConfig
+
+class ServiceTestConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+@pytest.fixture
+def app():
+    """A bare app with the database bound, for testing services without the API"""
+    app = Flask(__name__)
+    app.config.from_object(ServiceTestConfig)
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
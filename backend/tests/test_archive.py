@@ -0,0 +1,80 @@
+from datetime import datetime, date, time, timedelta
+import pytest
+from app import db
+from models import (
+    User, Event, Ticket, Purchase, Commission, IssuedTicket,
+    PurchaseArchive, CommissionArchive, IssuedTicketArchive
+)
+from services.archive import archive_past_purchases, with_archive
+
+@pytest.fixture
+def ticket(app):
+    """A ticket for an event two years ago"""
+    organizer = User(name='Organizer', email='organizer@campus.edu', role='verified_leader', password_hash='-')
+    db.session.add(organizer)
+    db.session.flush()
+
+    event = Event(
+        title='Old Concert', date=date.today() - timedelta(days=730), start_time=time(18), end_time=time(20),
+        location='Main Hall', created_by=organizer.id, is_paid=True
+    )
+    db.session.add(event)
+    db.session.flush()
+
+    ticket = Ticket(event_id=event.id, name='General', price=500, quantity=100, sold_count=0)
+    db.session.add(ticket)
+    db.session.commit()
+    return ticket
+
+def sold(ticket, payout_status='paid', commission_delay=timedelta(0), status='completed'):
+    """A purchase with its commission and ticket code; the commission may be created later"""
+    created_at = datetime.combine(ticket.event.date, time(12)) - timedelta(days=7)
+    purchase = Purchase(
+        user_id=ticket.event.created_by, ticket_id=ticket.id, quantity=1, unit_price=500, total_amount=500,
+        status=status, created_at=created_at
+    )
+    db.session.add(purchase)
+    db.session.flush()
+    db.session.add_all([
+        Commission(
+            purchase_id=purchase.id, platform_fee_rate=0.05, platform_fee_amount=25, organizer_amount=475,
+            payout_status=payout_status, created_at=created_at + commission_delay
+        ),
+        IssuedTicket(
+            purchase_id=purchase.id, event_id=ticket.event_id, code=f'CODE-{purchase.id}', created_at=created_at
+        )
+    ])
+    db.session.commit()
+    return purchase.id
+
+def test_settled_purchases_move_to_the_archive(app, ticket):
+    paid = sold(ticket)
+    # A ledger repair created this commission a couple of months after its purchase
+    repaired = sold(ticket, commission_delay=timedelta(days=62))
+
+    assert archive_past_purchases(months=12)['archived'] == 2
+
+    assert Purchase.query.count() == Commission.query.count() == IssuedTicket.query.count() == 0
+    assert {row.id for row in PurchaseArchive.query} == {paid, repaired}
+    assert {row.purchase_id for row in CommissionArchive.query} == {paid, repaired}
+    assert IssuedTicketArchive.query.count() == 2
+
+    commissions = with_archive(Commission)
+    assert db.session.query(db.func.sum(commissions.c.platform_fee_amount)).scalar() == 50
+
+@pytest.mark.parametrize('payout_status', ['pending', 'failed', 'clawback'])
+def test_unsettled_commissions_keep_their_purchase_live(app, ticket, payout_status):
+    kept = sold(ticket, payout_status=payout_status)
+    archived = sold(ticket, payout_status='reversed', status='refunded')
+
+    assert archive_past_purchases(months=12)['archived'] == 1
+
+    assert [row.id for row in Purchase.query] == [kept]
+    assert [row.id for row in PurchaseArchive.query] == [archived]
+
+def test_recent_events_stay_live(app, ticket):
+    ticket.event.date = date.today()
+    sold(ticket)
+
+    assert archive_past_purchases(months=12)['archived'] == 0
+    assert Purchase.query.count() == 1
@@ -0,0 +1,80 @@
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+import pytest
+from flask_jwt_extended import JWTManager, create_access_token
+from app import db
+from models import User, Event, Ticket, Subscription
+import routes.tickets
+from routes.tickets import tickets_bp
+
+@pytest.fixture
+def client(app):
+    """The tickets API for a premium organizer with two tiers, 10 of 100 General sold"""
+    JWTManager(app)
+    app.register_blueprint(tickets_bp, url_prefix='/api/tickets')
+
+    organizer = User(name='Organizer', email='organizer@campus.edu', role='verified_leader', password_hash='-')
+    db.session.add(organizer)
+    db.session.flush()
+    now = datetime.utcnow()
+    db.session.add(Subscription(
+        user_id=organizer.id, plan_type='premium', monthly_fee=Decimal('1000.00'),
+        start_date=now - timedelta(days=1), end_date=now + timedelta(days=30), status='active'
+    ))
+    event = Event(
+        title='Concert', date=date.today() + timedelta(days=7), start_time=time(18), end_time=time(20),
+        location='Main Hall', created_by=organizer.id, is_paid=True
+    )
+    db.session.add(event)
+    db.session.flush()
+    db.session.add_all([
+        Ticket(id=1, event_id=event.id, name='General', price=500, quantity=100, sold_count=10),
+        Ticket(id=2, event_id=event.id, name='VIP', price=2000, quantity=20, sold_count=0)
+    ])
+    db.session.commit()
+
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {create_access_token(identity=organizer.id)}'
+    return client
+
+def bulk_update(client, tickets):
+    return client.post('/api/tickets/bulk-update', json={'tickets': tickets})
+
+def tickets():
+    db.session.expire_all()
+    return {ticket.id: (ticket.quantity, ticket.price) for ticket in Ticket.query}
+
+def test_bulk_update_changes_quantity_and_price(client):
+    response = bulk_update(client, [{'id': 1, 'quantity': 10}, {'id': 2, 'price': '2500.00'}])
+
+    assert response.status_code == 200
+    assert response.json['data'] == {'updated': 2, 'errors': []}
+    assert tickets() == {1: (10, Decimal('500.00')), 2: (20, Decimal('2500.00'))}
+
+def test_quantity_below_sold_is_rejected_per_item(client):
+    response = bulk_update(client, [{'id': 1, 'quantity': 5}, {'id': 2, 'quantity': 15}])
+
+    assert response.status_code == 200
+    assert response.json['data']['updated'] == 1
+    assert response.json['data']['errors'][0]['index'] == 0
+    assert tickets()[1] == (100, Decimal('500.00'))
+    assert tickets()[2] == (15, Decimal('2000.00'))
+
+def test_sale_after_the_check_fails_the_whole_batch(client, monkeypatch):
+    chunked = routes.tickets.chunked
+
+    def sell_after_read(items, size):
+        # Tickets sell between the sold-count read and the UPDATE
+        for chunk in chunked(items, size):
+            yield chunk
+            db.session.execute(db.update(Ticket).where(Ticket.id == 1).values(sold_count=50))
+
+    monkeypatch.setattr(routes.tickets, 'chunked', sell_after_read)
+
+    response = bulk_update(client, [{'id': 2, 'price': '2500.00'}, {'id': 1, 'quantity': 40}])
+
+    assert response.status_code == 409
+    assert response.json['data']['updated'] == 0
+    assert [error['index'] for error in response.json['data']['errors']] == [1]
+    # Nothing was applied, not even the unrelated price change
+    assert tickets() == {1: (100, Decimal('500.00')), 2: (20, Decimal('2000.00'))}
@@ -0,0 +1,25 @@
+from flask import Config as FlaskConfig
+from config import TestingConfig
+from services.database import engine_options
+
+def postgres_config(**overrides):
+    config = FlaskConfig('.')
+    config.from_object(TestingConfig)
+    config.update(SQLALCHEMY_DATABASE_URI='postgresql://eventhub@localhost/eventhub', **overrides)
+    return config
+
+def test_web_workers_get_the_request_timeout():
+    options = engine_options(postgres_config(DB_STATEMENT_TIMEOUT_MS=15000))
+
+    assert options['connect_args']['options'] == '-c statement_timeout=15000'
+
+def test_commands_get_the_cli_timeout():
+    config = postgres_config(DB_STATEMENT_TIMEOUT_MS=15000, DB_CLI_STATEMENT_TIMEOUT_MS=0)
+
+    # 0 is sent explicitly so it also overrides a timeout set on the database role
+    assert engine_options(config, cli=True)['connect_args']['options'] == '-c statement_timeout=0'
+
+def test_pgbouncer_gets_no_startup_options():
+    options = engine_options(postgres_config(DB_PGBOUNCER=True), cli=True)
+
+    assert 'options' not in options['connect_args']
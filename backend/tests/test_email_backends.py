@@ -0,0 +1,179 @@
+import json
+import socket
+import threading
+from datetime import datetime, timedelta
+from email import message_from_bytes
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from aiosmtpd.controller import Controller
+from app import db
+from models import EmailOutbox
+from services.email import queue_email, process_outbox
+
+class SendGridStub(BaseHTTPRequestHandler):
+    """Records mail/send requests and answers with the next status in `statuses` (202 once they run out)"""
+    statuses = []
+    requests = []
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.requests.append({'authorization': self.headers['Authorization'], 'body': json.loads(self.rfile.read(length))})
+        status = self.statuses.pop(0) if self.statuses else 202
+        data = b'' if status == 202 else json.dumps({'errors': [{'message': f'status {status}'}]}).encode()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class SMTPRecorder:
+    """aiosmtpd handler that keeps accepted messages and answers DATA with the next of `replies`"""
+
+    def __init__(self):
+        self.replies = []
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        reply = self.replies.pop(0) if self.replies else '250 Message accepted'
+        if reply.startswith('250'):
+            self.messages.append((envelope.rcpt_tos, message_from_bytes(envelope.content)))
+        return reply
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def sendgrid(app):
+    """Point the SendGrid backend at a local stub; call it with the statuses to answer"""
+    servers = []
+    app.config.update(EMAIL_BACKEND='sendgrid', SENDGRID_API_KEY='SG.test')
+
+    def run(*statuses):
+        handler = type('TestSendGrid', (SendGridStub,), {'statuses': list(statuses), 'requests': []})
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        servers.append(server)
+        app.config['SENDGRID_API_URL'] = f'http://127.0.0.1:{server.server_address[1]}/v3/mail/send'
+        return handler
+
+    yield run
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture
+def smtp(app):
+    """Run a local SMTP server for the SMTP backend"""
+    recorder = SMTPRecorder()
+    controller = Controller(recorder, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    app.config.update(EMAIL_BACKEND='smtp', SMTP_HOST='127.0.0.1', SMTP_PORT=controller.port)
+    yield recorder
+    controller.stop()
+
+def queue(to_email, name='Sam'):
+    message = queue_email(to_email, 'leader_rejected', {'name': name, 'reason': 'Incomplete'},
+                          f'leader_rejected:{to_email}', to_name=name)
+    db.session.commit()
+    return message
+
+def assert_backed_off(message, seconds):
+    assert message.status == 'pending'
+    assert datetime.utcnow() + timedelta(seconds=seconds - 2) <= message.next_attempt_at
+    assert message.next_attempt_at <= datetime.utcnow() + timedelta(seconds=seconds)
+
+def make_due(message):
+    message.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+def test_sendgrid_sends_a_template_batch_in_one_request(sendgrid):
+    stub = sendgrid()
+    sam, alex = queue('sam@campus.edu', 'Sam'), queue('alex@campus.edu', 'Alex')
+
+    assert process_outbox() == (2, 0)
+
+    request, = stub.requests
+    assert request['authorization'] == 'Bearer SG.test'
+    assert request['body']['content'][0]['value'].startswith('Hi -name-,')
+    assert [item['to'][0]['email'] for item in request['body']['personalizations']] == [
+        'sam@campus.edu', 'alex@campus.edu'
+    ]
+    assert request['body']['personalizations'][1]['substitutions']['-name-'] == 'Alex'
+    assert sam.status == alex.status == 'sent'
+
+@pytest.mark.parametrize('status', [500, 503, 429, 400])
+def test_sendgrid_error_is_retried_after_a_backoff(sendgrid, status):
+    stub = sendgrid(status)
+    message = queue('sam@campus.edu')
+
+    assert process_outbox() == (0, 1)
+    assert message.last_error.startswith(f'SendGrid {status}:')
+    assert_backed_off(message, 30)
+
+    make_due(message)
+    assert process_outbox() == (1, 0)
+    assert message.status == 'sent'
+    assert message.attempts == 2
+    assert len(stub.requests) == 2
+
+def test_sendgrid_backoff_doubles_until_the_message_fails(app, sendgrid):
+    app.config['EMAIL_MAX_ATTEMPTS'] = 4
+    stub = sendgrid(502, 502, 502, 502)
+    message = queue('sam@campus.edu')
+
+    for delay in (30, 60, 120):
+        assert process_outbox() == (0, 1)
+        assert_backed_off(message, delay)
+        make_due(message)
+
+    assert process_outbox() == (0, 1)
+    assert message.status == 'failed'
+    assert len(stub.requests) == 4
+
+def test_smtp_sends_each_message(smtp):
+    queue('sam@campus.edu', 'Sam')
+    queue('alex@campus.edu', 'Alex')
+
+    assert process_outbox() == (2, 0)
+
+    assert sorted(rcpt for (rcpt,), _ in smtp.messages) == ['alex@campus.edu', 'sam@campus.edu']
+    _, email = smtp.messages[0]
+    assert email['Subject'] == 'Your EventHub organizer application'
+    assert email['From'] == 'noreply@campus.edu'
+    assert 'Reason: Incomplete' in email.get_payload()
+    assert EmailOutbox.query.filter_by(status='sent').count() == 2
+
+@pytest.mark.parametrize('reply', ['451 Try again later', '550 Mailbox unavailable'])
+def test_smtp_rejection_is_retried_after_a_backoff(smtp, reply):
+    smtp.replies = [reply]
+    message = queue('sam@campus.edu')
+
+    assert process_outbox() == (0, 1)
+    assert reply.split()[0] in message.last_error
+    assert_backed_off(message, 30)
+
+    make_due(message)
+    assert process_outbox() == (1, 0)
+    assert message.status == 'sent'
+    assert len(smtp.messages) == 1
+
+def test_smtp_rejection_only_fails_that_message(smtp):
+    smtp.replies = ['250 Message accepted', '550 Mailbox unavailable']
+    first, second = queue('sam@campus.edu'), queue('alex@campus.edu')
+
+    assert process_outbox() == (1, 1)
+    assert (first.status, second.status) == ('sent', 'pending')
+
+def test_unreachable_smtp_server_backs_off_the_whole_batch(app):
+    app.config.update(EMAIL_BACKEND='smtp', SMTP_HOST='127.0.0.1', SMTP_PORT=free_port())
+    messages = [queue('sam@campus.edu'), queue('alex@campus.edu')]
+
+    assert process_outbox() == (0, 2)
+    for message in messages:
+        assert message.last_error
+        assert_backed_off(message, 30)
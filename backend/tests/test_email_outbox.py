@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from models import EmailOutbox
+from services.email import queue_email, claim_due_messages, process_outbox
+
+class FakeBackend:
+    """Records what it is asked to send; addresses in `failing` get an error back"""
+
+    def __init__(self, failing=(), broken_templates=()):
+        self.failing = set(failing)
+        self.broken_templates = set(broken_templates)
+        self.sent = []
+
+    def send_batch(self, template, messages):
+        if template in self.broken_templates:
+            raise ConnectionError('backend unreachable')
+        self.sent.extend(message.to_email for message in messages)
+        return {message.id: 'rejected' if message.to_email in self.failing else None for message in messages}
+
+def queue(to_email, template='leader_rejected', **fields):
+    message = queue_email(to_email, template, {'name': 'Sam', 'reason': 'Incomplete'}, f'{template}:{to_email}')
+    for name, value in fields.items():
+        setattr(message, name, value)
+    db.session.commit()
+    return message
+
+def make_due(message):
+    message.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+def test_queue_email_skips_duplicates(app):
+    queue('sam@campus.edu')
+    assert queue_email('sam@campus.edu', 'leader_rejected', {}, 'leader_rejected:sam@campus.edu') is None
+    assert EmailOutbox.query.count() == 1
+
+def test_sent_messages_are_marked_sent(app):
+    message = queue('sam@campus.edu')
+    backend = FakeBackend()
+
+    assert process_outbox(backend) == (1, 0)
+    assert backend.sent == ['sam@campus.edu']
+    assert message.status == 'sent'
+    assert message.attempts == 1
+    assert message.sent_at is not None
+
+    assert process_outbox(backend) == (0, 0)
+    assert backend.sent == ['sam@campus.edu']
+
+def test_failures_back_off_exponentially(app):
+    message = queue('bounce@campus.edu')
+    backend = FakeBackend(failing={'bounce@campus.edu'})
+
+    for attempt, delay in enumerate((30, 60, 120), start=1):
+        before = datetime.utcnow()
+        assert process_outbox(backend) == (0, 1)
+        assert message.status == 'pending'
+        assert message.attempts == attempt
+        assert message.last_error == 'rejected'
+        assert before + timedelta(seconds=delay - 1) <= message.next_attempt_at
+        assert message.next_attempt_at <= datetime.utcnow() + timedelta(seconds=delay)
+
+        # Not due yet, so the next run leaves it alone
+        assert process_outbox(backend) == (0, 0)
+        make_due(message)
+
+    assert len(backend.sent) == 3
+
+def test_backoff_is_capped_at_an_hour(app):
+    app.config['EMAIL_MAX_ATTEMPTS'] = 20
+    message = queue('bounce@campus.edu', attempts=9)
+
+    process_outbox(FakeBackend(failing={'bounce@campus.edu'}))
+
+    assert message.next_attempt_at <= datetime.utcnow() + timedelta(hours=1)
+    assert message.next_attempt_at > datetime.utcnow() + timedelta(minutes=59)
+
+def test_message_fails_after_max_attempts(app):
+    app.config['EMAIL_MAX_ATTEMPTS'] = 3
+    message = queue('bounce@campus.edu', attempts=2)
+
+    assert process_outbox(FakeBackend(failing={'bounce@campus.edu'})) == (0, 1)
+    assert message.status == 'failed'
+    assert message.attempts == 3
+
+    make_due(message)
+    assert process_outbox(FakeBackend()) == (0, 0)
+
+def test_backend_error_only_fails_its_template_batch(app):
+    rejected = queue('sam@campus.edu')
+    approved = queue('alex@campus.edu', template='leader_approved')
+
+    sent, failed = process_outbox(FakeBackend(broken_templates={'leader_approved'}))
+
+    assert (sent, failed) == (1, 1)
+    assert rejected.status == 'sent'
+    assert approved.status == 'pending'
+    assert approved.last_error == 'backend unreachable'
+
+def test_claim_leases_due_messages_and_reclaims_expired_leases(app):
+    now = datetime.utcnow()
+    due = queue('due@campus.edu')
+    later = queue('later@campus.edu', next_attempt_at=now + timedelta(minutes=5))
+    leased = queue('leased@campus.edu', status='sending', next_attempt_at=now + timedelta(minutes=5))
+    crashed = queue('crashed@campus.edu', status='sending', next_attempt_at=now - timedelta(minutes=1))
+    done = queue('done@campus.edu', status='sent', next_attempt_at=now - timedelta(minutes=1))
+
+    claimed = claim_due_messages(batch_size=10, lease_seconds=300)
+
+    assert {message.to_email for message in claimed} == {'due@campus.edu', 'crashed@campus.edu'}
+    for message in (due, crashed):
+        assert message.status == 'sending'
+        assert message.next_attempt_at > now + timedelta(seconds=299)
+    assert later.status == 'pending'
+    assert leased.status == 'sending'
+    assert done.status == 'sent'
+
+    # The lease keeps a second worker off the claimed messages
+    assert claim_due_messages(batch_size=10, lease_seconds=300) == []
+
+@pytest.mark.parametrize('batch_size', [1, 2])
+def test_claim_respects_batch_size_oldest_first(app, batch_size):
+    now = datetime.utcnow()
+    for minutes, to_email in ((3, 'oldest@campus.edu'), (2, 'middle@campus.edu'), (1, 'newest@campus.edu')):
+        queue(to_email, next_attempt_at=now - timedelta(minutes=minutes))
+
+    claimed = claim_due_messages(batch_size=batch_size, lease_seconds=300)
+
+    assert [message.to_email for message in claimed] == ['oldest@campus.edu', 'middle@campus.edu'][:batch_size]
@@ -0,0 +1,152 @@
+import hashlib
+import threading
+from datetime import datetime, timedelta
+import pytest
+from flask import Flask, jsonify, request
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required
+from app import db
+from config import TestingConfig
+from models import User, IdempotencyKey
+from services.idempotency import idempotent, purge_expired_keys
+
+@pytest.fixture
+def app(tmp_path):
+    """An app with one idempotent endpoint that counts how often its body really runs
+
+    A database file rather than memory, so requests on other threads share it.
+    """
+    class IdempotencyTestConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'idempotency.db'}"
+
+    app = Flask(__name__)
+    app.config.from_object(IdempotencyTestConfig)
+    db.init_app(app)
+    JWTManager(app)
+    app.calls = []
+    app.entered = threading.Event()
+    app.gate = None  # Set to a threading.Event to hold requests inside the view
+
+    @app.route('/orders', methods=['POST'])
+    @jwt_required()
+    @idempotent
+    def create_order():
+        app.calls.append(request.json)
+        app.entered.set()
+        if app.gate is not None:
+            app.gate.wait(5)
+        return jsonify({'success': True, 'order': len(app.calls)}), 201
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(name='Buyer', email='buyer@campus.edu', password_hash='-'))
+        db.session.commit()
+        app.headers = {
+            'Authorization': f'Bearer {create_access_token(identity=1)}',
+            'Idempotency-Key': 'order-1'
+        }
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def order(app, body=None):
+    return app.test_client().post('/orders', json=body or {'quantity': 1}, headers=app.headers)
+
+def test_retry_replays_the_first_response(app):
+    first = order(app)
+    retry = order(app)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json == first.json == {'success': True, 'order': 1}
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert len(app.calls) == 1
+
+def test_requests_without_a_key_are_not_deduplicated(app):
+    client = app.test_client()
+    headers = {'Authorization': app.headers['Authorization']}
+
+    client.post('/orders', json={'quantity': 1}, headers=headers)
+    client.post('/orders', json={'quantity': 1}, headers=headers)
+
+    assert len(app.calls) == 2
+
+def test_reusing_a_key_with_a_different_body_is_rejected(app):
+    order(app, {'quantity': 1})
+    response = order(app, {'quantity': 2})
+
+    assert response.status_code == 422
+    assert len(app.calls) == 1
+
+def test_concurrent_duplicate_gets_409_while_the_first_runs(app):
+    app.gate = threading.Event()
+    responses = []
+    first = threading.Thread(target=lambda: responses.append(order(app)))
+    first.start()
+    assert app.entered.wait(5)
+
+    duplicate = order(app)
+    app.gate.set()
+    first.join()
+
+    assert duplicate.status_code == 409
+    assert duplicate.headers['Retry-After'] == '1'
+    assert responses[0].status_code == 201
+    assert len(app.calls) == 1
+    # Once the first finishes, the retry gets its response
+    assert order(app).json == {'success': True, 'order': 1}
+
+def lock_age(app, seconds):
+    """Pretend the key was claimed `seconds` ago by a request that never finished"""
+    db.session.add(IdempotencyKey(
+        key='order-1', user_id=1, endpoint='create_order',
+        request_hash=hashlib.sha256(app.json.dumps({'quantity': 1}).encode()).hexdigest(),
+        status='processing', locked_at=datetime.utcnow() - timedelta(seconds=seconds),
+        expires_at=datetime.utcnow() + timedelta(hours=24)
+    ))
+    db.session.commit()
+
+def test_stale_processing_key_is_taken_over(app):
+    lock_age(app, app.config['IDEMPOTENCY_LOCK_TIMEOUT_SECONDS'] + 1)
+
+    response = order(app, {'quantity': 1})
+
+    assert response.status_code == 201
+    assert len(app.calls) == 1
+    record = IdempotencyKey.query.one()
+    assert record.status == 'completed'
+    assert record.response_code == 201
+
+def test_recent_processing_key_is_not_taken_over(app):
+    lock_age(app, app.config['IDEMPOTENCY_LOCK_TIMEOUT_SECONDS'] - 10)
+
+    assert order(app, {'quantity': 1}).status_code == 409
+    assert app.calls == []
+
+def test_stale_key_with_a_different_body_is_still_rejected(app):
+    lock_age(app, app.config['IDEMPOTENCY_LOCK_TIMEOUT_SECONDS'] + 1)
+
+    assert order(app, {'quantity': 2}).status_code == 422
+    assert app.calls == []
+
+def test_only_one_retry_takes_over_a_stale_key(app):
+    lock_age(app, app.config['IDEMPOTENCY_LOCK_TIMEOUT_SECONDS'] + 1)
+    app.gate = threading.Event()
+    responses = []
+    winner = threading.Thread(target=lambda: responses.append(order(app, {'quantity': 1})))
+    winner.start()
+    assert app.entered.wait(5)
+
+    loser = order(app, {'quantity': 1})
+    app.gate.set()
+    winner.join()
+
+    assert responses[0].status_code == 201
+    assert loser.status_code == 409
+    assert len(app.calls) == 1
+
+def test_expired_keys_are_purged(app):
+    order(app)
+    IdempotencyKey.query.update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+
+    assert purge_expired_keys() == 1
+    assert IdempotencyKey.query.count() == 0
@@ -0,0 +1,142 @@
+import hashlib
+import io
+import json
+import os
+import time as clock
+from datetime import datetime, date, time, timedelta
+import pytest
+from flask_jwt_extended import JWTManager, create_access_token
+from PIL import Image
+from app import db
+from models import User, Event, ImageAsset
+import services.media
+from services.media import UploadRequest, fail_stale_images
+from routes.media import media_bp
+
+@pytest.fixture
+def client(app, tmp_path):
+    """The media API with local storage under tmp_path and an event to upload a banner for"""
+    app.config.update(
+        MEDIA_STORAGE='local',
+        UPLOAD_FOLDER=str(tmp_path / 'uploads'),
+        UPLOAD_TMP_DIR=str(tmp_path / 'uploads' / 'tmp'),
+        MEDIA_URL='/api/media/files',
+        IMAGE_WORKERS=1,
+        IMAGE_SIZES={'thumb': 16, 'large': 64}
+    )
+    app.request_class = UploadRequest
+    JWTManager(app)
+    app.register_blueprint(media_bp, url_prefix='/api/media')
+
+    organizer = User(name='Organizer', email='organizer@campus.edu', role='verified_leader', password_hash='-')
+    db.session.add(organizer)
+    db.session.flush()
+    for title in ('Concert', 'Play'):
+        db.session.add(Event(
+            title=title, date=date.today() + timedelta(days=7), start_time=time(18), end_time=time(20),
+            location='Main Hall', created_by=organizer.id
+        ))
+    db.session.commit()
+
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {create_access_token(identity=organizer.id)}'
+    yield client
+
+    if services.media._pool is not None:
+        services.media._pool.shutdown()
+        services.media._pool = None
+
+def png(color='red', size=(200, 100)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def upload(client, event_id, data):
+    return client.post(f'/api/media/events/{event_id}/image', data={'image': (io.BytesIO(data), 'banner.png')},
+                       content_type='multipart/form-data')
+
+def wait_until_done(asset_id, timeout=30):
+    deadline = clock.monotonic() + timeout
+    while clock.monotonic() < deadline:
+        db.session.expire_all()
+        asset = db.session.get(ImageAsset, asset_id)
+        if asset.status != 'processing':
+            return asset
+        clock.sleep(0.05)
+    raise AssertionError('image was not processed in time')
+
+def test_upload_streams_to_disk_and_stores_variants(app, client):
+    data = png()
+
+    response = upload(client, 1, data)
+
+    assert response.status_code == 202
+    asset = wait_until_done(response.json['data']['id'])
+    assert asset.status == 'ready'
+    # The file was hashed as it streamed in, never read back into memory
+    assert asset.content_hash == hashlib.sha256(data).hexdigest()
+
+    variants = json.loads(asset.variants)
+    prefix = f'/api/media/files/{asset.content_hash[:2]}/{asset.content_hash}'
+    assert variants == {'thumb': f'{prefix}/thumb.jpg', 'large': f'{prefix}/large.jpg'}
+    with Image.open(os.path.join(app.config['UPLOAD_FOLDER'], asset.content_hash[:2], asset.content_hash,
+                                 'large.jpg')) as large:
+        assert large.size == (64, 32)
+    assert db.session.get(Event, 1).image_url == variants['large']
+    # The streamed temporary upload is cleaned up once the variants exist
+    assert os.listdir(app.config['UPLOAD_TMP_DIR']) == []
+
+def test_same_image_is_processed_once(client):
+    first = upload(client, 1, png())
+    asset = wait_until_done(first.json['data']['id'])
+
+    second = upload(client, 2, png())
+
+    assert second.status_code == 200
+    assert second.json['data']['id'] == asset.id
+    assert ImageAsset.query.count() == 1
+    assert db.session.get(Event, 2).image_url == json.loads(asset.variants)['large']
+
+def test_stale_asset_is_failed_and_retried_on_the_next_upload(app, client):
+    data = png('blue')
+    db.session.add(ImageAsset(
+        content_hash=hashlib.sha256(data).hexdigest(), status='processing',
+        targets=json.dumps([['event', 1]]),
+        processing_started_at=datetime.utcnow() - timedelta(seconds=app.config['IMAGE_PROCESSING_TIMEOUT_SECONDS'] + 1)
+    ))
+    db.session.commit()
+
+    assert fail_stale_images() == 1
+    assert ImageAsset.query.one().status == 'failed'
+
+    response = upload(client, 2, data)
+
+    asset = wait_until_done(response.json['data']['id'])
+    assert asset.status == 'ready'
+    assert db.session.get(Event, 2).image_url == json.loads(asset.variants)['large']
+
+def test_broken_pool_is_replaced(client):
+    from concurrent.futures.process import BrokenProcessPool
+
+    # A pool process dying (e.g. killed for memory) breaks the whole pool
+    broken = services.media.get_pool()
+    with pytest.raises(BrokenProcessPool):
+        broken.submit(os._exit, 1).result()
+
+    response = upload(client, 1, png('green'))
+
+    assert wait_until_done(response.json['data']['id']).status == 'ready'
+    assert services.media._pool is not broken
+
+def test_asset_fails_when_it_cannot_be_queued(client, monkeypatch):
+    def refuse(fn, *args):
+        raise RuntimeError('cannot start worker processes')
+
+    monkeypatch.setattr(services.media, 'submit_to_pool', refuse)
+
+    response = upload(client, 1, png('yellow'))
+
+    asset = db.session.get(ImageAsset, response.json['data']['id'])
+    assert asset.status == 'failed'
+    assert 'cannot start worker processes' in asset.error
+    assert json.loads(asset.targets) == []
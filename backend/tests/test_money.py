@@ -0,0 +1,163 @@
+import random
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+import pytest
+from app import db
+from models import User, Event, Ticket, Purchase, Commission
+from money import to_decimal, to_cents, from_cents, to_shillings, split_commission
+from services.commissions import commission_report, record_commission
+from services.reconciliation import run_reconciliation, get_checkpoint
+
+RATES = [Decimal('0.05'), Decimal('0.0375'), Decimal('0.0125'), Decimal('0.1'), Decimal('0.0333')]
+
+@pytest.mark.parametrize('value, cents', [
+    ('499.50', 49950),
+    ('0.01', 1),
+    (Decimal('12.345'), 1235),  # Half a cent rounds up
+    ('12.344', 1234),
+    (Decimal('-1.005'), -101),  # ... and away from zero for negatives
+    (500, 50000),
+    (0.1 + 0.2, 30),  # A float's shortest repr, not its binary expansion
+    (1.005, 101),
+    (None, 0)
+])
+def test_to_cents(value, cents):
+    assert to_cents(value) == cents
+
+def test_floats_convert_through_their_repr():
+    assert to_decimal(1.1) == Decimal('1.1')
+    assert to_decimal('2.50') == Decimal('2.50')
+
+def test_from_cents_round_trips():
+    for cents in list(range(-1000, 1000)) + [10 ** 10 - 1]:
+        amount = from_cents(cents)
+        assert amount.as_tuple().exponent == -2
+        assert to_cents(amount) == cents
+        assert to_cents(str(amount)) == cents
+
+@pytest.mark.parametrize('amount, shillings', [
+    ('499.50', 500),  # Never undercharge by the cents
+    ('500.00', 500),
+    ('500.01', 501),
+    ('0.01', 1),
+    (0, 0)
+])
+def test_to_shillings_rounds_cents_up(amount, shillings):
+    assert to_shillings(amount) == shillings
+
+def test_split_sums_exactly_to_the_total():
+    generator = random.Random(39)
+
+    for _ in range(100000):
+        total = generator.randint(0, 10 ** 8)
+        rate = generator.choice(RATES)
+        fee, organizer = split_commission(total, rate)
+
+        assert fee + organizer == total
+        assert fee == int((Decimal(total) * rate).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+        assert 0 <= fee <= total
+
+def test_split_rounds_the_fee_half_up():
+    assert split_commission(1010, '0.05') == (51, 959)  # 50.5 cents
+    assert split_commission(1009, '0.05') == (50, 959)  # 50.45 cents
+    assert split_commission(1, '0.0125') == (0, 1)
+
+def seed_ledger(purchases, tickets=200, seed=39):
+    """A settled ledger of `purchases` sales across `tickets` tiers; returns the expected totals in cents"""
+    generator = random.Random(seed)
+    organizer = User(name='Organizer', email='organizer@campus.edu', role='verified_leader', password_hash='-')
+    buyer = User(name='Buyer', email='buyer@campus.edu', password_hash='-')
+    db.session.add_all([organizer, buyer])
+    db.session.flush()
+
+    event = Event(
+        title='Festival', date=date.today() + timedelta(days=7), start_time=time(18), end_time=time(20),
+        location='Main Hall', created_by=organizer.id, is_paid=True
+    )
+    db.session.add(event)
+    db.session.flush()
+
+    prices = [generator.randint(0, 500000) for _ in range(tickets)]  # Cents, some complimentary
+    db.session.bulk_insert_mappings(Ticket, [{
+        'id': index + 1, 'event_id': event.id, 'name': f'Tier {index}', 'price': from_cents(price),
+        'quantity': 10 ** 6, 'sold_count': 0
+    } for index, price in enumerate(prices)])
+
+    settled = datetime.utcnow() - timedelta(days=2)
+    sold = {}
+    purchase_rows, commission_rows = [], []
+    totals = {'purchase': 0, 'fee': 0, 'organizer': 0}
+
+    for purchase_id in range(1, purchases + 1):
+        ticket_id = generator.randint(1, tickets)
+        quantity = generator.randint(1, 6)
+        status = generator.choices(('completed', 'failed', 'refunded'), (90, 8, 2))[0]
+        total = prices[ticket_id - 1] * quantity
+        purchase_rows.append({
+            'id': purchase_id, 'user_id': buyer.id, 'ticket_id': ticket_id, 'quantity': quantity,
+            'unit_price': from_cents(prices[ticket_id - 1]), 'total_amount': from_cents(total),
+            'status': status, 'created_at': settled
+        })
+        if status != 'completed':
+            continue
+
+        sold[ticket_id] = sold.get(ticket_id, 0) + quantity
+        if total:
+            rate = generator.choice(RATES)
+            fee, organizer_share = split_commission(total, rate)
+            commission_rows.append({
+                'purchase_id': purchase_id, 'platform_fee_rate': rate, 'platform_fee_amount': from_cents(fee),
+                'organizer_amount': from_cents(organizer_share), 'created_at': settled
+            })
+            totals['purchase'] += total
+            totals['fee'] += fee
+            totals['organizer'] += organizer_share
+
+    db.session.bulk_insert_mappings(Purchase, purchase_rows)
+    db.session.bulk_insert_mappings(Commission, commission_rows)
+    for ticket_id, quantity in sold.items():
+        db.session.query(Ticket).filter_by(id=ticket_id).update({'sold_count': quantity})
+    db.session.commit()
+    return totals
+
+def test_large_generated_ledger_reconciles_to_the_cent(app):
+    totals = seed_ledger(50000)
+
+    result = run_reconciliation(chunk_size=5000)
+
+    assert (result['split'], result['missing'], result['sold_count']) == (0, 0, 0)
+    assert result['checkpoint'] == 50000
+
+    report = commission_report()
+    assert report['balanced'], report
+    assert report['purchase_total'] == str(from_cents(totals['purchase']))
+    assert report['platform_fee_total'] == str(from_cents(totals['fee']))
+    assert report['organizer_total'] == str(from_cents(totals['organizer']))
+    assert report['unbalanced_amount'] == '0.00'
+
+def test_reconciliation_finds_and_repairs_a_cent_off(app):
+    seed_ledger(5000)
+    commissions = Commission.query.order_by(Commission.id).limit(3).all()
+    for commission in commissions:
+        commission.organizer_amount += Decimal('0.01')
+    db.session.commit()
+
+    assert commission_report()['unbalanced_amount'] == '-0.03'
+    assert run_reconciliation(repair=True)['split'] == 3
+
+    get_checkpoint().last_id = 0
+    db.session.commit()
+    assert run_reconciliation()['split'] == 0
+    assert commission_report()['balanced']
+
+def test_record_commission_splits_the_purchase_total(app):
+    organizer = User(name='Organizer', email='organizer@campus.edu', role='verified_leader', password_hash='-')
+    db.session.add(organizer)
+    db.session.flush()
+    purchase = Purchase(id=1, user_id=organizer.id, ticket_id=1, quantity=3, unit_price=Decimal('333.35'),
+                        total_amount=Decimal('1000.05'))
+
+    commission = record_commission(purchase, organizer, rate=Decimal('0.0375'))
+
+    assert commission.platform_fee_amount == Decimal('37.50')  # 37.501875 rounds to 37.50
+    assert commission.platform_fee_amount + commission.organizer_amount == purchase.total_amount
@@ -0,0 +1,74 @@
+import threading
+import time
+from http.server import ThreadingHTTPServer
+import pytest
+from daraja_stub import DarajaStub
+from services.mpesa import MpesaClient
+
+class ScriptedDaraja(DarajaStub):
+    """Answers every POST with `reply`: (status, JSON body), raw bytes, or 'hang'"""
+    reply = (200, {})
+
+    def do_POST(self):
+        self.read_json()
+        if self.reply == 'hang':
+            time.sleep(2)
+            return None
+        if isinstance(self.reply, bytes):
+            self.send_response(502)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(self.reply)))
+            self.end_headers()
+            self.wfile.write(self.reply)
+            return None
+        status, body = self.reply
+        return self.send_json(body, status)
+
+@pytest.fixture
+def daraja(app):
+    """Point a fresh client at a stub; call it with the reply the stub should give"""
+    servers = []
+    app.config['MPESA_TIMEOUT'] = 0.5
+
+    def run(reply):
+        handler = type('TestDaraja', (ScriptedDaraja,), {'latency': 0, 'reply': reply})
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        servers.append(server)
+        app.config['MPESA_BASE_URL'] = f'http://127.0.0.1:{server.server_address[1]}'
+        return MpesaClient()
+
+    yield run
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_accepted_push_returns_the_answer(daraja):
+    client = daraja((200, {'ResponseCode': '0', 'CheckoutRequestID': 'ws_CO_1'}))
+
+    assert client.stk_push('0700000000', 500, 'TICKET-1', 'Tickets') == {
+        'ResponseCode': '0', 'CheckoutRequestID': 'ws_CO_1'
+    }
+
+def test_explicit_rejection_is_an_answer(daraja):
+    rejection = {'requestId': '1', 'errorCode': '400.002.02', 'errorMessage': 'Bad Request - Invalid PhoneNumber'}
+    client = daraja((400, rejection))
+
+    assert client.stk_push('0700000000', 500, 'TICKET-1', 'Tickets') == rejection
+
+def test_timeout_is_unknown(daraja):
+    client = daraja('hang')
+
+    assert client.stk_push('0700000000', 500, 'TICKET-1', 'Tickets') is None
+
+def test_gateway_error_page_is_unknown(daraja):
+    client = daraja(b'<html>502 Bad Gateway</html>')
+
+    assert client.stk_push('0700000000', 500, 'TICKET-1', 'Tickets') is None
+
+def test_unreachable_api_is_unknown(app):
+    app.config['MPESA_BASE_URL'] = 'http://127.0.0.1:9'
+    app.config['MPESA_TIMEOUT'] = 0.5
+
+    assert MpesaClient().stk_query('ws_CO_1') is None
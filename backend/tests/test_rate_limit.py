@@ -0,0 +1,138 @@
+import fakeredis
+import pytest
+import redis
+from flask import Blueprint, Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token
+from werkzeug.middleware.proxy_fix import ProxyFix
+from config import TestingConfig
+from services.rate_limit import MemoryBackend, RedisBackend, RateLimiter, parse_rate
+
+@pytest.fixture
+def app():
+    """An app with an auth-like blueprint: strict limits on login, a per-user limit elsewhere"""
+    class RateLimitTestConfig(TestingConfig):
+        RATELIMIT_ENABLED = True
+
+    app = Flask(__name__)
+    app.config.from_object(RateLimitTestConfig)
+    JWTManager(app)
+    limiter = RateLimiter(app)
+
+    auth_bp = Blueprint('auth', __name__)
+
+    @auth_bp.route('/login', methods=['POST'])
+    def login():
+        return jsonify(ok=True)
+
+    @auth_bp.route('/me')
+    def me():
+        return jsonify(ok=True)
+
+    @auth_bp.route('/callback', methods=['POST'])
+    @limiter.exempt
+    def callback():
+        return jsonify(ok=True)
+
+    app.register_blueprint(auth_bp, url_prefix='/auth')
+    limiter.limit(auth_bp, '3/minute', per='user')
+    limiter.limit(auth_bp, '2/minute', per='ip', endpoints=('login',))
+    return app
+
+def auth(user_id):
+    return {'Authorization': f'Bearer {create_access_token(identity=user_id)}'}
+
+def statuses(client, method, path, times, **kwargs):
+    return [getattr(client, method)(path, **kwargs).status_code for _ in range(times)]
+
+def test_parse_rate():
+    assert parse_rate('5/minute') == (5, 60)
+    assert parse_rate('100/hours') == (100, 3600)
+
+def test_token_bucket_refills_at_the_rate():
+    backend = MemoryBackend()
+
+    assert backend.consume('key', 2, 1.0, now=100.0) == (True, 0)
+    assert backend.consume('key', 2, 1.0, now=100.0) == (True, 0)
+    assert backend.consume('key', 2, 1.0, now=100.0) == (False, 1.0)
+    assert backend.consume('key', 2, 1.0, now=100.5) == (False, 0.5)
+    assert backend.consume('key', 2, 1.0, now=101.5) == (True, 0)
+    # A long idle spell refills up to capacity, no further
+    assert backend.consume('key', 2, 1.0, now=1000.0) == (True, 0)
+    assert backend.consume('key', 2, 1.0, now=1000.0) == (True, 0)
+    assert backend.consume('key', 2, 1.0, now=1000.0)[0] is False
+
+def test_idle_buckets_are_pruned():
+    backend = MemoryBackend()
+    backend.consume('idle', 2, 1.0, now=100.0)
+    backend.consume('busy', 2, 1.0, now=101.5)
+
+    backend.prune(now=102.5)
+
+    assert set(backend.buckets) == {'busy'}
+
+def test_endpoint_limit_is_per_ip_and_returns_retry_after(app):
+    client = app.test_client()
+
+    assert statuses(client, 'post', '/auth/login', 3) == [200, 200, 429]
+    response = client.post('/auth/login')
+    assert response.headers['Retry-After'] == '30'
+
+    other = app.test_client()
+    assert other.post('/auth/login', environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code == 200
+
+def test_other_views_in_the_blueprint_use_the_blueprint_limit(app):
+    client = app.test_client()
+    statuses(client, 'post', '/auth/login', 3)
+
+    # The login bucket is empty, but /me has its own per-user bucket
+    assert statuses(client, 'get', '/auth/me', 4, headers=auth(1)) == [200, 200, 200, 429]
+
+def test_user_buckets_are_separate_from_each_other_and_the_address(app):
+    client = app.test_client()
+
+    assert statuses(client, 'get', '/auth/me', 4, headers=auth(1)) == [200, 200, 200, 429]
+    # Same address, different user
+    assert statuses(client, 'get', '/auth/me', 3, headers=auth(2)) == [200, 200, 200]
+    # Anonymous callers fall back to the address
+    assert statuses(client, 'get', '/auth/me', 4) == [200, 200, 200, 429]
+
+def test_exempt_views_are_not_limited(app):
+    assert statuses(app.test_client(), 'post', '/auth/callback', 5) == [200] * 5
+
+def test_clients_behind_a_trusted_proxy_get_their_own_buckets(app):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+    client = app.test_client()
+
+    def login(forwarded_for):
+        return client.post('/auth/login', headers={'X-Forwarded-For': forwarded_for}).status_code
+
+    assert [login('41.90.0.1') for _ in range(3)] == [200, 200, 429]
+    assert login('41.90.0.2') == 200
+    # Only the entry the proxy appended counts; a spoofed one in front is ignored
+    assert login('203.0.113.9, 41.90.0.1') == 429
+
+def test_backend_errors_let_requests_through(app):
+    class BrokenBackend:
+        def consume(self, key, capacity, refill_rate, now):
+            raise ConnectionError('store unreachable')
+
+    app.extensions['rate_limiter'].backend = BrokenBackend()
+
+    assert statuses(app.test_client(), 'post', '/auth/login', 3) == [200, 200, 200]
+
+def test_redis_backend_runs_the_token_bucket_script(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, 'from_url', lambda url: fakeredis.FakeRedis(server=server))
+    # Two backends stand in for two gunicorn workers sharing the store
+    first = RedisBackend('redis://localhost:6379/0')
+    second = RedisBackend('redis://localhost:6379/0')
+
+    assert first.consume('key', 2, 1.0, now=100.0) == (True, 0)
+    assert second.consume('key', 2, 1.0, now=100.0) == (True, 0)
+    assert first.consume('key', 2, 1.0, now=100.0) == (False, 1.0)
+    assert second.consume('key', 2, 1.0, now=100.5) == (False, 0.5)
+    assert first.consume('key', 2, 1.0, now=101.5) == (True, 0)
+    assert first.consume('other', 2, 1.0, now=101.5) == (True, 0)
+
+    # Idle buckets expire once they would be full again
+    assert 0 < first.client.ttl('ratelimit:key') <= 2
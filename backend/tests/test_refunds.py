@@ -0,0 +1,175 @@
+import threading
+import time as clock
+from datetime import datetime, date, time, timedelta
+from http.server import ThreadingHTTPServer
+import pytest
+from app import db
+from models import User, Event, Ticket, Purchase, RefundJob, Refund, AuditLog
+from daraja_stub import DarajaStub
+from services.mpesa import b2c_token_valid
+from services.refunds import run_refund_job, apply_b2c_result, unconfirmed_refunds, resolve_refund
+
+class B2CStub(DarajaStub):
+    """Records B2C requests and answers them with `reply` (a JSON body, or 'hang')"""
+    latency = 0
+    reply = {'ResponseCode': '0', 'ConversationID': 'AG_1'}
+    requests = []
+
+    def do_POST(self):
+        self.requests.append(self.read_json())
+        if self.reply == 'hang':
+            clock.sleep(2)
+            return None
+        return self.send_json(self.reply)
+
+@pytest.fixture
+def b2c(app):
+    """Point M-Pesa at a B2C stub; call it with the reply to give"""
+    servers = []
+    app.config['MPESA_TIMEOUT'] = 0.5
+    app.config['REFUND_RATE'] = 1000
+
+    def run(reply):
+        handler = type('TestB2C', (B2CStub,), {'reply': reply, 'requests': []})
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        servers.append(server)
+        app.config['MPESA_BASE_URL'] = f'http://127.0.0.1:{server.server_address[1]}'
+        return handler
+
+    yield run
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture
+def job(app):
+    """A refund job for a cancelled event with one completed KES 499.50 purchase"""
+    organizer = User(name='Organizer', email='organizer@campus.edu', role='verified_leader', password_hash='-')
+    buyer = User(name='Buyer', email='buyer@campus.edu', password_hash='-')
+    db.session.add_all([organizer, buyer])
+    db.session.flush()
+
+    event = Event(
+        title='Cancelled Concert', date=date.today() + timedelta(days=7), start_time=time(18), end_time=time(20),
+        location='Main Hall', created_by=organizer.id, is_paid=True
+    )
+    db.session.add(event)
+    db.session.flush()
+
+    ticket = Ticket(event_id=event.id, name='General', price=499.50, quantity=100, sold_count=1)
+    db.session.add(ticket)
+    db.session.flush()
+
+    db.session.add(Purchase(
+        user_id=buyer.id, ticket_id=ticket.id, quantity=1, unit_price=499.50, total_amount=499.50,
+        payment_phone='254700000000', status='completed'
+    ))
+    job = RefundJob(event_id=event.id, requested_by=organizer.id, total_purchases=1)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+def refund():
+    return Refund.query.one()
+
+def age(refund, minutes):
+    """Pretend the refund's B2C call (and its answer) happened `minutes` ago"""
+    refund.attempted_at = datetime.utcnow() - timedelta(minutes=minutes)
+    if refund.sent_at:
+        refund.sent_at = refund.attempted_at
+    db.session.commit()
+
+def test_refund_is_sent_in_whole_shillings_to_our_result_url(app, b2c, job):
+    stub = b2c({'ResponseCode': '0', 'ConversationID': 'AG_1'})
+
+    run_refund_job(job)
+
+    payload, = stub.requests
+    assert payload['Amount'] == 500  # KES 499.50 rounds up, not down
+    token = app.config['MPESA_B2C_CALLBACK_TOKEN']
+    assert payload['ResultURL'].endswith(f'/b2c/result/{token}')
+    assert payload['QueueTimeOutURL'].endswith(f'/b2c/timeout/{token}')
+    assert refund().status == 'sent'
+    assert job.status == 'paying'
+
+    apply_b2c_result({'Result': {'ConversationID': 'AG_1', 'ResultCode': 0, 'TransactionID': 'RFD123'}})
+    run_refund_job(job)
+
+    assert refund().status == 'completed'
+    assert refund().mpesa_code == 'RFD123'
+    assert job.status == 'completed'
+
+def test_callback_token_is_checked(app):
+    assert b2c_token_valid(app.config['MPESA_B2C_CALLBACK_TOKEN'])
+    assert not b2c_token_valid('guessed')
+    assert not b2c_token_valid('')
+
+def test_unanswered_refund_stays_sending_and_blocks_the_job(app, b2c, job):
+    b2c('hang')
+
+    run_refund_job(job)
+
+    assert refund().status == 'sending'
+    assert 'resolve' in refund().last_error
+    assert job.status != 'completed'
+    # Not unconfirmed until REFUND_UNCONFIRMED_MINUTES have passed
+    assert unconfirmed_refunds().count() == 0
+
+    age(refund(), app.config['REFUND_UNCONFIRMED_MINUTES'] + 1)
+    assert [item.id for item in unconfirmed_refunds(job.id)] == [refund().id]
+
+def test_resolving_as_completed_lets_the_job_finish(app, b2c, job):
+    b2c('hang')
+    run_refund_job(job)
+    age(refund(), app.config['REFUND_UNCONFIRMED_MINUTES'] + 1)
+
+    with pytest.raises(ValueError):
+        resolve_refund(refund().id, 'completed')  # The statement's M-Pesa code is required
+    resolved = resolve_refund(refund().id, 'completed', mpesa_code='RFD999', reason='On the statement', actor_id=1)
+
+    assert resolved.status == 'completed'
+    assert resolved.mpesa_code == 'RFD999'
+    audit = AuditLog.query.filter_by(action='refund.resolve').one()
+    assert (audit.target_id, audit.actor_id) == (resolved.id, 1)
+
+    run_refund_job(job)
+    assert job.status == 'completed'
+
+def test_resolving_as_queued_sends_it_again(app, b2c, job):
+    b2c('hang')
+    run_refund_job(job)
+    age(refund(), app.config['REFUND_UNCONFIRMED_MINUTES'] + 1)
+
+    assert resolve_refund(refund().id, 'queued', reason='Not on the statement').status == 'queued'
+
+    b2c({'ResponseCode': '0', 'ConversationID': 'AG_2'})
+    run_refund_job(job)
+    assert refund().status == 'sent'
+    assert refund().attempts == 2
+
+def test_sent_refund_without_a_result_is_unconfirmed(app, b2c, job):
+    b2c({'ResponseCode': '0', 'ConversationID': 'AG_1'})
+    run_refund_job(job)
+    age(refund(), app.config['REFUND_UNCONFIRMED_MINUTES'] + 1)
+
+    assert unconfirmed_refunds().count() == 1
+    assert resolve_refund(refund().id, 'failed', reason='Reversed by Safaricom').status == 'failed'
+
+    run_refund_job(job)
+    assert job.status == 'completed'
+
+def test_refunds_that_are_not_unconfirmed_are_not_resolved(app, b2c, job):
+    b2c({'ResponseCode': '0', 'ConversationID': 'AG_1'})
+    run_refund_job(job)
+
+    # Recently sent: the result callback may still come
+    assert resolve_refund(refund().id, 'failed') is None
+    assert refund().status == 'sent'
+
+    # A result that arrives first wins
+    age(refund(), app.config['REFUND_UNCONFIRMED_MINUTES'] + 1)
+    apply_b2c_result({'Result': {'ConversationID': 'AG_1', 'ResultCode': 0, 'TransactionID': 'RFD123'}})
+    assert resolve_refund(refund().id, 'failed') is None
+    assert refund().status == 'completed'
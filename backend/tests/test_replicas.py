@@ -0,0 +1,131 @@
+import pytest
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required
+from app import db
+from config import TestingConfig
+from models import User
+from services.replicas import read_replica, recent_writers, lag_monitor
+
+@pytest.fixture
+def app(tmp_path):
+    """An app with one SQLite 'replica' holding different rows from the primary"""
+    class ReplicaTestConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+        SQLALCHEMY_BINDS = {'replica_0': f"sqlite:///{tmp_path / 'replica.db'}"}
+        REPLICA_READ_YOUR_WRITES_SECONDS = 30
+
+    app = Flask(__name__)
+    app.config.from_object(ReplicaTestConfig)
+    db.init_app(app)
+    JWTManager(app)
+
+    @app.route('/users')
+    @jwt_required(optional=True)
+    @read_replica
+    def list_users():
+        return jsonify(sorted(user.email for user in User.query))
+
+    @app.route('/users/<name>', methods=['POST'])
+    @jwt_required()
+    def add_user(name):
+        db.session.add(User(name=name, email=f'{name}@campus.edu', password_hash='-'))
+        db.session.commit()
+        return jsonify(ok=True)
+
+    @app.route('/users/<name>/rename', methods=['POST'])
+    @jwt_required()
+    def rename_user(name):
+        User.query.filter_by(name=name).update({'name': f'{name} Jr'}, synchronize_session=False)
+        db.session.commit()
+        return jsonify(ok=True)
+
+    @app.route('/users/<name>/discard', methods=['POST'])
+    @jwt_required()
+    def discard_user(name):
+        db.session.add(User(name=name, email=f'{name}@campus.edu', password_hash='-'))
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()  # Nothing left to write
+        return jsonify(ok=True)
+
+    with app.app_context():
+        db.create_all()
+        User.__table__.create(db.engines['replica_0'])  # The only table the views read
+        db.session.add(User(name='Primary', email='primary@campus.edu', password_hash='-'))
+        db.session.commit()
+        with db.engines['replica_0'].begin() as connection:
+            connection.execute(User.__table__.insert().values(
+                name='Replica', email='replica@campus.edu', password_hash='-', role='student'
+            ))
+
+        recent_writers.writes.clear()
+        lag_monitor.checked.clear()
+        yield app
+
+        db.session.remove()
+        db.drop_all()
+        db.engines['replica_0'].dispose()
+    # init_app registered metadata for the bind on the shared db; other apps don't have it
+    db.metadatas.pop('replica_0', None)
+
+def auth(user_id):
+    return {'Authorization': f'Bearer {create_access_token(identity=user_id)}'}
+
+def test_read_replica_views_read_from_the_replica(app):
+    client = app.test_client()
+
+    assert client.get('/users').json == ['replica@campus.edu']
+    assert client.get('/users', headers=auth(1)).json == ['replica@campus.edu']
+
+def test_writer_reads_own_writes_from_the_primary(app):
+    client = app.test_client()
+
+    client.post('/users/alex', headers=auth(1))
+
+    assert client.get('/users', headers=auth(1)).json == ['alex@campus.edu', 'primary@campus.edu']
+    # Other users, and anonymous readers, stay on the replica
+    assert client.get('/users', headers=auth(2)).json == ['replica@campus.edu']
+    assert client.get('/users').json == ['replica@campus.edu']
+
+def test_writer_returns_to_the_replica_after_the_window(app):
+    client = app.test_client()
+    client.post('/users/alex', headers=auth(1))
+
+    recent_writers.writes[1] -= app.config['REPLICA_READ_YOUR_WRITES_SECONDS'] + 1
+
+    assert client.get('/users', headers=auth(1)).json == ['replica@campus.edu']
+
+def test_bulk_updates_count_as_writes(app):
+    client = app.test_client()
+
+    client.post('/users/Primary/rename', headers=auth(1))
+
+    assert recent_writers.wrote_recently(1, 30)
+
+def test_rolled_back_writes_do_not_pin_to_the_primary(app):
+    client = app.test_client()
+
+    client.post('/users/alex/discard', headers=auth(1))
+
+    assert not recent_writers.wrote_recently(1, 30)
+    assert client.get('/users', headers=auth(1)).json == ['replica@campus.edu']
+
+def test_lagging_replica_falls_back_to_the_primary(app, monkeypatch):
+    monkeypatch.setattr(lag_monitor, 'lag', lambda key, engine, interval: app.config['REPLICA_MAX_LAG_SECONDS'] + 1)
+
+    assert app.test_client().get('/users').json == ['primary@campus.edu']
+
+def test_writes_in_a_replica_view_go_to_the_primary(app):
+    @app.route('/users/<name>/via-replica', methods=['POST'])
+    @jwt_required()
+    @read_replica
+    def add_user_via_replica(name):
+        db.session.add(User(name=name, email=f'{name}@campus.edu', password_hash='-'))
+        db.session.commit()
+        return jsonify(ok=True)
+
+    app.test_client().post('/users/sam/via-replica', headers=auth(1))
+
+    assert User.query.filter_by(email='sam@campus.edu').count() == 1
+    with db.engines['replica_0'].connect() as connection:
+        assert connection.execute(User.__table__.select().where(User.email == 'sam@campus.edu')).first() is None
@@ -0,0 +1,18 @@
+import pytest
+from startup_profile import StartupFailed, budget_ms, profile_startup
+
+# Best of a few boots, so one slow run on a busy machine doesn't fail the suite
+BOOTS = 3
+
+def test_startup_is_within_budget():
+    try:
+        elapsed, rows = min(profile_startup() for _ in range(BOOTS))
+    except StartupFailed as err:
+        pytest.skip(f'create_app() does not boot here: {str(err).strip().splitlines()[-1]}')
+
+    slowest = ', '.join(
+        f'{module.strip()} {cumulative / 1000:.0f}ms' for cumulative, _, module in sorted(rows, reverse=True)[:5]
+    )
+    assert elapsed * 1000 <= budget_ms(), (
+        f'Startup took {elapsed * 1000:.0f}ms, over the {budget_ms()}ms budget (slowest imports: {slowest})'
+    )
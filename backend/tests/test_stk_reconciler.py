@@ -0,0 +1,137 @@
+import threading
+from datetime import datetime, date, time, timedelta
+from http.server import ThreadingHTTPServer
+import pytest
+from app import db
+from models import User, Event, Ticket, Purchase, Commission, IssuedTicket
+from daraja_stub import DarajaStub
+from services.stk_reconciler import reconcile_pending_payments
+
+def start_stub(success_rate, pending_rate):
+    """Run the Daraja stub on a free port with fixed outcome rates"""
+    handler = type('TestDarajaStub', (DarajaStub,), {
+        'latency': 0,
+        'success_rate': success_rate,
+        'pending_rate': pending_rate
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    return server
+
+@pytest.fixture
+def daraja(app):
+    """Point the M-Pesa client at a stub; call it with the outcome rates to use"""
+    servers = []
+
+    def run(success_rate=1.0, pending_rate=0.0):
+        server = start_stub(success_rate, pending_rate)
+        servers.append(server)
+        app.config['MPESA_BASE_URL'] = f'http://127.0.0.1:{server.server_address[1]}'
+        app.config['STK_QUERY_RATE'] = 1000
+        return server
+
+    yield run
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture
+def ticket(app):
+    # Nobody logs in here, so skip the (slow) password hashing
+    organizer = User(name='Organizer', email='organizer@campus.edu', role='verified_leader', password_hash='-')
+    buyer = User(name='Buyer', email='buyer@campus.edu', password_hash='-')
+    db.session.add_all([organizer, buyer])
+    db.session.flush()
+
+    event = Event(
+        title='Concert', date=date.today() + timedelta(days=7), start_time=time(18), end_time=time(20),
+        location='Main Hall', created_by=organizer.id, is_paid=True
+    )
+    db.session.add(event)
+    db.session.flush()
+
+    ticket = Ticket(event_id=event.id, name='General', price=500, quantity=100, sold_count=0)
+    db.session.add(ticket)
+    db.session.commit()
+    return ticket
+
+def pending_purchase(ticket, checkout_request_id, age=timedelta(minutes=30)):
+    purchase = Purchase(
+        user_id=User.query.filter_by(email='buyer@campus.edu').one().id,
+        ticket_id=ticket.id,
+        quantity=2,
+        unit_price=500,
+        total_amount=1000,
+        payment_phone='254700000000',
+        checkout_request_id=checkout_request_id,
+        status='pending',
+        created_at=datetime.utcnow() - age
+    )
+    db.session.add(purchase)
+    db.session.commit()
+    return purchase
+
+def test_completed_payment_is_applied(daraja, ticket):
+    daraja(success_rate=1.0)
+    purchase = pending_purchase(ticket, 'ws_CO_completed')
+
+    counts = reconcile_pending_payments()
+
+    assert counts['completed'] == 1
+    assert purchase.status == 'completed'
+    assert db.session.get(Ticket, ticket.id).sold_count == 2
+    assert Commission.query.filter_by(purchase_id=purchase.id).count() == 1
+    assert IssuedTicket.query.filter_by(purchase_id=purchase.id).count() == 2
+
+def test_cancelled_payment_fails_the_purchase(daraja, ticket):
+    daraja(success_rate=0.0)
+    purchase = pending_purchase(ticket, 'ws_CO_cancelled')
+
+    counts = reconcile_pending_payments()
+
+    assert counts['failed'] == 1
+    assert purchase.status == 'failed'
+    assert db.session.get(Ticket, ticket.id).sold_count == 0
+    assert Commission.query.count() == 0
+
+def test_payment_still_processing_stays_pending(daraja, ticket):
+    daraja(pending_rate=1.0)
+    purchase = pending_purchase(ticket, 'ws_CO_processing')
+
+    counts = reconcile_pending_payments()
+
+    assert counts['unresolved'] == 1
+    assert counts['completed'] == counts['failed'] == counts['expired'] == 0
+    assert purchase.status == 'pending'
+
+def test_old_unresolved_and_unsent_payments_expire(app, daraja, ticket):
+    daraja(pending_rate=1.0)
+    max_age = timedelta(hours=app.config['STK_QUERY_MAX_AGE_HOURS'], minutes=1)
+    unresolved = pending_purchase(ticket, 'ws_CO_too_old', age=max_age)
+    never_sent = pending_purchase(ticket, None, age=max_age)
+
+    counts = reconcile_pending_payments()
+
+    assert counts['expired'] == 2
+    assert unresolved.status == 'failed'
+    assert never_sent.status == 'failed'
+
+def test_push_without_an_answer_waits_for_a_callback(daraja, ticket):
+    daraja(success_rate=1.0)
+    # The STK push timed out, so there is no checkout id to query
+    purchase = pending_purchase(ticket, None)
+
+    counts = reconcile_pending_payments()
+
+    assert counts['unresolved'] == 1
+    assert counts['expired'] == 0
+    assert purchase.status == 'pending'
+
+def test_recent_purchases_are_left_for_the_callback(daraja, ticket):
+    daraja(success_rate=1.0)
+    purchase = pending_purchase(ticket, 'ws_CO_recent', age=timedelta(seconds=10))
+
+    counts = reconcile_pending_payments()
+
+    assert counts['checked'] == 0
+    assert purchase.status == 'pending'
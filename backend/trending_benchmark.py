@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Benchmark: applying queued interactions to trending scores, and the top-N query.
+
+Usage:
+    python trending_benchmark.py [--events 100000] [--interactions 10000000] [--top 20]
+
+Seeds a SQLite database (in memory unless --database is given) with events and
+queued RSVPs/sales spread over the last week, drains them with the trending
+worker, then times the trending query and checks it against scores computed
+directly from the same interactions.
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, date, timedelta
+from app import create_app, db
+from config import TestingConfig
+from models import User, Event, EventInteraction
+from services.trending import apply_interactions, trending_event_ids, log2_add, decayed_weight
+
+class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+def seed_events(count):
+    leader = User(name='Bench Leader', email='bench@campus.edu', role='verified_leader')
+    leader.set_password('password123')
+    db.session.add(leader)
+    db.session.flush()
+
+    start = datetime(2030, 1, 1, 18, 0)
+    db.session.bulk_insert_mappings(Event, [{
+        'id': index + 1,
+        'title': f'Event {index}',
+        'date': date.today() + timedelta(days=index % 365),
+        'start_time': start.time(),
+        'end_time': (start + timedelta(hours=2)).time(),
+        'location': f'Hall {index % 20}',
+        'created_by': leader.id,
+        'trending_score': 0,
+        'created_at': start
+    } for index in range(count)])
+    db.session.commit()
+
+def seed_interactions(events, count, half_life, chunk=100000):
+    """Queue interactions with a skewed popularity; returns the expected score per event"""
+    now = datetime.utcnow()
+    expected = {}
+
+    for offset in range(0, count, chunk):
+        rows = []
+        for _ in range(min(chunk, count - offset)):
+            event_id = min(events, int(random.paretovariate(1.2)))  # A few events get most of the traffic
+            weight = random.choice((1.0, 0.5, 3.0, 6.0))
+            at = now - timedelta(seconds=random.randint(0, 7 * 24 * 3600))
+            rows.append({'event_id': event_id, 'weight': weight, 'created_at': at})
+            expected[event_id] = log2_add(expected.get(event_id), decayed_weight(weight, at, half_life))
+        db.session.bulk_insert_mappings(EventInteraction, rows)
+        db.session.commit()
+
+    return expected
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark trending score updates and queries')
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--interactions', type=int, default=10000000)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database', help='SQLAlchemy URL to use instead of in-memory SQLite')
+    args = parser.parse_args()
+
+    if args.database:
+        BenchmarkConfig.SQLALCHEMY_DATABASE_URI = args.database
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        seed_events(args.events)
+        expected = seed_interactions(args.events, args.interactions, app.config['TRENDING_HALF_LIFE_HOURS'])
+
+        started = time.perf_counter()
+        applied = 0
+        while True:
+            batch = apply_interactions()
+            if not batch:
+                break
+            applied += batch
+        apply_time = time.perf_counter() - started
+
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            top = trending_event_ids(args.top, date.today())
+            timings.append(time.perf_counter() - started)
+
+    # Compare scores rather than ids so ties can't fail the check
+    wanted = sorted(expected.values(), reverse=True)[:args.top]
+    got = sorted((expected.get(event_id, 0) for event_id in top), reverse=True)
+    matches = all(abs(a - b) < 1e-6 for a, b in zip(wanted, got))
+
+    print(f'{args.events} events, {args.interactions} interactions')
+    print(f'Applied {applied} interactions: {apply_time:8.1f}s ({applied / apply_time:,.0f}/s)')
+    print(f'Top {args.top} query (best of {args.repeat}): {min(timings) * 1000:8.2f}ms')
+    print(f'Matches directly computed ranking: {matches}')
+
+if __name__ == '__main__':
+    main()
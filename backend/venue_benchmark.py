@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Benchmark: validating a whole term calendar for double-bookings, and checking one booking.
+
+Usage:
+    python venue_benchmark.py [--events 100000] [--venues 200] [--days 120] [--clash-rate 0.01]
+
+Seeds a SQLite database (in memory unless --database is given) with a term of
+back-to-back bookings per venue and day. A --clash-rate share of bookings
+starts before the previous one ends. The seed bypasses the save-time check,
+so the clashes exist. It times the check-venues pass over the term (best of
+--repeat) and compares its pairs against a pairwise check of each venue's day.
+It also times the indexed single-booking check that runs on every event save.
+"""
+
+import argparse
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from app import create_app, db
+from config import TestingConfig
+from models import User, Event
+from services.venues import calendar_conflicts, find_conflicts
+
+class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+def seed(events, venues, days, clash_rate, chunk=100000):
+    """Bookings laid end to end per venue and day; returns them as (id, venue, day, start, end)"""
+    leader = User(name='Bench Leader', email='bench@campus.edu', role='verified_leader', password_hash='-')
+    db.session.add(leader)
+    db.session.flush()
+
+    term_start = date.today()
+    bookings = []
+    cursors = {}
+    for event_id in range(1, events + 1):
+        venue_day = (f'Hall {random.randrange(venues)}', term_start + timedelta(days=random.randrange(days)))
+        start = cursors.get(venue_day, datetime(2030, 1, 1, 7, 0)) + timedelta(minutes=random.choice((0, 15, 30)))
+        if venue_day in cursors and random.random() < clash_rate:
+            start -= timedelta(minutes=45)  # Starts before the previous booking ends
+        end = start + timedelta(minutes=random.choice((60, 90, 120)))
+        if end.day != start.day:
+            continue  # The room is booked up for the day
+        cursors[venue_day] = end
+        bookings.append((event_id, venue_day[0], venue_day[1], start.time(), end.time()))
+
+    for offset in range(0, len(bookings), chunk):
+        db.session.bulk_insert_mappings(Event, [{
+            'id': event_id, 'title': f'Event {event_id}', 'location': location, 'date': day,
+            'start_time': start, 'end_time': end, 'created_by': leader.id
+        } for event_id, location, day, start, end in bookings[offset:offset + chunk]])
+    db.session.commit()
+    return bookings
+
+def pairwise_conflicts(bookings):
+    """Overlapping pairs found by comparing every two bookings of a venue's day"""
+    by_venue_day = defaultdict(list)
+    for booking in bookings:
+        by_venue_day[booking[1:3]].append(booking)
+
+    pairs = set()
+    for day_bookings in by_venue_day.values():
+        for index, (first, _, _, first_start, first_end) in enumerate(day_bookings):
+            for second, _, _, second_start, second_end in day_bookings[index + 1:]:
+                if first_start < second_end and second_start < first_end:
+                    pairs.add(frozenset((first, second)))
+    return pairs
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark venue double-booking detection')
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--venues', type=int, default=200)
+    parser.add_argument('--days', type=int, default=120, help='Length of the term')
+    parser.add_argument('--clash-rate', type=float, default=0.01, help='Share of bookings that overlap the previous')
+    parser.add_argument('--checks', type=int, default=1000, help='Single-booking checks per timed pass')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database', help='SQLAlchemy URL to use instead of in-memory SQLite')
+    args = parser.parse_args()
+
+    if args.database:
+        BenchmarkConfig.SQLALCHEMY_DATABASE_URI = args.database
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        bookings = seed(args.events, args.venues, args.days, args.clash_rate)
+
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            conflicts = calendar_conflicts()
+            timings.append(time.perf_counter() - started)
+
+        candidates = random.sample(bookings, min(len(bookings), args.checks))
+        checks = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            for event_id, location, day, start, end in candidates:
+                find_conflicts(location, day, start, end, exclude_id=event_id)
+            checks.append(time.perf_counter() - started)
+
+    found = {frozenset(conflict['event_ids']) for conflict in conflicts}
+    matches = len(found) == len(conflicts) and found == pairwise_conflicts(bookings)
+
+    print(f'{len(bookings)} events in {args.venues} venues over {args.days} days, {len(conflicts)} conflicts')
+    print(f'Term calendar check (best of {args.repeat}): {min(timings):8.3f}s '
+          f'({len(bookings) / min(timings):,.0f} events/s)')
+    print(f'Single booking check (best of {args.repeat}): {min(checks) / len(candidates) * 1000:8.3f}ms')
+    print(f'Matches pairwise check: {matches}')
+
+if __name__ == '__main__':
+    main()